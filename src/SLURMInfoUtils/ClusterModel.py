@@ -0,0 +1,180 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import logging
+
+from SLURMInfoUtils import SControlInfoHandler
+from SLURMInfoUtils import JobStore
+
+logger = logging.getLogger("ClusterModel")
+
+#
+# Federated job ids carry the id of the origin cluster in the bits
+# above the local job id: only those can be siblings of a job
+# of another cluster
+#
+FEDJOBBASE = 2**26
+
+
+def splitQueue(queue, defaultCluster):
+
+    #
+    # A queue is a partition of the default cluster or "partition@cluster"
+    #
+    if queue and '@' in queue:
+        partition, cluster = queue.rsplit('@', 1)
+        return (cluster, partition)
+    return (defaultCluster, queue)
+
+
+def joinQueue(cluster, partition, defaultCluster):
+    if cluster == defaultCluster:
+        return partition
+    return '%s@%s' % (partition, cluster)
+
+
+def jobKey(jobid, queue):
+
+    #
+    # Local job ids are unique only within a cluster, a federated
+    # job keeps its id when it runs on another cluster
+    #
+    if jobid.isdigit() and int(jobid) >= FEDJOBBASE:
+        return (jobid, None)
+    return (jobid, splitQueue(queue, None)[0])
+
+
+class ClusterTable:
+
+    #
+    # Partition data of several clusters keyed by (cluster, partition);
+    # the items are looked up by queue like the tables of a single cluster
+    #
+    def __init__(self, defaultCluster):
+        self.defaultCluster = defaultCluster
+        self.qtable = dict()
+    
+    def add(self, cluster, container):
+        for partition, qInfo in container.qtable.iteritems():
+            self.qtable[cluster, partition] = qInfo
+    
+    def __getitem__(self, queue):
+        return self.qtable[splitQueue(queue, self.defaultCluster)]
+    
+    def __contains__(self, queue):
+        return splitQueue(queue, self.defaultCluster) in self.qtable
+
+
+class ClusterPolicyTable:
+
+    def __init__(self, defaultCluster):
+        self.defaultCluster = defaultCluster
+        self.tables = dict()
+    
+    def add(self, cluster, policyTable):
+        self.tables[cluster] = policyTable
+    
+    def resolve(self, keyList):
+    
+        #
+        # Each cluster resolves the keys of its partitions
+        #
+        clusterKeys = dict()
+        for voName, queue in keyList:
+            cluster, partition = splitQueue(queue, self.defaultCluster)
+            if not cluster in clusterKeys:
+                clusterKeys[cluster] = list()
+            clusterKeys[cluster].append(((voName, partition), (voName, queue)))
+        
+        effTable = dict()
+        for cluster, keyPairs in clusterKeys.iteritems():
+            if not cluster in self.tables:
+                continue
+            
+            tmpTable = self.tables[cluster].resolve([ keyPair[0] for keyPair in keyPairs ])
+            for kTuple, qTuple in keyPairs:
+                if kTuple in tmpTable:
+                    effTable[qTuple] = tmpTable[kTuple]
+        
+        return effTable
+
+
+class ClusterPolicies:
+
+    #
+    # Same interface of SAcctMgrHandler.PolicyInfoHandler for rendering
+    #
+    def __init__(self, defaultCluster):
+        self.policyTable = ClusterPolicyTable(defaultCluster)
+    
+    def add(self, cluster, container):
+        self.policyTable.add(cluster, container.policyTable)
+
+
+def mergeNodes(clusterNodes):
+
+    #
+    # clusterNodes is a list of (cluster, nodes container); node names
+    # are unique only within a cluster, the GPU tables of the result
+    # are keyed by (cluster, node)
+    #
+    result = SControlInfoHandler.NodesInfoHandler()
+    for cluster, container in clusterNodes:
+        result.ncpu += container.ncpu
+        result.nfree += container.nfree
+        for nodeName, gpuNum in container.gpuTable.iteritems():
+            result.gpuTable[cluster, nodeName] = gpuNum
+        for nodeName, gpuNum in container.gpuUsedTable.iteritems():
+            result.gpuUsedTable[cluster, nodeName] = gpuNum
+    return result
+
+
+def mergeJobs(clusterJobs, defaultCluster):
+
+    #
+    # clusterJobs is a list of (cluster, job store); the pending siblings
+    # of a federated job are listed by each cluster, only one of them is
+    # kept, the running one if any
+    #
+    fedTable = dict()
+    for sIdx in range(len(clusterJobs)):
+        jobStore = clusterJobs[sIdx][1]
+        for row in xrange(len(jobStore)):
+            jobid = jobStore.jobids[row]
+            if jobid < FEDJOBBASE:
+                continue
+            
+            if not jobid in fedTable:
+                fedTable[jobid] = (sIdx, row)
+            elif jobStore.states[row] == 'running':
+                oIdx, oRow = fedTable[jobid]
+                if clusterJobs[oIdx][1].states[oRow] <> 'running':
+                    fedTable[jobid] = (sIdx, row)
+    
+    result = JobStore.JobStore()
+    for sIdx in range(len(clusterJobs)):
+        cluster, jobStore = clusterJobs[sIdx]
+        for row in xrange(len(jobStore)):
+            jobid = jobStore.jobids[row]
+            if jobid >= FEDJOBBASE and fedTable[jobid] <> (sIdx, row):
+                logger.debug("Skipped sibling of job %d on %s", jobid, cluster)
+                continue
+            
+            jTable = jobStore.getJob(row)
+            jTable['queue'] = joinQueue(cluster, jTable['queue'], defaultCluster)
+            result.append(jTable)
+    
+    return result
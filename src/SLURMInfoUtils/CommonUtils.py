@@ -15,11 +15,21 @@
 # limitations under the License.
 
 import sys
+import os, os.path
 import re
+import time
+import errno
+import signal
+import select
 import shlex
 import subprocess
 import traceback
 import glob
+import tempfile
+import cPickle
+import cStringIO
+import json
+import multiprocessing
 import ConfigParser
 import logging
 from threading import Thread
@@ -28,46 +38,375 @@ from threading import Thread
 
 UNDEFPRIORITY=2147483647
 UNDEFMAXITEM=-1
+MAXCACHEDITEMS=4096
+READBLOCKSIZE=65536
+WAITINTERVAL=0.1
+
+#
+# Default timeout for every command and absolute deadline of the whole run,
+# None means no limit
+#
+commandTimeout = None
+runDeadline = None
+
+#
+# Statistics of the commands executed since the last report
+#
+commandStats = list()
 
 logger = logging.getLogger("CommonUtils")
 
-class ErrorHandler(Thread):
+class StreamHandler(Thread):
 
-    def __init__(self, err_stream):
+    #
+    # Base class for the parsers of the command output: parseLine() is
+    # called for each line, returning False if the line is discarded,
+    # and finish() at the end of the stream.
+    # The handlers are driven by the StreamMultiplexer; as threads
+    # they can still read the stream registered with setStream()
+    #
+    def __init__(self):
         Thread.__init__(self)
-        self.stream = err_stream
-        self.message = ""
+        self.errList = list()
+
+    def setStream(self, stream):
+        self.stream = stream
+    
+    def parseLine(self, line):
+        pass
+    
+    def finish(self):
+        pass
     
     def run(self):
         line = self.stream.readline()
         while line:
-            self.message = self.message + line
+            self.parseLine(line)
             line = self.stream.readline()
+        self.finish()
 
 
-def parseStream(cmd, container):
+def setCommandTimeout(timeout):
+    global commandTimeout
+    if timeout > 0:
+        commandTimeout = timeout
+    else:
+        commandTimeout = None
 
-    processErr = None
-    
+
+def setRunBudget(budget):
+    global runDeadline
+    if budget > 0:
+        runDeadline = time.time() + budget
+    else:
+        runDeadline = None
+
+
+def remainingBudget():
+    if runDeadline == None:
+        return None
+    return max(runDeadline - time.time(), 0)
+
+
+def budgetExhausted():
+    return runDeadline <> None and time.time() >= runDeadline
+
+
+def killProcess(process, expired):
     try:
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        expired.append(True)
+        #
+        # The command runs in its own session: kill the children too,
+        # they may keep the pipes open (ssh, wrapper scripts)
+        #
+        os.killpg(process.pid, signal.SIGKILL)
+    except:
+        logger.debug("Cannot kill process %d", process.pid, exc_info=True)
+
+
+class StreamCommand:
+
+    def __init__(self, cmd, container, timeout, callback=None):
+        self.cmd = cmd
+        self.container = container
+        self.timeout = timeout
+        self.callback = callback
+        self.openChannels = 2
+        self.process = None
+        self.deadline = None
+        self.expired = list()
+        self.failed = False
+        self.errBuffer = list()
+        self.error = None
+        
+        self.startTime = time.time()
+        self.endTime = None
+        self.cpuTime = 0.0
+        self.parseTime = 0.0
+        self.bytesRead = 0
+        self.errBytes = 0
+        self.lines = 0
+        self.rejected = 0
+        self.retCode = None
+    
+    def getStats(self):
+        return { 'command' : ' '.join(self.cmd),
+                 'wall' : self.endTime - self.startTime,
+                 'cpu' : self.cpuTime,
+                 'parse' : self.parseTime,
+                 'bytes' : self.bytesRead,
+                 'lines' : self.lines,
+                 'rejected' : self.rejected,
+                 'retcode' : self.retCode,
+                 'stderr' : self.errBytes,
+                 'expired' : len(self.expired) > 0 }
+
+
+class StreamMultiplexer:
+
+    #
+    # Reads stdout and stderr of several commands in a single thread:
+    # blocks are read as soon as a pipe is ready and the complete lines
+    # are passed to the handler of the command. The callback of a command
+    # is called when it completes and can register other commands.
+    # All the children are created by the thread running the loop
+    #
+    def __init__(self):
+        self.commands = list()
+        self.channels = dict()
+        self.waiters = list()
     
-        container.setStream(process.stdout)
-        stderr_thread = ErrorHandler(process.stderr)
+    def wait(self, attempt):
     
-        container.start()
-        stderr_thread.start()
+        #
+        # attempt() is called at every iteration of the loop, at least
+        # every WAITINTERVAL seconds, until it returns True; it must not
+        # block, the commands already running go on in the meantime
+        #
+        self.waiters.append(attempt)
+    
+    def register(self, cmd, container, timeout=None, callback=None):
+    
+        if not timeout:
+            timeout = commandTimeout
+        
+        remaining = remainingBudget()
+        if remaining <> None:
+            if remaining <= 0:
+                raise Exception("Run budget exhausted, %s not executed" % cmd[0])
+            if not timeout or remaining < timeout:
+                timeout = remaining
+        
+        #
+        # The pipes of the other commands must not leak into the child,
+        # or their EOF is delayed until it exits; preexec_fn is safe
+        # since no other thread creates processes
+        #
+        command = StreamCommand(cmd, container, timeout, callback)
+        command.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                           close_fds=True, preexec_fn=os.setsid)
+        if timeout:
+            command.deadline = time.time() + timeout
+        
+        self.commands.append(command)
+        self.channels[command.process.stdout.fileno()] = [command, '', False]
+        self.channels[command.process.stderr.fileno()] = [command, '', True]
+        return command
     
-        ret_code = process.wait()
+    def run(self):
     
-        container.join()
-        stderr_thread.join()
+        if hasattr(select, 'poll'):
+            poller = select.poll()
+        else:
+            poller = None
+        polled = set()
+        
+        while self.channels or self.waiters:
+        
+            waiting = self._checkWaiters()
+            
+            if poller:
+                for fd in self.channels:
+                    if not fd in polled:
+                        poller.register(fd, select.POLLIN | select.POLLPRI)
+                        polled.add(fd)
+            
+            pollTimeout = self._checkTimeouts()
+            if waiting and (pollTimeout == None or pollTimeout > WAITINTERVAL):
+                pollTimeout = WAITINTERVAL
+            
+            try:
+                if poller:
+                    if pollTimeout <> None:
+                        pollTimeout = int(pollTimeout * 1000) + 1
+                    readyList = [ fd for fd, event in poller.poll(pollTimeout) ]
+                else:
+                    readyList = select.select(self.channels.keys(), [], [], pollTimeout)[0]
+            except select.error, ex:
+                if ex.args[0] == errno.EINTR:
+                    continue
+                raise
+            
+            for fd in readyList:
+                data = os.read(fd, READBLOCKSIZE)
+                if data:
+                    self._feed(fd, data)
+                    continue
+                
+                command = self.channels[fd][0]
+                self._feed(fd, None)
+                del self.channels[fd]
+                if poller:
+                    poller.unregister(fd)
+                    polled.discard(fd)
+                
+                command.openChannels -= 1
+                if command.openChannels == 0:
+                    self._complete(command)
+                    if command.callback:
+                        command.callback(command)
+    
+    def getError(self, container):
+        for command in self.commands:
+            if command.container is container:
+                return command.error
+        return None
+    
+    def _checkWaiters(self):
+    
+        #
+        # The attempts can register commands and other attempts
+        #
+        waiters = self.waiters
+        self.waiters = list()
+        for attempt in waiters:
+            try:
+                if attempt():
+                    continue
+            except:
+                logger.error("Error in a pending operation", exc_info=True)
+                continue
+            self.waiters.append(attempt)
+        return len(self.waiters) > 0
+    
+    def _checkTimeouts(self):
+    
+        #
+        # Kills the expired commands and returns the time to the next deadline
+        #
+        now = time.time()
+        result = None
+        for command in self.commands:
+            if not command.deadline or command.expired or command.endTime:
+                continue
+            if command.deadline <= now:
+                killProcess(command.process, command.expired)
+            elif result == None or command.deadline - now < result:
+                result = command.deadline - now
+        return result
+    
+    def _feed(self, fd, data):
+    
+        command, pending, isErr = self.channels[fd]
+        
+        if data <> None:
+            if isErr:
+                command.errBytes += len(data)
+            else:
+                command.bytesRead += len(data)
+        
+        if data == None:
+            lines = [ pending ] if pending else []
+        else:
+            data = pending + data
+            cut = data.rfind('\n') + 1
+            self.channels[fd][1] = data[cut:]
+            lines = cStringIO.StringIO(data[:cut])
+        
+        if isErr:
+            command.errBuffer.extend(lines)
+            return
+        
+        if command.failed:
+            return
+        
+        startTime = time.time()
+        try:
+            for line in lines:
+                command.lines += 1
+                if command.container.parseLine(line) == False:
+                    command.rejected += 1
+        except:
+            logger.debug("Error parsing output of %s", command.cmd[0], exc_info=True)
+            command.container.errList.append(errorMsgFromTrace())
+            command.failed = True
+        command.parseTime += time.time() - startTime
+    
+    def _reap(self, command):
+    
+        #
+        # wait4() provides the resource usage of the command;
+        # a command can close its output before exiting
+        #
+        while True:
+            try:
+                if command.deadline and not command.expired:
+                    pid, status, rusage = os.wait4(command.process.pid, os.WNOHANG)
+                    if pid == 0:
+                        if time.time() >= command.deadline:
+                            killProcess(command.process, command.expired)
+                        else:
+                            time.sleep(0.01)
+                        continue
+                else:
+                    pid, status, rusage = os.wait4(command.process.pid, 0)
+                break
+            except OSError, ex:
+                if ex.errno <> errno.EINTR:
+                    raise
+        
+        if os.WIFSIGNALED(status):
+            command.process.returncode = -os.WTERMSIG(status)
+        else:
+            command.process.returncode = os.WEXITSTATUS(status)
+        
+        command.cpuTime = rusage.ru_utime + rusage.ru_stime
+        return command.process.returncode
+    
+    def _complete(self, command):
+    
+        ret_code = self._reap(command)
+        command.process.stdout.close()
+        command.process.stderr.close()
+        
+        if not command.failed:
+            try:
+                command.container.finish()
+            except:
+                logger.debug("Error parsing output of %s", command.cmd[0], exc_info=True)
+                command.container.errList.append(errorMsgFromTrace())
         
         if ret_code <> 0:
-            processErr = stderr_thread.message
+            command.error = ''.join(command.errBuffer)
             
-        if len(container.errList) > 0:
-            processErr = container.errList[0]
+        if len(command.container.errList) > 0:
+            command.error = command.container.errList[0]
+        
+        if command.expired:
+            command.error = "Timeout expired (%ds) running %s" % (command.timeout, command.cmd[0])
+        
+        command.retCode = ret_code
+        command.endTime = time.time()
+        commandStats.append(command.getStats())
+
+
+def parseStream(cmd, container, timeout=None):
+
+    try:
+        multiplexer = StreamMultiplexer()
+        multiplexer.register(cmd, container, timeout)
+        multiplexer.run()
+        processErr = multiplexer.getError(container)
 
     except:
         logger.debug("Error running %s", repr(cmd), exc_info=True)
@@ -77,6 +416,325 @@ def parseStream(cmd, container):
         raise Exception(processErr)
 
 
+def reportStats(program, statsFile=None):
+
+    #
+    # Logs the statistics of the commands run since the last report and
+    # appends them, as a JSON record, to the stats file if configured
+    #
+    records = list(commandStats)
+    del commandStats[:len(records)]
+    if len(records) == 0:
+        return
+    
+    for record in records:
+        logger.info("%(command)s: %(wall).3fs wall, %(cpu).3fs cpu, %(parse).3fs parsing, "
+                    "%(bytes)d bytes, %(lines)d lines (%(rejected)d rejected), "
+                    "return code %(retcode)s, %(stderr)d bytes on stderr", record)
+    
+    if not statsFile:
+        return
+    
+    statsOut = None
+    try:
+        try:
+            statsOut = open(statsFile, 'a')
+            statsOut.write(json.dumps({ 'program' : program,
+                                        'time' : int(time.time()),
+                                        'commands' : records }, sort_keys=True) + '\n')
+        except:
+            logger.error("Cannot write statistics to %s", statsFile, exc_info=True)
+    finally:
+        if statsOut:
+            statsOut.close()
+
+
+class StreamStep:
+
+    #
+    # A command with the handler of its output; with check set the
+    # errors of the command are raised in the source running it
+    #
+    def __init__(self, cmd, container, timeout=None, check=True):
+        self.cmd = cmd
+        self.container = container
+        self.timeout = timeout
+        self.check = check
+
+
+def singleStep(step):
+    yield step
+
+
+class SourceRun:
+
+    def __init__(self, steps, callback):
+        self.steps = steps
+        self.callback = callback
+        self.started = False
+        self.stepList = None
+        self.single = False
+        self.commands = None
+        self.pending = 0
+        self.container = None
+
+
+class Collection:
+
+    #
+    # Runs the commands of several sources in one StreamMultiplexer.
+    # A source is a StreamStep or a generator yielding steps, or lists of
+    # steps run together, and receiving the completed commands; a value
+    # yielded that is not a step is the result of the source, otherwise
+    # the result is the container of the last step. The callbacks run in
+    # the loop and can start the sources depending on the result
+    #
+    def __init__(self, cache=None):
+        self.multiplexer = StreamMultiplexer()
+        self.cache = cache
+        self.results = dict()
+        self.errors = dict()
+    
+    def start(self, steps, callback):
+        if isinstance(steps, StreamStep):
+            steps = singleStep(steps)
+        self._advance(SourceRun(steps, callback), None)
+    
+    def add(self, name, steps, callback=None):
+    
+        def finish(result, error):
+            if error <> None:
+                logger.debug("Source %s failed: %s", name, error)
+                self.errors[name] = error
+            else:
+                self.results[name] = result
+            if callback:
+                try:
+                    callback(result, error)
+                except:
+                    logger.error("Error processing %s", name, exc_info=True)
+        
+        self.start(steps, finish)
+    
+    def load(self, name, snapshot, source, steps, checker=None, callback=None):
+    
+        #
+        # As add(), the result is taken from the snapshot cache if valid;
+        # checker(timestamp) returns the steps telling whether the snapshot
+        # taken at timestamp is still valid
+        #
+        if self.cache == None or not self.cache.isEnabled(source):
+            self.add(name, steps, callback)
+            return
+        
+        def loaded(snapshotData):
+            timestamp, result = snapshotData
+            
+            if result == None:
+                self._refresh(name, snapshot, source, steps, callback, timestamp)
+                return
+            
+            if checker == None:
+                self.setResult(name, result, callback)
+                return
+            
+            def checked(valid, error):
+                if error <> None:
+                    logger.warning("Cannot check snapshot %s: %s", snapshot, error)
+                if valid:
+                    self.setResult(name, result, callback)
+                else:
+                    logger.debug("Snapshot %s is out of date", snapshot)
+                    self._refresh(name, snapshot, source, steps, callback, timestamp)
+            
+            self.start(checker(timestamp), checked)
+        
+        def failed():
+            self.add(name, steps, callback)
+        
+        self._lock(snapshot, lambda: self.cache.read(snapshot, source, False), loaded, failed)
+    
+    def run(self):
+        self.multiplexer.run()
+    
+    def get(self, name):
+        if name in self.errors:
+            raise Exception(self.errors[name])
+        return self.results[name]
+    
+    def getOptional(self, name, default=None):
+    
+        #
+        # Accounting, memory and GPU data are not essential: if they cannot
+        # be collected in time the defaults are published
+        #
+        if name in self.errors:
+            logger.warning("Skipped %s: %s", name, self.errors[name])
+            return default
+        return self.results.get(name, default)
+    
+    def setResult(self, name, result, callback=None):
+        self.results[name] = result
+        if callback:
+            callback(result, None)
+    
+    def _refresh(self, name, snapshot, source, steps, callback, rejected):
+    
+        def reserved(reservation):
+            entry, result = reservation
+            
+            if entry == None:
+                self.setResult(name, result, callback)
+                return
+            
+            loadTime = time.time()
+            
+            def stored(result, error):
+                if error == None:
+                    entry.store(result, loadTime)
+                else:
+                    entry.release()
+                if callback:
+                    callback(result, error)
+            
+            self.add(name, steps, stored)
+        
+        def failed():
+            self.add(name, steps, callback)
+        
+        self._lock(snapshot, lambda: self.cache.reserve(snapshot, source, rejected, False),
+                   reserved, failed)
+    
+    def _lock(self, snapshot, attempt, locked, failed):
+    
+        #
+        # The snapshot locks are taken without blocking the loop: while
+        # another invocation holds them the attempt is repeated by the
+        # multiplexer and the commands already running are not delayed.
+        # Since the loop never blocks on a lock, invocations refreshing
+        # the snapshots of several clusters cannot deadlock.
+        # The timeout of the commands starts when they are registered
+        #
+        def tryLock():
+            try:
+                value = attempt()
+            except:
+                logger.warning("Cannot lock snapshot %s", snapshot, exc_info=True)
+                failed()
+                return True
+            
+            if value <> None:
+                locked(value)
+                return True
+            
+            if budgetExhausted():
+                logger.warning("Snapshot %s still locked, run budget exhausted", snapshot)
+                failed()
+                return True
+            return False
+        
+        if not tryLock():
+            logger.debug("Snapshot %s locked, waiting", snapshot)
+            self.multiplexer.wait(tryLock)
+    
+    def _advance(self, run, value, error=None):
+    
+        #
+        # The error of a command not handled by the source is passed as is
+        #
+        thrown = None
+        try:
+            if error <> None:
+                thrown = Exception(error)
+                item = run.steps.throw(thrown)
+            elif not run.started:
+                run.started = True
+                item = run.steps.next()
+            else:
+                item = run.steps.send(value)
+        except StopIteration:
+            run.callback(run.container, None)
+            return
+        except:
+            if thrown <> None and sys.exc_info()[1] is thrown:
+                run.callback(None, error)
+            else:
+                run.callback(None, errorMsgFromTrace())
+            return
+        
+        run.single = isinstance(item, StreamStep)
+        if run.single:
+            run.stepList = [ item ]
+        elif isinstance(item, list) and len(item) > 0 and isinstance(item[0], StreamStep):
+            run.stepList = item
+        else:
+            run.steps.close()
+            run.callback(item, None)
+            return
+        
+        run.commands = [ None ] * len(run.stepList)
+        run.pending = len(run.stepList)
+        for idx in range(len(run.stepList)):
+            step = run.stepList[idx]
+            run.container = step.container
+            
+            def completed(command, idx=idx):
+                self._complete(run, idx, command)
+            
+            try:
+                self.multiplexer.register(step.cmd, step.container, step.timeout, completed)
+            except:
+                logger.debug("Error running %s", repr(step.cmd), exc_info=True)
+                command = StreamCommand(step.cmd, step.container, step.timeout)
+                command.error = errorMsgFromTrace()
+                completed(command)
+    
+    def _complete(self, run, idx, command):
+    
+        run.commands[idx] = command
+        run.pending -= 1
+        if run.pending > 0:
+            return
+        
+        for idx in range(len(run.stepList)):
+            if run.stepList[idx].check and run.commands[idx].error:
+                self._advance(run, None, run.commands[idx].error)
+                return
+        
+        if run.single:
+            self._advance(run, run.commands[0])
+        else:
+            self._advance(run, run.commands)
+
+
+def runSteps(steps):
+    collection = Collection()
+    collection.add('result', steps)
+    collection.run()
+    return collection.get('result')
+
+
+class RecordParser:
+
+    #
+    # Splits a one-line scontrol record (Key1=Value1 Key2=Value2 ...)
+    # into a dictionary with a single regex scan. A value runs up to the
+    # next token containing '=' so it may contain spaces and parentheses;
+    # the first occurrence of a key wins. If fields is given only those
+    # keys are extracted. The scan is not faster than one search per
+    # field, it is shared by the handlers for the values with spaces
+    #
+    def __init__(self, fields=None):
+        if fields <> None:
+            keyPattern = '|'.join([ re.escape(key) for key in fields ])
+        else:
+            keyPattern = '[^ =]+'
+        self.regex = re.compile(' (%s)=([^ ]*(?: [^ =]+(?= |$))*)' % keyPattern)
+
+    def parse(self, line):
+        return dict(reversed(self.regex.findall(' ' + line.rstrip())))
+
+
 bdiiCfgRegex = re.compile('^\s*BDII_([^=\s]+)\s*=(.+)$')
 
 def getBDIIConfig(bdiiConffile):
@@ -99,16 +757,7 @@ def getBDIIConfig(bdiiConffile):
     return result
 
 
-glue1DNRegex = re.compile("dn:\s*GlueCEUniqueID\s*=\s*.+")
-glue1VODNRegex = re.compile("dn:\s*GlueVOViewLocalID\s*=\s*.+")
-glue1AttrRegex = re.compile("Glue([^:\s]+)\s*:\s*(.+)")
-
-glue2DNRegex = re.compile("dn:\s*GLUE2ShareID\s*=\s*.+")
-glue2AttrRegex = re.compile("GLUE2([^:\s]+)\s*:\s*(.+)")
-
-managerRegex = re.compile("dn:\s*GLUE2ManagerId\s*=\s*.+")
-
-def parseLdif(bdiiConffile, glueType):
+def getLdifList(bdiiConffile, glueType):
 
     bdiiConfig = getBDIIConfig(bdiiConffile)
 
@@ -119,194 +768,449 @@ def parseLdif(bdiiConffile, glueType):
     
     ldifList = glob.glob(ldifDir + '/*.ldif')
     
+    #
+    # Shortcut for old installations
+    #
     if glueType =='GLUE1':
-    
-        result = dict()
-        
-        #
-        # Shortcut for old installations
-        #
         scFilename = ldifDir + '/static-file-CE.ldif'
         if scFilename in ldifList:
             ldifList = [scFilename]
-        
-        currCEID = None
-        currCEDN = None
-        currQueue = None
-        currVODN = None
-        currVOName = None
-        currVORef = None
+    else:
+        scFilename1 = ldifDir + '/ComputingManager.ldif'
+        scFilename2 = ldifDir + '/ComputingShare.ldif'
+        if scFilename1 in ldifList and scFilename2 in ldifList:
+            ldifList = [scFilename1, scFilename2]
+    
+    return ldifList
 
-        for ldifFilename in ldifList:
+
+def getLdifFingerprint(ldifList):
+
+    result = list()
+    for ldifFilename in ldifList:
+        fStat = os.stat(ldifFilename)
+        result.append((ldifFilename, fStat.st_mtime, fStat.st_size))
+    return result
+
+
+def readLdifBlocks(ldifFile):
+
+    #
+    # The file is read in large blocks, each block is returned
+    # as a list of complete lines without the line terminator
+    #
+    pending = ''
+    while True:
+        data = ldifFile.read(READBLOCKSIZE)
+        if not data:
+            break
+        lines = (pending + data).split('\n')
+        pending = lines.pop()
+        yield lines
+    
+    if pending:
+        yield [ pending ]
+
+
+def ldifDNKey(line):
+
+    #
+    # Returns the attribute of the first RDN of a "dn:" line,
+    # None if the RDN has no value
+    #
+    tmps = line[3:].lstrip()
+    idx = tmps.find('=')
+    if idx > 0 and idx < len(tmps) - 1:
+        return tmps[:idx].rstrip()
+    return None
+
+
+def ldifAttr(line, prefixLen):
+
+    #
+    # Splits "<prefix><name>: <value>" into name and raw value,
+    # the value must not be empty
+    #
+    idx = line.find(':', prefixLen)
+    if idx < 0 or idx == len(line) - 1:
+        return (None, None)
+    return (line[prefixLen:idx].rstrip(), line[idx+1:])
+
+
+GLUE1DNTYPES = { 'GlueCEUniqueID' : 'ce', 'GlueVOViewLocalID' : 'view' }
+GLUE1ATTRS = ['CEUniqueID', 'CEName', 'VOViewLocalID', 'ChunkKey']
+GLUE1PREFIXES = tuple([ 'Glue' + attr for attr in GLUE1ATTRS ])
+GLUE1EMPTY = (None, None, None, None, None, None)
+
+def scanGlue1Lines(lines, state, records):
+
+    #
+    # Scans the lines starting from state, each completed record is
+    # appended to records; returns the state at the end of the lines
+    #
+    currCEID, currCEDN, currQueue, currVODN, currVOName, currVORef = state
+    
+    for line in lines:
+    
+        if line.startswith('dn:'):
+            dnType = GLUE1DNTYPES.get(ldifDNKey(line))
+            if dnType == 'ce':
+                currCEDN = line.strip()
+            elif dnType == 'view':
+                currVODN = line.strip()
+            continue
         
-            ldifFile = None
+        if line.startswith(GLUE1PREFIXES):
+            attrName, attrValue = ldifAttr(line, 4)
+            if not attrName in GLUE1ATTRS:
+                continue
             
-            try:
+            if attrName == 'CEUniqueID':
+                currCEID = attrValue.strip()
+            elif attrName == 'CEName':
+                currQueue = attrValue.strip()
+            elif attrName == 'VOViewLocalID':
+                currVOName = attrValue.strip()
+            else:
+                chunkKey = attrValue.strip()
+                if chunkKey.startswith('GlueCEUniqueID='):
+                    currVORef = chunkKey[15:]
+            continue
+
+        if not line or line.isspace():
+            if currCEID or currVORef:
+                records.append((currCEID, currCEDN, currQueue, currVODN, currVOName, currVORef))
             
-                ldifFile = open(ldifFilename)
-                for line in ldifFile:
-                    parsed = glue1DNRegex.match(line)
-                    if parsed:
-                        currCEDN = line.strip()
-                        continue
-                    
-                    parsed = glue1VODNRegex.match(line)
-                    if parsed:
-                        currVODN = line.strip()
-                        continue
+            currCEID = None
+            currCEDN = None
+            currQueue = None
+            currVODN = None
+            currVOName = None
+            currVORef = None
+    
+    return (currCEID, currCEDN, currQueue, currVODN, currVOName, currVORef)
 
-                    parsed = glue1AttrRegex.match(line)
-                    if parsed:
-                        
-                        if parsed.group(1) == 'CEUniqueID':
-                            currCEID = parsed.group(2).strip()
-                            continue
-                    
-                        if parsed.group(1) == 'CEName':
-                            currQueue = parsed.group(2).strip()
-                            continue
-
-                        if parsed.group(1) == 'VOViewLocalID':
-                            currVOName = parsed.group(2).strip()
-                            continue
-                    
-                        if parsed.group(1) == 'ChunkKey':
-                            chunkKey = parsed.group(2).strip()
-                            if chunkKey.startswith('GlueCEUniqueID='):
-                                currVORef = chunkKey[15:]
-                            continue
-
-                    if len(line.strip()) == 0:
-                        if currCEID:
-                            if not currCEID in result:
-                                result[currCEID] = { 'views' : list() }
-                            result[currCEID]['dn'] = currCEDN
-                            result[currCEID]['queue'] = currQueue
-                        
-                        if currVORef:
-                            if not currVORef in result:
-                                result[currVORef] = { 'views' : list() }
-                            result[currVORef]['views'].append((currVODN, currVOName))
-                            
-                        currCEID = None
-                        currCEDN = None
-                        currQueue = None
-                        currVODN = None
-                        currVOName = None
-                        currVORef = None
 
-            finally:
-                if ldifFile:
-                    ldifFile.close()
-        
+def storeGlue1Records(records):
+
+    result = dict()
+    
+    for currCEID, currCEDN, currQueue, currVODN, currVOName, currVORef in records:
         if currCEID:
             if not currCEID in result:
                 result[currCEID] = { 'views' : list() }
             result[currCEID]['dn'] = currCEDN
             result[currCEID]['queue'] = currQueue
-                        
+        
         if currVORef:
             if not currVORef in result:
                 result[currVORef] = { 'views' : list() }
             result[currVORef]['views'].append((currVODN, currVOName))
-        
-    else:
     
-        result = (dict(), dict())
+    return result
 
-        #
-        # Shortcut for old installations
-        #
-        scFilename1 = ldifDir + '/ComputingManager.ldif'
-        scFilename2 = ldifDir + '/ComputingShare.ldif'
-        if scFilename1 in ldifList and scFilename2 in ldifList:
-            ldifList = [scFilename1, scFilename2]
 
-        currDN1 = None
-        currDN2 = None
-        currShare = None
-        currQueue = None
-        currVO = None
-        voKey = None
+GLUE2DNTYPES = { 'GLUE2ShareID' : 'share', 'GLUE2ManagerId' : 'manager' }
+GLUE2ATTRS = ['ComputingShareMappingQueue', 'ShareID', 'PolicyUserDomainForeignKey',
+              'MappingPolicyShareForeignKey', 'ManagerID']
+GLUE2PREFIXES = tuple([ 'GLUE2' + attr for attr in GLUE2ATTRS ])
+GLUE2EMPTY = (None, None, None, None, None, None)
 
-        for ldifFilename in ldifList:
+def scanGlue2Lines(lines, state, records):
+
+    currDN1, currDN2, currShare, currQueue, currVO, voKey = state
+    
+    for line in lines:
+    
+        if line.startswith('dn:'):
+            dnType = GLUE2DNTYPES.get(ldifDNKey(line))
+            if dnType == 'share':
+                currDN1 = line.strip()
+            elif dnType == 'manager':
+                currDN2 = line.strip()
+            continue
         
-            ldifFile = None
+        if line.startswith(GLUE2PREFIXES):
+            attrName, attrValue = ldifAttr(line, 5)
+            if not attrName in GLUE2ATTRS:
+                continue
             
-            try:
+            if attrName == 'ComputingShareMappingQueue':
+                if currDN1:
+                    currQueue = attrValue.strip()
+            elif attrName == 'ShareID':
+                currShare = attrValue.strip()
+            elif attrName == 'PolicyUserDomainForeignKey':
+                currVO = attrValue.strip()
+            elif attrName == 'MappingPolicyShareForeignKey':
+                voKey = attrValue.strip()
+            elif currDN2:
+                records.append(('manager', currDN2, attrValue.strip()))
+            continue
+        
+        if not line or line.isspace():
+            if currShare or voKey:
+                records.append(('share', currShare, currDN1, currQueue, voKey, currVO))
             
-                ldifFile = open(ldifFilename)
-                for line in ldifFile:
-                    parsed = glue2DNRegex.match(line)
-                    if parsed:
-                        currDN1 = line.strip()
-                        continue
-                    
-                    parsed = managerRegex.match(line)
-                    if parsed:
-                        currDN2 = line.strip()
-                        continue
-                    
-                    parsed = glue2AttrRegex.match(line)
-                    if parsed:
-                    
-                        if parsed.group(1) == 'ComputingShareMappingQueue' and currDN1:
-                            currQueue = parsed.group(2).strip()
-                            continue
-                    
-                        if parsed.group(1) == 'ShareID':
-                            currShare = parsed.group(2).strip()
-                            continue
-                        
-                        if parsed.group(1) == 'PolicyUserDomainForeignKey':
-                            currVO = parsed.group(2).strip()
-                            continue
-                        
-                        if parsed.group(1) == 'MappingPolicyShareForeignKey':
-                            voKey = parsed.group(2).strip()
-                            continue
-                        
-                        if parsed.group(1) == 'ManagerID' and currDN2:
-                            result[1][currDN2] = parsed.group(2).strip()
-                            continue
-                    
-                    if len(line.strip()) == 0:
-                    
-                        if currShare:
-                            if not currShare in result[0]:
-                                result[0][currShare] = dict()
-                            result[0][currShare]['dn'] = currDN1
-                            result[0][currShare]['queue'] = currQueue
-                        
-                        if voKey:
-                            if not voKey in result[0]:
-                                result[0][voKey] = dict()
-                            result[0][voKey]['vo'] = currVO
-                        
-                        currDN1 = None
-                        currDN2 = None
-                        currShare = None
-                        currQueue = None
-                        currVO = None
-                        voKey = None
+            currDN1 = None
+            currDN2 = None
+            currShare = None
+            currQueue = None
+            currVO = None
+            voKey = None
+    
+    return (currDN1, currDN2, currShare, currQueue, currVO, voKey)
 
-            finally:
-                if ldifFile:
-                    ldifFile.close()
 
+def storeGlue2Records(records):
+
+    result = (dict(), dict())
+    
+    for record in records:
+        if record[0] == 'manager':
+            result[1][record[1]] = record[2]
+            continue
+        
+        currShare, currDN1, currQueue, voKey, currVO = record[1:]
         if currShare:
             if not currShare in result[0]:
                 result[0][currShare] = dict()
             result[0][currShare]['dn'] = currDN1
             result[0][currShare]['queue'] = currQueue
-
+        
         if voKey:
             if not voKey in result[0]:
                 result[0][voKey] = dict()
             result[0][voKey]['vo'] = currVO
+    
+    return result
+
+
+LDIFSCANNERS = { 'GLUE1' : (scanGlue1Lines, storeGlue1Records, GLUE1EMPTY),
+                 'GLUE2' : (scanGlue2Lines, storeGlue2Records, GLUE2EMPTY) }
+
+def scanLdifFile(args):
+
+    #
+    # Scans a single file starting from an empty state; the lines before the
+    # first empty line belong to the record left open by the previous file,
+    # they are returned unprocessed together with the records and the final
+    # state (None if the file has no empty line at all)
+    #
+    glueType, ldifFilename = args
+    scanLines, storeRecords, state = LDIFSCANNERS[glueType]
+    
+    headLines = list()
+    records = list()
+    inHead = True
+    
+    ldifFile = None
+    try:
+        ldifFile = open(ldifFilename)
+        for lines in readLdifBlocks(ldifFile):
+        
+            if inHead:
+                for idx in xrange(len(lines)):
+                    if not lines[idx] or lines[idx].isspace():
+                        inHead = False
+                        break
+                if inHead:
+                    headLines.extend(lines)
+                    continue
+                headLines.extend(lines[:idx + 1])
+                lines = lines[idx + 1:]
+            
+            state = scanLines(lines, state, records)
+    
+    finally:
+        if ldifFile:
+            ldifFile.close()
+    
+    if inHead:
+        return (headLines, records, None)
+    return (headLines, records, state)
+
+
+def resetWorkerSignals():
+    for signum in [ signal.SIGTERM, signal.SIGINT, signal.SIGHUP ]:
+        signal.signal(signum, signal.SIG_DFL)
+
+
+def scanLdifFiles(glueType, ldifList, workers):
+
+    #
+    # The order of the results is the order of ldifList
+    #
+    pool = multiprocessing.Pool(min(workers, len(ldifList)), resetWorkerSignals)
+    try:
+        fileResults = pool.map(scanLdifFile, [ (glueType, ldifFilename) for ldifFilename in ldifList ])
+    except:
+        pool.terminate()
+        pool.join()
+        raise
+    
+    pool.close()
+    pool.join()
+    return fileResults
+
+
+def scanLdif(glueType, ldifList, workers=1):
+
+    scanLines, storeRecords, state = LDIFSCANNERS[glueType]
+    records = list()
+    
+    if workers > 1 and len(ldifList) > 1:
+        for headLines, fileRecords, fileState in scanLdifFiles(glueType, ldifList, workers):
+            state = scanLines(headLines, state, records)
+            if fileState <> None:
+                records.extend(fileRecords)
+                state = fileState
+    
+    else:
+        for ldifFilename in ldifList:
+            ldifFile = None
+            try:
+                ldifFile = open(ldifFilename)
+                for lines in readLdifBlocks(ldifFile):
+                    state = scanLines(lines, state, records)
+            finally:
+                if ldifFile:
+                    ldifFile.close()
+    
+    #
+    # The last record can lack the empty line
+    #
+    scanLines([''], state, records)
+    return storeRecords(records)
+
+
+def scanGlue1Ldif(ldifList, workers=1):
+    return scanLdif('GLUE1', ldifList, workers)
+
 
+def scanGlue2Ldif(ldifList, workers=1):
+    return scanLdif('GLUE2', ldifList, workers)
+
+
+#
+# Parsed tables indexed by glue type, reused while the fingerprint
+# (list, mtime and size of the LDIF files) does not change
+#
+ldifIndexTable = dict()
+
+def isOwned(pFile, path):
+
+    #
+    # Pickled data can run code when loaded: only the files written
+    # by the current user are trusted
+    #
+    if os.fstat(pFile.fileno()).st_uid == os.getuid():
+        return True
+    logger.warning("Ignored %s, not owned by uid %d", path, os.getuid())
+    return False
+
+
+def loadLdifIndex(glueType, fingerprint, cacheDir):
+
+    if glueType in ldifIndexTable and ldifIndexTable[glueType][0] == fingerprint:
+        return ldifIndexTable[glueType][1]
+    
+    if not cacheDir:
+        return None
+    
+    indexFile = None
+    try:
+        try:
+            indexPath = os.path.join(cacheDir, 'ldif-%s.index' % glueType.lower())
+            indexFile = open(indexPath, 'rb')
+            if not isOwned(indexFile, indexPath):
+                return None
+            tmpFPrint, result = cPickle.load(indexFile)
+            if tmpFPrint == fingerprint:
+                ldifIndexTable[glueType] = (fingerprint, result)
+                return result
+        except IOError:
+            pass
+        except:
+            logger.debug("Cannot read LDIF index", exc_info=True)
+    finally:
+        if indexFile:
+            indexFile.close()
+    
+    return None
+
+
+def storeLdifIndex(glueType, fingerprint, result, cacheDir):
+
+    ldifIndexTable[glueType] = (fingerprint, result)
+    
+    if not cacheDir:
+        return
+    
+    tmpName = None
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir, 0700)
+        
+        tmpfd, tmpName = tempfile.mkstemp('.tmp', 'ldif', cacheDir)
+        indexFile = os.fdopen(tmpfd, 'wb')
+        try:
+            cPickle.dump((fingerprint, result), indexFile, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            indexFile.close()
+        
+        os.rename(tmpName, os.path.join(cacheDir, 'ldif-%s.index' % glueType.lower()))
+        tmpName = None
+    
+    except:
+        logger.error("Cannot write LDIF index", exc_info=True)
+    
+    if tmpName and os.path.exists(tmpName):
+        os.remove(tmpName)
+
+
+def parseLdif(bdiiConffile, glueType, cacheDir=None, workers=1):
+
+    ldifList = getLdifList(bdiiConffile, glueType)
+    fingerprint = getLdifFingerprint(ldifList)
+    
+    result = loadLdifIndex(glueType, fingerprint, cacheDir)
+    if result <> None:
+        return result
+    
+    if glueType =='GLUE1':
+        result = scanGlue1Ldif(ldifList, workers)
+    else:
+        result = scanGlue2Ldif(ldifList, workers)
+    
+    storeLdifIndex(glueType, fingerprint, result, cacheDir)
     return result
 
+
+def getPublishedShares(config):
+
+    #
+    # The (VO, queue) keys of the shares in the LDIF of the enabled
+    # formats; the tables are parsed once and reused by the handlers
+    #
+    shares = set()
+    
+    if config['outputformat'] <> 'glue2':
+        glue1CETable = parseLdif(config['bdii-configfile'], 'GLUE1', config.get('cache_dir'),
+                                 config.get('ldif_workers', 1))
+        for glue1CEData in glue1CETable.values():
+            shares.add((None, glue1CEData['queue']))
+            for glue1ViewData in glue1CEData['views']:
+                shares.add((glue1ViewData[1], glue1CEData['queue']))
+    
+    if config['outputformat'] <> 'glue1':
+        glue2QueueTable = parseLdif(config['bdii-configfile'], 'GLUE2', config.get('cache_dir'),
+                                    config.get('ldif_workers', 1))[0]
+        for shData in glue2QueueTable.values():
+            shares.add((shData.get('vo'), shData.get('queue')))
+    
+    return shares
+
 def readConfigFile(configFile):
 
     conffile = None
@@ -344,9 +1248,101 @@ def readConfigFile(configFile):
         else:
             config['enable_glue_2_1'] = False
 
+        if tmpConf.has_option('Main','nss_preload'):
+            tmps = tmpConf.get('Main', 'nss_preload').lower()
+            config['nss_preload'] = (tmps == 'true')
+        else:
+            config['nss_preload'] = False
+
+        if tmpConf.has_option('Main','gpu_usage_source'):
+            config['gpu_usage_source'] = tmpConf.get('Main', 'gpu_usage_source').lower()
+        else:
+            config['gpu_usage_source'] = 'gres'
+
+        config['command_timeout'] = 120
+        if tmpConf.has_option('Main','command_timeout'):
+            config['command_timeout'] = tmpConf.getint('Main', 'command_timeout')
+
+        config['run_budget'] = 0
+        if tmpConf.has_option('Main','run_budget'):
+            config['run_budget'] = tmpConf.getint('Main', 'run_budget')
+
+        if tmpConf.has_option('Main','stats_file'):
+            config['stats_file'] = tmpConf.get('Main', 'stats_file')
+
+        if tmpConf.has_option('Main','job_source'):
+            config['job_source'] = tmpConf.get('Main', 'job_source').lower()
+        else:
+            config['job_source'] = 'scontrol'
+
+        #
+        # The first cluster is the one whose partitions can be referenced
+        # without the @cluster suffix
+        #
+        config['clusters'] = list()
+        if tmpConf.has_option('Main','clusters'):
+            config['clusters'] = tmpConf.get('Main', 'clusters').replace(',', ' ').split()
+
+        config['gpu_probe_workers'] = 8
+        if tmpConf.has_option('Main','gpu_probe_workers'):
+            config['gpu_probe_workers'] = tmpConf.getint('Main', 'gpu_probe_workers')
+
+        config['gpu_probe_timeout'] = 10
+        if tmpConf.has_option('Main','gpu_probe_timeout'):
+            config['gpu_probe_timeout'] = tmpConf.getint('Main', 'gpu_probe_timeout')
+
+        config['gpu_probe_deadline'] = 60
+        if tmpConf.has_option('Main','gpu_probe_deadline'):
+            config['gpu_probe_deadline'] = tmpConf.getint('Main', 'gpu_probe_deadline')
+
+        #
+        # Restricts the associations to the partitions and/or to the
+        # accounts of the published shares; "accounts" assumes that the
+        # Slurm accounts are named after the VOs or the groups in vomap,
+        # associations of other accounts are not published
+        #
+        config['acct_filter'] = list()
+        if tmpConf.has_option('Main','acct_filter'):
+            config['acct_filter'] = tmpConf.get('Main', 'acct_filter').lower().replace(',', ' ').split()
+
+        config['ldif_workers'] = 1
+        if tmpConf.has_option('Main','ldif_workers'):
+            config['ldif_workers'] = tmpConf.getint('Main', 'ldif_workers')
+
+        if tmpConf.has_option('Cache','cache_dir'):
+            config['cache_dir'] = tmpConf.get('Cache', 'cache_dir')
+
+        #
+        # The associations are reused, up to ttl_associations, until
+        # the transactions of slurmdbd show a change
+        #
+        config['check_associations'] = False
+        if tmpConf.has_option('Cache','check_associations'):
+            tmps = tmpConf.get('Cache', 'check_associations').lower()
+            config['check_associations'] = (tmps == 'true')
+
+        config['cache_ttl'] = dict()
+        for source in ['config', 'partitions', 'nodes', 'jobs', 'associations', 'probe']:
+            if tmpConf.has_option('Cache','ttl_' + source):
+                config['cache_ttl'][source] = tmpConf.getint('Cache', 'ttl_' + source)
+
+        if tmpConf.has_option('Daemon','output_dir'):
+            config['daemon_dir'] = tmpConf.get('Daemon', 'output_dir')
+
+        config['daemon_refresh'] = 60
+        if tmpConf.has_option('Daemon','refresh_interval'):
+            config['daemon_refresh'] = tmpConf.getint('Daemon', 'refresh_interval')
+
+        config['daemon_max_age'] = 300
+        if tmpConf.has_option('Daemon','max_age'):
+            config['daemon_max_age'] = tmpConf.getint('Daemon', 'max_age')
+
         if tmpConf.has_option('WSInterface','status-probe'):
             config['status-probe'] = tmpConf.get('WSInterface', 'status-probe').strip('"\'')
 
+        if tmpConf.has_option('WSInterface','status-probe-timeout'):
+            config['status-probe-timeout'] = tmpConf.getint('WSInterface', 'status-probe-timeout')
+
     finally:
         if conffile:
             conffile.close()
@@ -356,11 +1352,61 @@ def readConfigFile(configFile):
     if config["outputformat"] not in ["glue1", "glue2", "both"]:
         raise Exception("FATAL: Unknown output format specified in config file:%s" % config["outputformat"])
 
+    if config["gpu_usage_source"] not in ["gres", "nvidia-smi", "crosscheck"]:
+        raise Exception("FATAL: Unknown GPU usage source specified in config file:%s" % config["gpu_usage_source"])
+
+    if config["job_source"] not in ["scontrol", "squeue"]:
+        raise Exception("FATAL: Unknown job source specified in config file:%s" % config["job_source"])
+
+    for acctFilter in config["acct_filter"]:
+        if acctFilter not in ["partitions", "accounts"]:
+            raise Exception("FATAL: Unknown accounting filter specified in config file:%s" % acctFilter)
+
     return config
 
 
+#
+# Jobs and associations share few distinct limits and timestamps:
+# both conversions are memoized in bounded tables
+#
+timeLimitTable = dict()
+hourStartTable = dict()
+
+def convertTimestamp(tstr):
+
+    #
+    # Same as int(time.mktime(time.strptime(tstr, '%Y-%m-%dT%H:%M:%S')) + time.timezone)
+    # The local epoch of each hour is computed once, minutes and seconds
+    # are added to it since offsets from UTC only change on hour boundaries
+    #
+    if len(tstr) <> 19 or tstr[4] <> '-' or tstr[10] <> 'T' or tstr[13] <> ':':
+        return int(time.mktime(time.strptime(tstr, '%Y-%m-%dT%H:%M:%S')) + time.timezone)
+    
+    hourKey = tstr[:13]
+    hourStart = hourStartTable.get(hourKey)
+    if hourStart == None:
+        hourStart = int(time.mktime((int(tstr[0:4]), int(tstr[5:7]), int(tstr[8:10]),
+                                     int(tstr[11:13]), 0, 0, 0, 0, -1)))
+        if len(hourStartTable) >= MAXCACHEDITEMS:
+            hourStartTable.clear()
+        hourStartTable[hourKey] = hourStart
+    
+    return hourStart + int(tstr[14:16]) * 60 + int(tstr[17:19]) + time.timezone
+
+
 def convertTimeLimit(tstr):
 
+    result = timeLimitTable.get(tstr)
+    if result == None:
+        result = parseTimeLimit(tstr)
+        if len(timeLimitTable) >= MAXCACHEDITEMS:
+            timeLimitTable.clear()
+        timeLimitTable[tstr] = result
+    return result
+
+
+def parseTimeLimit(tstr):
+
     if tstr.lower() == 'infinite':
         return 2**32
 
@@ -417,16 +1463,38 @@ def errorMsgFromTrace():
     
     return '%s (%s)' % (evalue, trMessage)
 
+def clusterArgs(cluster):
+    if cluster:
+        return ['-M', cluster]
+    return []
+
+
+def interfaceSteps(config):
+
+    #
+    # The output of the probe is discarded, only the return code matters;
+    # a probe that does not complete in time leaves the interface on
+    #
+    command = yield StreamStep(shlex.split(config['status-probe']), StreamHandler(),
+                               config.get('status-probe-timeout', 10), False)
+    
+    if command.expired:
+        logger.warning(command.error)
+        yield False
+    elif command.retCode == None:
+        logger.debug("Error running %s: %s", config['status-probe'], command.error)
+        yield False
+    else:
+        yield command.retCode == 1 or command.retCode == 2
+
+
 def interfaceIsOff(config):
+
     try:
-    
         if 'status-probe' in config:
-            retcode = subprocess.call(shlex.split(config['status-probe']))
-            return retcode == 1 or retcode == 2
-        
+            return runSteps(interfaceSteps(config))
     except:
         logger.debug("Error running %s", config['status-probe'], exc_info=True)
     
     return False
 
-
@@ -21,13 +21,28 @@ from SLURMInfoUtils import CommonUtils
 
 MAX_INT32 = 2**31-1
 
-def process(config, infoContainer, acctContainer, slurmCfg):
+def process(config, infoContainer, acctContainer, slurmCfg, out=None, ifaceOff=None):
 
-    out = sys.stdout
+    if out == None:
+        out = sys.stdout
+
+    if ifaceOff == None:
+        ifaceOff = CommonUtils.interfaceIsOff(config)
 
     logger = logging.getLogger("GLUE1Handler")
     
-    glue1CETable = CommonUtils.parseLdif(config["bdii-configfile"], 'GLUE1')
+    glue1CETable = CommonUtils.parseLdif(config["bdii-configfile"], 'GLUE1', config.get('cache_dir'),
+                                         config.get('ldif_workers', 1))
+    
+    if acctContainer <> None:
+        policyKeys = list()
+        for glue1CEData in glue1CETable.values():
+            policyKeys.append((None, glue1CEData['queue']))
+            for glue1ViewData in glue1CEData['views']:
+                policyKeys.append((glue1ViewData[1], glue1CEData['queue']))
+        effPolicyTable = acctContainer.policyTable.resolve(policyKeys)
+    else:
+        effPolicyTable = dict()
     
     for glue1CEData in glue1CETable.values():
         
@@ -63,23 +78,20 @@ def process(config, infoContainer, acctContainer, slurmCfg):
         #
         # Retrieve infos from accounting (if available)
         #
-        if acctContainer <> None:
-            try:
-                policyData = acctContainer.policyTable[None, queue]
-                if policyData.maxWallTime <> CommonUtils.UNDEFMAXITEM:
-                    ceMaxWallTime = policyData.maxWallTime
-                if policyData.maxRunJobs <> CommonUtils.UNDEFMAXITEM:
-                    ceMaxRunJobs = policyData.maxRunJobs
-                if policyData.maxTotJobs <> CommonUtils.UNDEFMAXITEM:
-                    ceMaxTotJobs = policyData.maxTotJobs
-                if policyData.maxCPUTime <> CommonUtils.UNDEFMAXITEM:
-                    ceMaxCPUTime = policyData.maxCPUTime
-                if policyData.maxCPUPerJob <> CommonUtils.UNDEFMAXITEM:
-                    ceSlotsPerJob = policyData.maxCPUPerJob
-                if policyData.priority <> CommonUtils.UNDEFPRIORITY:
-                    cePriority = policyData.priority
-            except:
-                logger.debug("No policy from accounting", exc_info=True)
+        policyData = effPolicyTable.get((None, queue))
+        if policyData <> None:
+            if policyData.maxWallTime <> CommonUtils.UNDEFMAXITEM:
+                ceMaxWallTime = policyData.maxWallTime
+            if policyData.maxRunJobs <> CommonUtils.UNDEFMAXITEM:
+                ceMaxRunJobs = policyData.maxRunJobs
+            if policyData.maxTotJobs <> CommonUtils.UNDEFMAXITEM:
+                ceMaxTotJobs = policyData.maxTotJobs
+            if policyData.maxCPUTime <> CommonUtils.UNDEFMAXITEM:
+                ceMaxCPUTime = policyData.maxCPUTime
+            if policyData.maxCPUPerJob <> CommonUtils.UNDEFMAXITEM:
+                ceSlotsPerJob = policyData.maxCPUPerJob
+            if policyData.priority <> CommonUtils.UNDEFPRIORITY:
+                cePriority = policyData.priority
 
             
         out.write(glue1DN + '\n')
@@ -141,7 +153,7 @@ def process(config, infoContainer, acctContainer, slurmCfg):
         else:
             out.write('GlueCEPolicyMaxSlotsPerJob: %d\n' % MAX_INT32)
 
-        if CommonUtils.interfaceIsOff(config):
+        if ifaceOff:
             out.write('GlueCEStateStatus: Draining\n')
         else:
             out.write('GlueCEStateStatus: %s\n' % ceState)
@@ -163,23 +175,20 @@ def process(config, infoContainer, acctContainer, slurmCfg):
             vMaxCPUPerJob = ceSlotsPerJob
             vPriority = cePriority
 
-            if acctContainer <> None:
-                try:
-                    tmpPol = acctContainer.policyTable[voName, queue]
-                    if tmpPol.maxWallTime <> CommonUtils.UNDEFMAXITEM:
-                        vMaxWallTime = tmpPol.maxWallTime
-                    if tmpPol.maxCPUTime <> CommonUtils.UNDEFMAXITEM:
-                        vMaxCPUTime = tmpPol.maxCPUTime
-                    if tmpPol.maxRunJobs <> CommonUtils.UNDEFMAXITEM:
-                        vMaxRunJobs = tmpPol.maxRunJobs
-                    if tmpPol.maxTotJobs <> CommonUtils.UNDEFMAXITEM:
-                        vMaxTotJobs = tmpPol.maxTotJobs
-                    if tmpPol.maxCPUPerJob <> CommonUtils.UNDEFMAXITEM:
-                        vMaxCPUPerJob = tmpPol.maxCPUPerJob
-                    if tmpPol.priority <> CommonUtils.UNDEFPRIORITY:
-                        vPriority = tmpPol.priority
-                except:
-                    logger.debug("No policy from accounting", exc_info=True)
+            tmpPol = effPolicyTable.get((voName, queue))
+            if tmpPol <> None:
+                if tmpPol.maxWallTime <> CommonUtils.UNDEFMAXITEM:
+                    vMaxWallTime = tmpPol.maxWallTime
+                if tmpPol.maxCPUTime <> CommonUtils.UNDEFMAXITEM:
+                    vMaxCPUTime = tmpPol.maxCPUTime
+                if tmpPol.maxRunJobs <> CommonUtils.UNDEFMAXITEM:
+                    vMaxRunJobs = tmpPol.maxRunJobs
+                if tmpPol.maxTotJobs <> CommonUtils.UNDEFMAXITEM:
+                    vMaxTotJobs = tmpPol.maxTotJobs
+                if tmpPol.maxCPUPerJob <> CommonUtils.UNDEFMAXITEM:
+                    vMaxCPUPerJob = tmpPol.maxCPUPerJob
+                if tmpPol.priority <> CommonUtils.UNDEFPRIORITY:
+                    vPriority = tmpPol.priority
                 
             out.write(viewDN + '\n')
             if ceTotCPU <> CommonUtils.UNDEFMAXITEM:
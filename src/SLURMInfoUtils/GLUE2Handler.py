@@ -23,15 +23,27 @@ from SLURMInfoUtils import CommonUtils
 MAX_UINT32 = 2**32-1
 MAX_UINT64 = 2**64-1
 
-def process(config, infoContainer, memInfoContainer, acctContainer, slurmCfg, gpuStats=None):
+def process(config, infoContainer, memInfoContainer, acctContainer, slurmCfg, gpuStats=None, out=None,
+            ifaceOff=None):
     
-    out = sys.stdout
+    if out == None:
+        out = sys.stdout
+
+    if ifaceOff == None:
+        ifaceOff = CommonUtils.interfaceIsOff(config)
 
     logger = logging.getLogger("GLUE2Handler")
     
     now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
 
-    glue2QueueTable, managerTable = CommonUtils.parseLdif(config["bdii-configfile"], 'GLUE2')
+    glue2QueueTable, managerTable = CommonUtils.parseLdif(config["bdii-configfile"], 'GLUE2', config.get('cache_dir'),
+                                                          config.get('ldif_workers', 1))
+    
+    if acctContainer <> None:
+        policyKeys = [ (shData['vo'], shData['queue']) for shData in glue2QueueTable.values() ]
+        effPolicyTable = acctContainer.policyTable.resolve(policyKeys)
+    else:
+        effPolicyTable = dict()
             
     for managerDN in managerTable:
         
@@ -76,21 +88,18 @@ def process(config, infoContainer, memInfoContainer, acctContainer, slurmCfg, gp
         #
         # Retrieve infos from accounting (if available)
         #
-        if acctContainer <> None:
-            try:
-                policyData = acctContainer.policyTable[voname, queue]
-                if policyData.maxWallTime <> CommonUtils.UNDEFMAXITEM:
-                    maxWallTime = policyData.maxWallTime
-                if policyData.maxRunJobs <> CommonUtils.UNDEFMAXITEM:
-                    maxRunJobs = policyData.maxRunJobs
-                if policyData.maxTotJobs <> CommonUtils.UNDEFMAXITEM:
-                    maxTotJobs = policyData.maxTotJobs
-                if policyData.maxCPUTime <> CommonUtils.UNDEFMAXITEM:
-                    maxCPUTime = policyData.maxCPUTime
-                if policyData.maxCPUPerJob <> CommonUtils.UNDEFMAXITEM:
-                    slotsPerJob = policyData.maxCPUPerJob
-            except:
-                logger.debug("No policy from accounting", exc_info=True)
+        policyData = effPolicyTable.get((voname, queue))
+        if policyData <> None:
+            if policyData.maxWallTime <> CommonUtils.UNDEFMAXITEM:
+                maxWallTime = policyData.maxWallTime
+            if policyData.maxRunJobs <> CommonUtils.UNDEFMAXITEM:
+                maxRunJobs = policyData.maxRunJobs
+            if policyData.maxTotJobs <> CommonUtils.UNDEFMAXITEM:
+                maxTotJobs = policyData.maxTotJobs
+            if policyData.maxCPUTime <> CommonUtils.UNDEFMAXITEM:
+                maxCPUTime = policyData.maxCPUTime
+            if policyData.maxCPUPerJob <> CommonUtils.UNDEFMAXITEM:
+                slotsPerJob = policyData.maxCPUPerJob
 
         out.write(glue2DN + '\n')
             
@@ -152,7 +161,10 @@ def process(config, infoContainer, memInfoContainer, acctContainer, slurmCfg, gp
             out.write('GLUE2ComputingShareMaxMainMemory: %d\n' % MAX_UINT64)
             out.write('GLUE2ComputingShareMaxVirtualMemory: %d\n' % MAX_UINT64)
 
-        out.write('GLUE2ComputingShareServingState: %s\n' % queueState)
+        if ifaceOff:
+            out.write('GLUE2ComputingShareServingState: draining\n')
+        else:
+            out.write('GLUE2ComputingShareServingState: %s\n' % queueState)
 
         out.write('GLUE2EntityCreationTime: %s\n' % now)
         out.write('\n')
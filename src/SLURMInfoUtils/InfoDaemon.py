@@ -0,0 +1,188 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import os, os.path
+import time
+import signal
+import tempfile
+import cStringIO
+import logging
+
+from SLURMInfoUtils import CommonUtils
+from SLURMInfoUtils import SnapshotCache
+from SLURMInfoUtils import JobOutput
+
+logger = logging.getLogger("InfoDaemon")
+
+GLUEFILE = 'glue.ldif'
+
+
+def getJobsFile(outFormat):
+    return 'jobs.' + outFormat
+
+
+def openPublished(config, name):
+
+    #
+    # Client side: returns the file rendered by the daemon or None
+    # if the daemon is not configured, not running or late
+    #
+    outDir = config.get('daemon_dir', None)
+    if not outDir:
+        return None
+    
+    try:
+        pubFile = open(os.path.join(outDir, name), 'rb')
+    except IOError:
+        logger.warning("Missing %s in %s, is the daemon running?", name, outDir)
+        return None
+    
+    age = time.time() - os.fstat(pubFile.fileno()).st_mtime
+    if age > config['daemon_max_age']:
+        logger.warning("Discarded %s, last refresh %ds ago", name, age)
+        pubFile.close()
+        return None
+    
+    return pubFile
+
+
+class InfoDaemon:
+
+    #
+    # Refreshes the LRMS data periodically; the GLUE output and the job
+    # lists are rendered in memory and then replace atomically the files
+    # read by the clients. A refresh that fails keeps the previous data.
+    # The commands of the GLUE data and of the job list run together
+    #
+    def __init__(self, configFile, glueCollector, glueRenderer):
+        self.configFile = configFile
+        self.glueCollector = glueCollector
+        self.glueRenderer = glueRenderer
+        self.reloadRequested = False
+        self.stopRequested = False
+        self.loadConfig()
+    
+    def loadConfig(self):
+        config = CommonUtils.readConfigFile(self.configFile)
+        if not config.get('daemon_dir'):
+            raise Exception("FATAL: Missing output_dir in section Daemon of the config file")
+        
+        if not os.path.isdir(config['daemon_dir']):
+            os.makedirs(config['daemon_dir'])
+        
+        CommonUtils.ldifIndexTable.clear()
+        CommonUtils.setCommandTimeout(config['command_timeout'])
+        self.cache = SnapshotCache.SnapshotCache(config)
+        self.config = config
+    
+    def handleReload(self, signum, frame):
+        self.reloadRequested = True
+    
+    def handleStop(self, signum, frame):
+        self.stopRequested = True
+    
+    def run(self):
+    
+        signal.signal(signal.SIGHUP, self.handleReload)
+        signal.signal(signal.SIGTERM, self.handleStop)
+        signal.signal(signal.SIGINT, self.handleStop)
+        for signum in [ signal.SIGHUP, signal.SIGTERM, signal.SIGINT ]:
+            signal.siginterrupt(signum, False)
+        
+        while not self.stopRequested:
+        
+            if self.reloadRequested:
+                self.reloadRequested = False
+                try:
+                    self.loadConfig()
+                    logger.info("Configuration reloaded from %s", self.configFile)
+                except:
+                    logger.error("Cannot reload %s, using the previous configuration",
+                                 self.configFile, exc_info=True)
+            
+            nextRefresh = time.time() + self.config['daemon_refresh']
+            self.refresh()
+            
+            while not self.stopRequested and not self.reloadRequested:
+                delay = nextRefresh - time.time()
+                if delay <= 0:
+                    break
+                time.sleep(delay)
+    
+    def refresh(self):
+    
+        CommonUtils.setRunBudget(self.config['run_budget'])
+        newTable = dict()
+        collection = CommonUtils.Collection(self.cache)
+        
+        try:
+            self.glueCollector(self.config, collection)
+            glueStarted = True
+        except:
+            logger.error("Cannot refresh the GLUE data", exc_info=True)
+            glueStarted = False
+        
+        collection.load('jobs', JobOutput.getSnapshotName(self.config), 'jobs',
+                        JobOutput.collectJobs(JobOutput.getJobHandler(self.config), self.config['clusters']))
+        
+        try:
+            collection.run()
+        except:
+            logger.error("Cannot collect the LRMS data", exc_info=True)
+        
+        try:
+            if glueStarted:
+                buffer = cStringIO.StringIO()
+                self.glueRenderer(self.config, collection, buffer)
+                newTable[GLUEFILE] = buffer.getvalue()
+        except:
+            logger.error("Cannot refresh the GLUE data", exc_info=True)
+        
+        try:
+            jobList = collection.get('jobs')
+            for outFormat in JobOutput.OUTFORMATS:
+                buffer = cStringIO.StringIO()
+                JobOutput.writeJobs(jobList, outFormat, buffer)
+                newTable[getJobsFile(outFormat)] = buffer.getvalue()
+        except:
+            logger.error("Cannot refresh the job list", exc_info=True)
+        
+        for name, data in newTable.iteritems():
+            self.writeFile(name, data)
+        
+        CommonUtils.reportStats('info-dynamic-slurm --daemon', self.config.get('stats_file', None))
+    
+    def writeFile(self, name, data):
+    
+        tmpName = None
+        try:
+            tmpfd, tmpName = tempfile.mkstemp('.tmp', name, self.config['daemon_dir'])
+            os.fchmod(tmpfd, 0644)
+            pubFile = os.fdopen(tmpfd, 'wb')
+            try:
+                pubFile.write(data)
+            finally:
+                pubFile.close()
+            
+            os.rename(tmpName, os.path.join(self.config['daemon_dir'], name))
+            tmpName = None
+        
+        except:
+            logger.error("Cannot publish %s", name, exc_info=True)
+        
+        if tmpName and os.path.exists(tmpName):
+            os.remove(tmpName)
+
@@ -0,0 +1,255 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import os, os.path
+import time
+import json
+import fcntl
+import tempfile
+import cPickle
+import logging
+
+from SLURMInfoUtils import CommonUtils
+from SLURMInfoUtils import SControlInfoHandler
+from SLURMInfoUtils import SQueueHandler
+from SLURMInfoUtils import JobStore
+from SLURMInfoUtils import ClusterModel
+
+OUTFORMATS = [ 'dict', 'jsonl' ]
+
+logger = logging.getLogger("JobOutput")
+
+
+class StreamContainer:
+
+    def __init__(self, stream):
+        self.stream = stream
+        
+    def append(self, table):
+        self.stream.write(str(table) + "\n")
+    
+    def flush(self):
+        pass
+
+
+def decodeTable(table):
+    result = dict()
+    for key, value in table.iteritems():
+        if isinstance(value, str):
+            value = value.decode('utf-8', 'replace')
+        result[key] = value
+    return result
+
+
+class JSONStreamContainer:
+
+    #
+    # One compact JSON object per line, with sorted keys;
+    # lines are written in large chunks
+    #
+    def __init__(self, stream, bufferSize=4096):
+        self.stream = stream
+        self.bufferSize = bufferSize
+        self.buffer = list()
+        self.encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+        
+    def append(self, table):
+        try:
+            self.buffer.append(self.encoder.encode(table))
+        except UnicodeDecodeError:
+            #
+            # Job names are not necessarily UTF-8: the invalid bytes are
+            # replaced instead of failing the whole listing
+            #
+            self.buffer.append(self.encoder.encode(decodeTable(table)))
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+    
+    def flush(self):
+        if len(self.buffer) > 0:
+            self.buffer.append('')
+            self.stream.write('\n'.join(self.buffer))
+            self.buffer = list()
+
+
+def getContainer(outFormat, stream):
+    if outFormat == 'jsonl':
+        return JSONStreamContainer(stream)
+    return StreamContainer(stream)
+
+
+def getJobHandler(config):
+    if config.get('job_source', 'scontrol') == 'squeue':
+        return SQueueHandler
+    return SControlInfoHandler
+
+
+def getSnapshotName(config):
+
+    #
+    # The job list depends on the backend and on the clusters queried:
+    # a change of the configuration does not reuse the old snapshot
+    #
+    name = 'jobs-' + config.get('job_source', 'scontrol')
+    if config.get('clusters'):
+        name += '@' + ','.join(config['clusters'])
+    return name
+
+
+def collectJobs(jobHandler, clusters=None):
+
+    #
+    # Steps collecting the jobs: the jobs of several clusters are
+    # collected together and merged, only the jobs of the first
+    # cluster are mandatory
+    #
+    if not clusters:
+        jobList = JobStore.JobStore()
+        yield jobHandler.jobInfoStep(jobList)
+        yield jobList
+        return
+    
+    stepList = list()
+    for cluster in clusters:
+        step = jobHandler.jobInfoStep(JobStore.JobStore(), cluster=cluster)
+        step.check = cluster == clusters[0]
+        stepList.append(step)
+    
+    commands = yield stepList
+    
+    clusterJobs = list()
+    for idx in range(len(clusters)):
+        if commands[idx].error:
+            logger.warning("Skipped jobs of cluster %s: %s", clusters[idx], commands[idx].error)
+        else:
+            clusterJobs.append((clusters[idx], commands[idx].container.jobTables))
+    
+    yield ClusterModel.mergeJobs(clusterJobs, clusters[0])
+
+
+def loadJobs(jobHandler, clusters=None):
+    return CommonUtils.runSteps(collectJobs(jobHandler, clusters))
+
+
+def writeJobs(jobList, outFormat, stream):
+    container = getContainer(outFormat, stream)
+    for jTable in jobList:
+        container.append(jTable)
+    container.flush()
+
+
+def loadDiffState(stateFile):
+
+    stFile = None
+    try:
+        try:
+            stFile = open(stateFile, 'rb')
+            if CommonUtils.isOwned(stFile, stateFile):
+                return cPickle.load(stFile)
+        except IOError:
+            pass
+        except:
+            logger.warning("Cannot read the job state from %s", stateFile, exc_info=True)
+    finally:
+        if stFile:
+            stFile.close()
+
+    return (0, None)
+
+
+def storeDiffState(stateFile, lastSync, jobTable):
+
+    stateDir = os.path.dirname(os.path.abspath(stateFile))
+    tmpName = None
+    try:
+        tmpfd, tmpName = tempfile.mkstemp('.tmp', os.path.basename(stateFile), stateDir)
+        stFile = os.fdopen(tmpfd, 'wb')
+        try:
+            cPickle.dump((lastSync, jobTable), stFile, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            stFile.close()
+
+        os.rename(tmpName, stateFile)
+        tmpName = None
+
+    finally:
+        if tmpName and os.path.exists(tmpName):
+            os.remove(tmpName)
+
+
+def writeJobDiff(jobList, outFormat, stream, stateFile, resyncInterval):
+
+    #
+    # Only the jobs added, changed or removed since the previous run are
+    # written, marked by the 'change' key; the whole list is written
+    # on the first run and every resyncInterval seconds.
+    # Concurrent runs would compute the changes against the same state,
+    # the changes written by one of them would be lost for the consumer
+    # of the other: the state is locked from loading to storing
+    #
+    lockFile = open(stateFile + '.lock', 'a')
+    try:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        
+        lastSync, prevStore = loadDiffState(stateFile)
+        now = time.time()
+        
+        #
+        # The state of the previous run is kept as a job store, a state
+        # saved in a different format forces a full listing
+        #
+        if not isinstance(prevStore, JobStore.JobStore):
+            prevStore = None
+        
+        if isinstance(jobList, JobStore.JobStore):
+            jobStore = jobList
+        else:
+            jobStore = JobStore.JobStore()
+            for jTable in jobList:
+                jobStore.append(jTable)
+        
+        container = getContainer(outFormat, stream)
+        
+        if prevStore == None or now - lastSync >= resyncInterval:
+            stream.write("diffMode     full\n")
+            for jTable in jobStore:
+                container.append(jTable)
+            lastSync = now
+        
+        else:
+            stream.write("diffMode     incremental\n")
+            prevIndex = prevStore.getIndex(ClusterModel.jobKey)
+            for jTable in jobStore:
+                prevRow = prevIndex.pop(ClusterModel.jobKey(jTable['jobid'], jTable['queue']), None)
+                if prevRow == None:
+                    change = 'added'
+                elif prevStore.getJob(prevRow) <> jTable:
+                    change = 'changed'
+                else:
+                    continue
+                jTable['change'] = change
+                container.append(jTable)
+            
+            for prevRow in sorted(prevIndex.values()):
+                container.append({ 'jobid' : prevStore.getJobId(prevRow),
+                                   'queue' : prevStore.queues[prevRow],
+                                   'change' : 'removed' })
+        
+        container.flush()
+        
+        storeDiffState(stateFile, lastSync, jobStore)
+    finally:
+        lockFile.close()
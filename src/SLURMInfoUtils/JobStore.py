@@ -0,0 +1,195 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+from array import array
+from itertools import izip
+
+#
+# Optional numeric values are stored as -1 when missing
+#
+UNDEFVALUE = -1
+
+
+class StringColumn:
+
+    #
+    # Each distinct string is kept once, the rows hold its code
+    #
+    def __init__(self, typecode='I'):
+        self.codes = array(typecode)
+        self.values = list()
+        self.index = dict()
+    
+    def append(self, value):
+        try:
+            self.codes.append(self.index[value])
+        except KeyError:
+            self.index[value] = len(self.values)
+            self.values.append(intern(value))
+            self.codes.append(self.index[value])
+    
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+    
+    def __len__(self):
+        return len(self.codes)
+
+
+class JobStore:
+
+    #
+    # Column-oriented list of the job tables produced by the job handlers;
+    # it is filled with append() like a list and yields the same tables,
+    # built on demand. Keys other than the standard ones are kept per row.
+    #
+    def __init__(self):
+        self.states = StringColumn('B')
+        self.queues = StringColumn('H')
+        self.users = StringColumn('I')
+        self.groups = StringColumn('I')
+        self.names = list()
+        self.jobids = array('l')
+        self.cpucounts = array('l')
+        self.maxwalltimes = array('l')
+        self.qtimes = array('l')
+        self.starts = array('l')
+        
+        self.jobidStrings = dict()
+        self.extraTables = dict()
+    
+    def append(self, jTable):
+    
+        row = len(self.jobids)
+        
+        jobid = jTable['jobid']
+        if jobid.isdigit() and (jobid[0] <> '0' or jobid == '0'):
+            self.jobids.append(int(jobid))
+        else:
+            self.jobids.append(UNDEFVALUE)
+            self.jobidStrings[row] = jobid
+        
+        self.states.append(jTable['state'])
+        self.queues.append(jTable['queue'])
+        self.users.append(jTable['user'])
+        self.groups.append(jTable['group'])
+        self.names.append(intern(jTable['name']))
+        self.cpucounts.append(jTable['cpucount'])
+        self.maxwalltimes.append(jTable.get('maxwalltime', UNDEFVALUE))
+        self.qtimes.append(jTable['qtime'])
+        self.starts.append(jTable.get('start', UNDEFVALUE))
+        
+        if len(jTable) > len(JOBKEYS) - (not 'maxwalltime' in jTable) - (not 'start' in jTable):
+            extra = dict()
+            for key in jTable:
+                if not key in JOBKEYS:
+                    extra[key] = jTable[key]
+            self.extraTables[row] = extra
+    
+    def getJobId(self, row):
+        if row in self.jobidStrings:
+            return self.jobidStrings[row]
+        return str(self.jobids[row])
+    
+    def getJob(self, row):
+    
+        #
+        # The keys are inserted in the order used by the job handlers
+        #
+        jTable = dict()
+        jTable['state'] = self.states[row]
+        jTable['jobid'] = self.getJobId(row)
+        jTable['name'] = self.names[row]
+        jTable['user'] = self.users[row]
+        jTable['group'] = self.groups[row]
+        jTable['queue'] = self.queues[row]
+        jTable['cpucount'] = self.cpucounts[row]
+        if self.maxwalltimes[row] <> UNDEFVALUE:
+            jTable['maxwalltime'] = self.maxwalltimes[row]
+        jTable['qtime'] = self.qtimes[row]
+        if self.starts[row] <> UNDEFVALUE:
+            jTable['start'] = self.starts[row]
+        
+        if row in self.extraTables:
+            jTable.update(self.extraTables[row])
+        return jTable
+    
+    def getIndex(self, keyFunc=None):
+    
+        #
+        # keyFunc(jobid, queue) returns the key of a row, the job id if missing
+        #
+        result = dict()
+        for row in xrange(len(self.jobids)):
+            if keyFunc:
+                result[keyFunc(self.getJobId(row), self.queues[row])] = row
+            else:
+                result[self.getJobId(row)] = row
+        return result
+    
+    def __len__(self):
+        return len(self.jobids)
+    
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self.jobids)
+        if row < 0 or row >= len(self.jobids):
+            raise IndexError("Job index out of range")
+        return self.getJob(row)
+    
+    def __iter__(self):
+        for row in xrange(len(self.jobids)):
+            yield self.getJob(row)
+    
+    def _groupCodes(self, fields):
+        return [ getattr(self, AGGREGATEFIELDS[field]) for field in fields ]
+    
+    def countJobs(self, *fields):
+    
+        #
+        # Number of jobs for each combination of values of the given
+        # fields ('state', 'queue', 'user', 'group'), computed on the codes
+        #
+        if len(fields) == 0:
+            return { () : len(self.jobids) }
+        
+        columns = self._groupCodes(fields)
+        codeTable = dict()
+        for codes in izip(*[ column.codes for column in columns ]):
+            codeTable[codes] = codeTable.get(codes, 0) + 1
+        return self._decode(columns, codeTable)
+    
+    def sumCPUs(self, *fields):
+    
+        if len(fields) == 0:
+            return { () : sum(self.cpucounts) }
+        
+        columns = self._groupCodes(fields)
+        codeTable = dict()
+        for item in izip(self.cpucounts, *[ column.codes for column in columns ]):
+            codeTable[item[1:]] = codeTable.get(item[1:], 0) + item[0]
+        return self._decode(columns, codeTable)
+    
+    def _decode(self, columns, codeTable):
+        result = dict()
+        for codes, value in codeTable.iteritems():
+            key = tuple([ columns[idx].values[codes[idx]] for idx in range(len(columns)) ])
+            result[key] = value
+        return result
+
+
+JOBKEYS = [ 'state', 'jobid', 'name', 'user', 'group', 'queue', 'cpucount', 'maxwalltime', 'qtime', 'start' ]
+
+AGGREGATEFIELDS = { 'state' : 'states', 'queue' : 'queues', 'user' : 'users', 'group' : 'groups' }
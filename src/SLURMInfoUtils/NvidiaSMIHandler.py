@@ -27,47 +27,140 @@ from SLURMInfoUtils import CommonUtils
 logger = logging.getLogger("NvidiaSMIHandler")
 
 
-class GPUInfoHandler(Thread):
+class GPUInfoHandler(CommonUtils.StreamHandler):
 
     def __init__(self):
-        Thread.__init__(self)
-        self.errList = list()
-
-    def setStream(self, stream):
-        self.stream = stream
+        CommonUtils.StreamHandler.__init__(self)
         self.num_of_procs = dict()
       
-    def run(self):
-
-        try:
-            line = self.stream.readline()
-            while line:
-                tmptuple = line.strip().split(',')
-                if len(tmptuple) == 2:
-                    gpu_uuid = tmptuple[0].strip()
-                    if not gpu_uuid in self.num_of_procs:
-                        self.num_of_procs[gpu_uuid] = 1
-                    else:
-                        self.num_of_procs[gpu_uuid] += 1
+    def parseLine(self, line):
+        tmptuple = line.strip().split(',')
+        if len(tmptuple) <> 2:
+            return False
+        
+        gpu_uuid = tmptuple[0].strip()
+        if not gpu_uuid in self.num_of_procs:
+            self.num_of_procs[gpu_uuid] = 1
+        else:
+            self.num_of_procs[gpu_uuid] += 1
 
-                line = self.stream.readline()
-        except:
-            logger.debug("Error parsing nvidia-smi output", exc_info=True)
-            self.errList.append(CommonUtils.errorMsgFromTrace())
 
-
-def parseGPUInfo(cudaHost, filename=None):
+def gpuInfoStep(cudaHost, filename=None, timeout=None):
 
     if filename:
         cmd = shlex.split('cat ' + filename)
     else:
         smi_cmd = '"nvidia-smi --query-compute-apps=gpu_uuid,pid --format=csv,noheader"'
         ssh_opts = '-o PasswordAuthentication=no'
+        if timeout:
+            ssh_opts += ' -o ConnectTimeout=%d' % max(int(timeout), 1)
         cmd = shlex.split('ssh %s %s %s' % (ssh_opts, cudaHost, smi_cmd))
             
     logger.debug("Calling executable: " + repr(cmd))
 
-    container = GPUInfoHandler()
-    CommonUtils.parseStream(cmd, container)
-    return container
+    return CommonUtils.StreamStep(cmd, GPUInfoHandler(), timeout)
+
+
+def parseGPUInfo(cudaHost, filename=None, timeout=None):
+    return CommonUtils.runSteps(gpuInfoStep(cudaHost, filename, timeout))
+
+
+class GPUProbes:
+
+    #
+    # Probes the nodes in the collection with at most workers commands
+    # running; nodes not answering within the per-probe timeout or
+    # before the deadline count as unreachable. The callback receives
+    # the statistics when all the probes are complete. The tables merged
+    # from several clusters are keyed by (cluster, node)
+    #
+    def __init__(self, collection, gpuTable, workers=8, timeout=10, deadline=60, callback=None):
+        self.collection = collection
+        self.callback = callback
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.stopTime = time.time() + deadline
+        
+        self.totalGPUSlots = 0
+        self.nodeList = list()
+        for nodeName, gpuNum in gpuTable.iteritems():
+            if gpuNum > 0:
+                self.totalGPUSlots += gpuNum
+                self.nodeList.append(nodeName)
+        self.nodeNum = len(self.nodeList)
+        
+        self.probed = dict()
+        self.running = 0
+        self.starting = False
+        self.done = False
+
+    def start(self):
+    
+        #
+        # A probe that cannot be run completes while it is started:
+        # the next one is started by the loop below
+        #
+        if self.starting:
+            return
+        self.starting = True
+        try:
+            while self.running < self.workers and len(self.nodeList) > 0:
+                remaining = self.stopTime - time.time()
+                if remaining <= 0:
+                    del self.nodeList[:]
+                    break
+                
+                nodeName = self.nodeList.pop()
+                if isinstance(nodeName, tuple):
+                    hostName = nodeName[1]
+                else:
+                    hostName = nodeName
+                
+                def completed(smiHandler, error, nodeName=nodeName):
+                    self.running -= 1
+                    if error <> None:
+                        logger.debug("Cannot probe GPUs on %s: %s", nodeName, error)
+                        self.probed[nodeName] = None
+                    else:
+                        usedGPUs = 0
+                        for nProcs in smiHandler.num_of_procs.values():
+                            if nProcs > 0:
+                                usedGPUs += 1
+                        self.probed[nodeName] = usedGPUs
+                    self.start()
+                
+                self.running += 1
+                self.collection.start(gpuInfoStep(hostName, timeout=min(self.timeout, remaining)),
+                                      completed)
+        finally:
+            self.starting = False
+        
+        if self.running == 0 and len(self.nodeList) == 0 and not self.done:
+            self.done = True
+            if self.callback:
+                self.callback(self.getStats())
+
+    def getStats(self):
+    
+        #
+        # Returns (total, used, unreachable)
+        #
+        usedGPUSlots = 0
+        for usedGPUs in self.probed.values():
+            if usedGPUs <> None:
+                usedGPUSlots += usedGPUs
+        unreachable = self.nodeNum - len(self.probed) + self.probed.values().count(None)
+        
+        if unreachable > 0:
+            logger.warning("GPU usage not available for %d nodes out of %d", unreachable, self.nodeNum)
+        
+        return (self.totalGPUSlots, usedGPUSlots, unreachable)
+
+
+def parseGPUStats(gpuTable, workers=8, timeout=10, deadline=60):
 
+    collection = CommonUtils.Collection()
+    probes = GPUProbes(collection, gpuTable, workers, timeout, deadline)
+    probes.start()
+    collection.run()
+    return probes.getStats()
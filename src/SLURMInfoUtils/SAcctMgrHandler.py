@@ -15,16 +15,18 @@
 # limitations under the License.
 
 import sys
+import time
 import shlex
 import subprocess
 import pwd
 import grp
 import logging
-from threading import Thread
 
 from SLURMInfoUtils import CommonUtils
 
-class PolicyData:
+class PolicyData(object):
+
+    __slots__ = ('maxWallTime', 'maxCPUTime', 'maxCPUPerJob', 'maxRunJobs', 'maxTotJobs', 'priority')
 
     def __init__(self):
         self.maxWallTime = CommonUtils.UNDEFMAXITEM
@@ -52,8 +54,14 @@ VOGRP=0
 QUEUE=1
 class PolicyTable:
 
+    #
+    # voIndex and queueIndex keep the merged policy of all the
+    # entries with a given VO or queue, for the partial-key lookups
+    #
     def __init__(self):
         self.table = dict()
+        self.voIndex = dict()
+        self.queueIndex = dict()
     
     def __getitem__(self, kTuple):
     
@@ -65,22 +73,42 @@ class PolicyTable:
         if nTuple[VOGRP] <> None or nTuple[QUEUE] <> None:
             if nTuple in self.table:
                 return self.table[nTuple]
-                
-            foundKey = False
-            tmpPol = PolicyData()
-            for tmpt in self.table:
-                if (nTuple[VOGRP] <> None and tmpt[0] == nTuple[VOGRP]) \
-                    or (nTuple[QUEUE] <> None and tmpt[1] == nTuple[QUEUE]):
-                    foundKey = True
-                    tmpPol += self.table[tmpt]
-            if foundKey:
+            
+            if nTuple[VOGRP] <> None:
+                aggPol = self.voIndex.get(nTuple[VOGRP])
+            else:
+                aggPol = self.queueIndex.get(nTuple[QUEUE])
+            
+            if aggPol <> None:
+                tmpPol = PolicyData()
+                tmpPol += aggPol
                 return tmpPol
         
         raise KeyError("Missing key: %s %s" % kTuple)
         
 
     def __setitem__(self, kTuple, data):
-        self.table[self._normTuple(kTuple)] = data
+    
+        nTuple = self._normTuple(kTuple)
+        oldData = self.table.get(nTuple)
+        self.table[nTuple] = data
+        
+        if oldData <> None and oldData is not data:
+            self._rebuildIndex(nTuple)
+            return
+        
+        #
+        # Values can only grow with +=, merging again is enough
+        #
+        if nTuple[VOGRP] <> None:
+            if not nTuple[VOGRP] in self.voIndex:
+                self.voIndex[nTuple[VOGRP]] = PolicyData()
+            self.voIndex[nTuple[VOGRP]] += data
+        
+        if nTuple[QUEUE] <> None:
+            if not nTuple[QUEUE] in self.queueIndex:
+                self.queueIndex[nTuple[QUEUE]] = PolicyData()
+            self.queueIndex[nTuple[QUEUE]] += data
     
     def __contains__(self, kTuple):
     
@@ -90,16 +118,54 @@ class PolicyTable:
             return nTuple in self.table
         
         if nTuple[VOGRP] <> None:
+            return nTuple[VOGRP] in self.voIndex
+
+        if nTuple[QUEUE] <> None:
+            return nTuple[QUEUE] in self.queueIndex
+
+        return False
+    
+    def resolve(self, keyList):
+    
+        #
+        # Computes the effective policy for each (VO, queue) key once;
+        # keys without any policy are not included in the result
+        #
+        effTable = dict()
+        for kTuple in keyList:
+            if kTuple in effTable or not kTuple in self:
+                continue
+            
+            nTuple = self._normTuple(kTuple)
+            if nTuple[VOGRP] <> None and nTuple[QUEUE] <> None:
+                effPol = self.table[nTuple]
+            elif nTuple in self.table:
+                effPol = self.table[nTuple]
+            elif nTuple[VOGRP] <> None:
+                effPol = self.voIndex[nTuple[VOGRP]]
+            else:
+                effPol = self.queueIndex[nTuple[QUEUE]]
+            
+            effTable[kTuple] = PolicyData()
+            effTable[kTuple] += effPol
+        
+        return effTable
+    
+    def _rebuildIndex(self, nTuple):
+    
+        if nTuple[VOGRP] <> None:
+            aggPol = PolicyData()
             for tmpt in self.table:
                 if tmpt[VOGRP] == nTuple[VOGRP]:
-                    return True
-
+                    aggPol += self.table[tmpt]
+            self.voIndex[nTuple[VOGRP]] = aggPol
+        
         if nTuple[QUEUE] <> None:
+            aggPol = PolicyData()
             for tmpt in self.table:
                 if tmpt[QUEUE] == nTuple[QUEUE]:
-                    return True
-
-        return False
+                    aggPol += self.table[tmpt]
+            self.queueIndex[nTuple[QUEUE]] = aggPol
     
     def _normTuple(self, kTuple):
         v = kTuple[VOGRP]
@@ -112,106 +178,257 @@ class PolicyTable:
 
 logger = logging.getLogger("SAcctMgrHandler")
 
-class PolicyInfoHandler(Thread):
+class VOResolver:
 
-    def __init__(self, vomap):
-        Thread.__init__(self)
-        self.errList = list()
-        self.policyTable = PolicyTable()
+    #
+    # Memoizes user -> primary group -> VO, unknown users included,
+    # so that each distinct user costs at most one NSS lookup
+    #
+    def __init__(self, vomap, preload=False):
         self.vomap = vomap
-        self.prioTable = dict()
-
-    def setStream(self, stream):
-        self.stream = stream
+        self.voTable = dict()
+        self.userTable = dict()
+        self.groupTable = dict()
+        
+        if preload:
+            self.preload()
+    
+    def preload(self):
+        try:
+            for pwEntry in pwd.getpwall():
+                self.userTable[pwEntry[0]] = pwEntry[3]
+            for grEntry in grp.getgrall():
+                self.groupTable[grEntry[2]] = grEntry[0]
+        except:
+            logger.debug("Cannot preload users and groups", exc_info=True)
+    
+    def getVO(self, user):
+        if not user:
+            return None
+        
+        if user in self.voTable:
+            return self.voTable[user]
         
-    def getVOForUser(self, user):
         try:
-            if not user:
-                return None
+            if user in self.userTable:
+                grpgid = self.userTable[user]
+            else:
+                grpgid = pwd.getpwnam(user)[3]
+            
+            if grpgid in self.groupTable:
+                grpname = self.groupTable[grpgid]
+            else:
+                grpname = grp.getgrgid(grpgid)[0]
+                self.groupTable[grpgid] = grpname
             
-            grpgid = pwd.getpwnam(user)[3]
-            grpname = grp.getgrgid(grpgid)[0]
             if grpname in self.vomap:
-                return self.vomap[grpname]
-            return grpname
+                self.voTable[user] = self.vomap[grpname]
+            else:
+                self.voTable[user] = grpname
             
         except:
             logger.debug("Cannot find vo for %s", user, exc_info=True)
-            return None
+            self.voTable[user] = None
+        
+        return self.voTable[user]
+
+
+class PolicyInfoHandler(CommonUtils.StreamHandler):
+
+    def __init__(self, vomap, preload=False, prioTable=None, deferParents=False):
+        CommonUtils.StreamHandler.__init__(self)
+        self.policyTable = PolicyTable()
+        self.vomap = vomap
+        self.resolver = VOResolver(vomap, preload)
+        if prioTable <> None:
+            self.prioTable = prioTable
+        else:
+            self.prioTable = dict()
+        
+        #
+        # With deferParents the lines inheriting the priority of a parent
+        # not yet read are kept until resolveParents()
+        #
+        if deferParents:
+            self.deferred = list()
+        else:
+            self.deferred = None
+
+    def getVOForUser(self, user):
+        return self.resolver.getVO(user)
+    
+    def getDeferredAccounts(self):
+        if not self.deferred:
+            return set()
+        return set([ line.split('|')[0] for line in self.deferred ])
     
-    def run(self):
+    def resolveParents(self, prioTable):
+        deferred = self.deferred
+        self.deferred = None
+        for assID in prioTable:
+            self.prioTable.setdefault(assID, prioTable[assID])
+        for line in deferred:
+            self.parseLine(line)
+        self.resolver = None
+    
+    def finish(self):
+    
+        #
+        # The users and groups are not needed after parsing: with the
+        # preload they would be the largest part of the snapshot
+        #
+        if not self.deferred:
+            self.resolver = None
+    
+    def parseLine(self, line):
     
         try:
         
-            line = self.stream.readline()
-        
-            while line:
-                logger.debug('Line: %s' % line)
-                tmpl = line.strip().split('|')
-            
-                try:
-                    account = tmpl[0]
-                    userName = tmpl[1]
-                    queue = tmpl[2]
-            
-                    policy = PolicyData()
-            
-                    tmps = tmpl[6]
-                    if tmps:
-                        policy.maxWallTime = CommonUtils.convertTimeLimit(tmps)
-            
-                    tmps = tmpl[7]
-                    if tmps:
-                        policy.maxCPUTime = int(tmps) * 60
-            
-                    tmps = tmpl[8]
-                    if tmps:
-                        policy.maxCPUPerJob = int(tmps)
+            logger.debug('Line: %s' % line)
+            tmpl = line.strip().split('|')
+
+            account = tmpl[0]
+            userName = tmpl[1]
+            queue = tmpl[2]
+
+            policy = PolicyData()
+
+            tmps = tmpl[6]
+            if tmps:
+                policy.maxWallTime = CommonUtils.convertTimeLimit(tmps)
+
+            tmps = tmpl[7]
+            if tmps:
+                policy.maxCPUTime = int(tmps) * 60
+
+            tmps = tmpl[8]
+            if tmps:
+                policy.maxCPUPerJob = int(tmps)
 
-                    tmps = tmpl[4]
-                    if tmps:
-                        policy.maxRunJobs = int(tmps)
+            tmps = tmpl[4]
+            if tmps:
+                policy.maxRunJobs = int(tmps)
+
+            tmps = tmpl[5]
+            if tmps:
+                policy.maxTotJobs = int(tmps)
+
+            assID = int(tmpl[9])
+            parentID = int(tmpl[10])
+            tmps = tmpl[3]
+            if tmps and tmps <> 'parent':
+                if userName:
+                    policy.priority = int(tmps)
+                else:
+                    logger.debug("Set priority for %d to %s" % (assID, tmps))
+                    self.prioTable[assID] = int(tmps)
+            elif tmps and tmps == 'parent':
+                #
+                # The parent can be missing from a filtered query:
+                # the priority is left undefined
+                #
+                if not parentID in self.prioTable and self.deferred <> None:
+                    self.deferred.append(line)
+                    return
+                if not parentID in self.prioTable:
+                    logger.debug("Missing priority for parent %d of %d" % (parentID, assID))
+                elif userName:
+                    policy.priority = self.prioTable[parentID]
+                else:
+                    logger.debug("Inherited priority for %d from %d" % (assID, parentID))
+                    self.prioTable[assID] = self.prioTable[parentID]
             
-                    tmps = tmpl[5]
-                    if tmps:
-                        policy.maxTotJobs = int(tmps)
-
-                    assID = int(tmpl[9])
-                    parentID = int(tmpl[10])
-                    tmps = tmpl[3]
-                    if tmps and tmps <> 'parent':
-                        if userName:
-                            policy.priority = int(tmps)
-                        else:
-                            logger.debug("Set priority for %d to %s" % (assID, tmps))
-                            self.prioTable[assID] = int(tmps)
-                    elif tmps and tmps == 'parent':
-                        if userName:
-                            policy.priority = self.prioTable[parentID]
-                        else:
-                            logger.debug("Inherited priority for %d from %d" % (assID, parentID))
-                            self.prioTable[assID] = self.prioTable[parentID]
-                
-                    vogrp = self.getVOForUser(userName)
-                    if not vogrp:
-                        continue
+            vogrp = self.getVOForUser(userName)
+            if not vogrp:
+                return False
+
+            if (vogrp, queue) in self.policyTable:
+                logger.debug("Updating (%s,%s): %s" % (vogrp, queue, repr(policy)))
+                self.policyTable[vogrp, queue] += policy
+            else:
+                logger.debug("Inserting (%s,%s): %s" % (vogrp, queue, repr(policy)))
+                self.policyTable[vogrp, queue] = policy
+
+        except:
+            logger.error("Cannot parse info from accounting", exc_info=True)
+            raise
+
+
+class ParentInfoHandler(CommonUtils.StreamHandler):
+
+    #
+    # Priorities of the associations without user, the ones inherited
+    # by the "parent" fair-shares; the handler can read several queries,
+    # parentNames are the accounts inheriting from an account not yet read
+    #
+    def __init__(self):
+        CommonUtils.StreamHandler.__init__(self)
+        self.prioTable = dict()
+        self.shareTable = dict()
+        self.parentNames = set()
+
+    def parseLine(self, line):
+    
+        try:
+        
+            tmpl = line.strip().split('|')
+            if tmpl[0]:
+                return False
             
-                    if (vogrp, queue) in self.policyTable:
-                        logger.debug("Updating (%s,%s): %s" % (vogrp, queue, repr(policy)))
-                        self.policyTable[vogrp, queue] += policy
-                    else:
-                        logger.debug("Inserting (%s,%s): %s" % (vogrp, queue, repr(policy)))
-                        self.policyTable[vogrp, queue] = policy
-                
-                finally:
-                    line = self.stream.readline()
+            assID = int(tmpl[2])
+            parentID = int(tmpl[3])
+            tmps = tmpl[1]
+            if tmps and tmps <> 'parent':
+                self.shareTable[assID] = (int(tmps), parentID)
+            elif tmps:
+                self.shareTable[assID] = (None, parentID)
+                if len(tmpl) > 4 and tmpl[4]:
+                    self.parentNames.add(tmpl[4])
 
         except:
             logger.error("Cannot parse info from accounting", exc_info=True)
-            self.errList.append(CommonUtils.errorMsgFromTrace())
+            raise
+
+    def finish(self):
+    
+        #
+        # The ancestors can be read after their children
+        #
+        for assID in self.shareTable:
+            visited = set()
+            currID = assID
+            while currID in self.shareTable and self.shareTable[currID][0] == None:
+                if currID in visited:
+                    break
+                visited.add(currID)
+                currID = self.shareTable[currID][1]
+            if currID in self.shareTable and self.shareTable[currID][0] <> None:
+                self.prioTable[assID] = self.shareTable[currID][0]
 
 
-def parsePolicies(**argdict):
+def parentsStep(**argdict):
+
+    if 'filename' in argdict:
+        cmd = shlex.split('cat ' + argdict['filename'])
+    else:
+        cmd = shlex.split('sacctmgr -Pn show associations')
+        if 'cluster' in argdict:
+            cmd.append('cluster=' + argdict['cluster'])
+        if argdict.get('accounts'):
+            cmd.append('account=' + ','.join(argdict['accounts']))
+        cmd.append('format=User,Fairshare,ID,ParentID,ParentName')
+    
+    container = argdict.get('container')
+    if container == None:
+        container = ParentInfoHandler()
+    return CommonUtils.StreamStep(cmd, container)
+
+
+def parseParents(**argdict):
+    return CommonUtils.runSteps(parentsStep(**argdict))
+
+
+def policiesSteps(**argdict):
 
     if 'vomap' in argdict:
         vomap = argdict['vomap']
@@ -223,15 +440,95 @@ def parsePolicies(**argdict):
     else:
         clusterArg = ''
     
+    #
+    # Optional lists of partitions and accounts pushed down to slurmdbd
+    #
+    filterArgs = list()
+    if argdict.get('partitions'):
+        filterArgs.append('partition=' + ','.join(argdict['partitions']))
+    if argdict.get('accounts'):
+        filterArgs.append('account=' + ','.join(argdict['accounts']))
+    
+    preload = argdict.get('preload', False)
+    
     formatArg='format=Account,User,Partition,'
     formatArg += 'Fairshare,MaxJobs,MaxSubmitJobs,MaxWall,MaxCPUMins,MaxCPUs,ID,ParentID'
     
-    cmd = shlex.split('sacctmgr -Pn show associations %s %s' % (clusterArg, formatArg))
+    cmd = shlex.split('sacctmgr -Pn show associations %s %s' % (clusterArg, ' '.join(filterArgs)))
+    cmd.append(formatArg)
+    
+    container = PolicyInfoHandler(vomap, preload, deferParents=len(filterArgs) > 0)
+    yield CommonUtils.StreamStep(cmd, container)
+    
+    if len(filterArgs) == 0:
+        return
+    
+    #
+    # The filters drop the associations without user of the parent
+    # accounts: only if a "parent" fair-share refers to one of them the
+    # rows of the accounts are read, then the ones of their ancestors
+    #
+    parentArgs = { 'container' : ParentInfoHandler() }
+    if 'cluster' in argdict:
+        parentArgs['cluster'] = argdict['cluster']
+    
+    accounts = container.getDeferredAccounts()
+    queried = set()
+    while len(accounts) > 0:
+        queried.update(accounts)
+        parentArgs['accounts'] = sorted(accounts)
+        yield parentsStep(**parentArgs)
+        accounts = parentArgs['container'].parentNames - queried
+    
+    container.resolveParents(parentArgs['container'].prioTable)
+    yield container
+
+
+def parsePolicies(**argdict):
+    return CommonUtils.runSteps(policiesSteps(**argdict))
+
+
+#
+# Transactions that can change the parsed policies, matched
+# against the action ("Add Associations", "Modify Users", ...)
+#
+POLICYACTIONS = ('Associations', 'Users', 'Accounts')
+
+class TransactionInfoHandler(CommonUtils.StreamHandler):
+
+    def __init__(self):
+        CommonUtils.StreamHandler.__init__(self)
+        self.changes = 0
+
+    def parseLine(self, line):
+        action = line.strip()
+        for keyword in POLICYACTIONS:
+            if keyword in action:
+                logger.debug("Found transaction %s" % action)
+                self.changes += 1
+                return
+        return False
+
+
+def transactionsStep(since, filename=None):
+
+    if filename:
+        cmd = shlex.split('cat ' + filename)
+    else:
+        #
+        # The time is truncated to seconds: a transaction in the same
+        # second of the snapshot is considered a change
+        #
+        startArg = 'start=' + time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(since))
+        cmd = shlex.split('sacctmgr -Pn list transactions %s format=Action' % startArg)
     
-    container = PolicyInfoHandler(vomap)
-    CommonUtils.parseStream(cmd, container)
-    return container
+    return CommonUtils.StreamStep(cmd, TransactionInfoHandler())
 
 
+def parseTransactions(since, filename=None):
+    return CommonUtils.runSteps(transactionsStep(since, filename))
 
 
+def checkSteps(timestamp):
+    command = yield transactionsStep(timestamp)
+    yield command.container.changes == 0
@@ -19,193 +19,217 @@ import re
 import time
 import shlex
 import subprocess
-from threading import Thread
 
 import CommonUtils
 
-class NodesInfoHandler(Thread):
+gresIdxRegex = re.compile('\([^)]*\)')
+
+def countGPUs(gresStr):
+
+    #
+    # Format: name[:type][:count][(S:0-1|IDX:0,2)],...
+    #
+    result = 0
+    for tok1 in gresIdxRegex.sub('', gresStr).split(','):
+        tmpt = tok1.split(':')
+        if tmpt[0] == 'gpu':
+            if len(tmpt) > 1 and tmpt[-1].isdigit():
+                result += int(tmpt[-1])
+            else:
+                result += 1
+    return result
+
+def countAllocGPUs(tresStr):
+
+    #
+    # Format: cpu=2,mem=4000M,gres/gpu=2,gres/gpu:a100=2
+    # the untyped entry is the total, typed entries are reported
+    # in addition to it
+    #
+    total = None
+    typed = 0
+    for tok1 in tresStr.split(','):
+        tmpt = tok1.split('=', 1)
+        if len(tmpt) < 2 or not tmpt[1].isdigit():
+            continue
+        if tmpt[0] == 'gres/gpu':
+            total = int(tmpt[1])
+        elif tmpt[0].startswith('gres/gpu:'):
+            typed += int(tmpt[1])
+    if total == None:
+        return typed
+    return total
+
+
+class NodesInfoHandler(CommonUtils.StreamHandler):
 
     def __init__(self):
-        Thread.__init__(self)
-        self.errList = list()
+        CommonUtils.StreamHandler.__init__(self)
         self.ncpu = 0
         self.nfree = 0
         self.gpuTable = dict()
-        self.stateRegex = re.compile('State=(IDLE|COMPLETING|ALLOCATED[+]?|DRAINING|MIXED)')
-        self.tcpuRegex = re.compile('CPUTot=([0-9]+)')
-        self.acpuRegex = re.compile('CPUAlloc=([0-9]+)')
-        self.nodesRegex = re.compile('NodeHostName=([^\s]+)')
-        self.GresRegex = re.compile('Gres=([^\s]+)')
+        self.gpuUsedTable = dict()
+        self.stateRegex = re.compile('IDLE|COMPLETING|ALLOCATED[+]?|DRAINING|MIXED')
+        self.numRegex = re.compile('[0-9]+')
+        self.parser = CommonUtils.RecordParser(['State', 'CPUTot', 'CPUAlloc', 'NodeHostName',
+                                                'Gres', 'AllocTRES'])
     
-    def setStream(self, stream):
-        self.stream = stream
+    def getGPUStats(self):
+        return (sum(self.gpuTable.values()), sum(self.gpuUsedTable.values()), 0)
     
     
-    def run(self):
-        line = self.stream.readline()
+    def parseLine(self, line):
+        record = self.parser.parse(line)
         
-        while line:
-
-            try:
-                parsed = self.stateRegex.search(line)
-                if not parsed:
-                    continue
-                nodeState = parsed.group(1)
-                
-                parsed = self.tcpuRegex.search(line)
-                if not parsed:
-                    continue
-                tcpu = int(parsed.group(1))
-            
-                parsed = self.acpuRegex.search(line)
-                if not parsed:
-                    continue
-                acpu = int(parsed.group(1))
-
-                self.ncpu += tcpu
-                if nodeState <> "DRAINING":
-                    self.nfree += (tcpu - acpu)
-
-                parsed = self.nodesRegex.search(line)
-                if not parsed:
-                    continue
-                nodeName = parsed.group(1)
-                self.gpuTable[nodeName] = 0
-                
-                parsed = self.GresRegex.search(line)
-                if not parsed:
-                    continue
-                for tok1 in parsed.group(1).split(','):
-                    tmpt = tok1.split(':')
-                    if len(tmpt) and tmpt[0] == 'gpu':
-                        self.gpuTable[nodeName] = int(tmpt[-1]) if len(tmpt) > 1 else 1
-
-            finally:
-                line = self.stream.readline()
-
-
-def parseNodesInfo(filename=None):
+        parsed = self.stateRegex.match(record.get('State', ''))
+        if not parsed:
+            return False
+        nodeState = parsed.group(0)
+        
+        parsed = self.numRegex.match(record.get('CPUTot', ''))
+        if not parsed:
+            return False
+        tcpu = int(parsed.group(0))
+    
+        parsed = self.numRegex.match(record.get('CPUAlloc', ''))
+        if not parsed:
+            return False
+        acpu = int(parsed.group(0))
+
+        self.ncpu += tcpu
+        if nodeState <> "DRAINING":
+            self.nfree += (tcpu - acpu)
+
+        nodeName = record.get('NodeHostName')
+        if not nodeName:
+            return
+        self.gpuTable[nodeName] = 0
+        self.gpuUsedTable[nodeName] = 0
+        
+        if not 'Gres' in record:
+            return
+        self.gpuTable[nodeName] = countGPUs(record['Gres'])
+        
+        #
+        # GresUsed is reported only with "show -d", the allocated
+        # GPUs are always available in the AllocTRES field
+        #
+        if not 'AllocTRES' in record:
+            return
+        self.gpuUsedTable[nodeName] = countAllocGPUs(record['AllocTRES'])
+
+
+def nodesInfoStep(filename=None, cluster=None):
     if filename:
         cmd = shlex.split('cat ' + filename)
     else:
-        cmd = shlex.split('scontrol -o show nodes')
+        cmd = ['scontrol'] + CommonUtils.clusterArgs(cluster) + shlex.split('-o show nodes')
     
-    container = NodesInfoHandler()
-    CommonUtils.parseStream(cmd, container)
-    return container
+    return CommonUtils.StreamStep(cmd, NodesInfoHandler())
+
+
+def parseNodesInfo(filename=None, cluster=None):
+    return CommonUtils.runSteps(nodesInfoStep(filename, cluster))
 
 
-class JobInfoHandler(Thread):
+class JobInfoHandler(CommonUtils.StreamHandler):
 
     def __init__(self, container):
-        Thread.__init__(self)
-        self.errList = list()
+        CommonUtils.StreamHandler.__init__(self)
         self.jobTables = container
         
-        self.jidRegex = re.compile('JobId=([^\s]+)')
-        self.nameRegex = re.compile('Name=([^\s]+)')
-        self.uidRegex = re.compile('UserId=([^(]+)')
-        self.gidRegex = re.compile('GroupId=([^(]+)')
-        self.jstateRegex = re.compile('JobState=(RUNNING|PENDING)')
-        self.tlimitRegex = re.compile('TimeLimit=(UNLIMITED|[0-9:-]+)')
-        self.subtimeRegex = re.compile('SubmitTime=([^\s]+)')
-        self.sttimeRegex = re.compile('StartTime=([^\s]+)')
-        self.partRegex = re.compile('Partition=([^\s]+)')
-        self.ncpuRegex = re.compile('NumCPUs=([0-9]+)')
-
-    def setStream(self, stream):
-        self.stream = stream
-    
+        self.jstateRegex = re.compile('RUNNING|PENDING')
+        self.tlimitRegex = re.compile('UNLIMITED|[0-9:-]+')
+        self.numRegex = re.compile('[0-9]+')
+        self.parser = CommonUtils.RecordParser(['JobId', 'Name', 'JobName', 'UserId', 'GroupId',
+                                                'JobState', 'TimeLimit', 'SubmitTime', 'StartTime',
+                                                'Partition', 'NumCPUs'])
     
     def convertTime(self, tstr):
         if tstr == 'Unknown':
             return 0
-        return int(time.mktime(time.strptime(tstr, '%Y-%m-%dT%H:%M:%S')) + time.timezone)
+        return CommonUtils.convertTimestamp(tstr)
     
     
-    def run(self):
-        line = self.stream.readline()
+    def parseLine(self, line):
+        if not ' JobState=RUNNING' in line and not ' JobState=PENDING' in line:
+            return False
         
-        while line:
+        jTable = dict()
+        record = self.parser.parse(line)
+    
+        parsed = self.jstateRegex.match(record.get('JobState', ''))
+        if not parsed:
+            return False
+        if parsed.group(0) == "RUNNING":
+            jTable['state'] = 'running'
+        else:
+            jTable['state'] = 'queued'
         
-            try:
-                jTable = dict()
-            
-                parsed = self.jstateRegex.search(line)
-                if not parsed:
-                    continue
-                if parsed.group(1) == "RUNNING":
-                    jTable['state'] = 'running'
-                else:
-                    jTable['state'] = 'queued'
-                
-                parsed = self.jidRegex.search(line)
-                if not parsed:
-                    continue
-                jTable['jobid'] = parsed.group(1)
-                
-                parsed = self.nameRegex.search(line)
-                if not parsed:
-                    continue
-                jTable['name'] = parsed.group(1)
-                
-                parsed = self.uidRegex.search(line)
-                if not parsed:
-                    continue
-                jTable['user'] = parsed.group(1)
-                
-                parsed = self.gidRegex.search(line)
-                if not parsed:
-                    continue
-                jTable['group'] = parsed.group(1)
-                
-                parsed = self.partRegex.search(line)
-                if not parsed:
-                    continue
-                jTable['queue'] = parsed.group(1)
-                
-                parsed = self.ncpuRegex.search(line)
-                if not parsed:
-                    continue
-                jTable['cpucount'] = int(parsed.group(1))
-                
-                parsed = self.tlimitRegex.search(line)
-                if parsed:
-                    tmpLimit = parsed.group(1)
-                    if tmpLimit <> 'UNLIMITED':
-                        jTable['maxwalltime'] = CommonUtils.convertTimeLimit(tmpLimit)
-                
-                parsed = self.subtimeRegex.search(line)
-                if not parsed:
-                    continue
-                else:
-                    jTable['qtime'] = self.convertTime(parsed.group(1))
-                
-                parsed = self.sttimeRegex.search(line)
-                if parsed:
-                    jTable['start'] = self.convertTime(parsed.group(1))
-                
-                self.jobTables.append(jTable)
-                
-            finally:
-                line = self.stream.readline()
-
-
-def parseJobInfo(outWriter, filename=None):
+        if not record.get('JobId'):
+            return False
+        jTable['jobid'] = record['JobId']
+        
+        if 'Name' in record:
+            jTable['name'] = record['Name']
+        elif 'JobName' in record:
+            jTable['name'] = record['JobName']
+        else:
+            return False
+        
+        tmps = record.get('UserId', '').split('(')[0]
+        if not tmps:
+            return False
+        jTable['user'] = tmps
+        
+        tmps = record.get('GroupId', '').split('(')[0]
+        if not tmps:
+            return False
+        jTable['group'] = tmps
+        
+        if not record.get('Partition'):
+            return False
+        jTable['queue'] = record['Partition']
+        
+        parsed = self.numRegex.match(record.get('NumCPUs', ''))
+        if not parsed:
+            return False
+        jTable['cpucount'] = int(parsed.group(0))
+        
+        parsed = self.tlimitRegex.match(record.get('TimeLimit', ''))
+        if parsed:
+            tmpLimit = parsed.group(0)
+            if tmpLimit <> 'UNLIMITED':
+                jTable['maxwalltime'] = CommonUtils.convertTimeLimit(tmpLimit)
+        
+        if not record.get('SubmitTime'):
+            return False
+        else:
+            jTable['qtime'] = self.convertTime(record['SubmitTime'])
+        
+        if record.get('StartTime'):
+            jTable['start'] = self.convertTime(record['StartTime'])
+        
+        self.jobTables.append(jTable)
+
+
+def jobInfoStep(outWriter, filename=None, cluster=None):
     if filename:
         cmd = shlex.split('cat ' + filename)
     else:
-        cmd = shlex.split('scontrol -o show jobs')
+        cmd = ['scontrol'] + CommonUtils.clusterArgs(cluster) + shlex.split('-o show jobs')
     
-    container = JobInfoHandler(outWriter)
-    CommonUtils.parseStream(cmd, container)
+    return CommonUtils.StreamStep(cmd, JobInfoHandler(outWriter))
+
 
+def parseJobInfo(outWriter, filename=None, cluster=None):
+    CommonUtils.runSteps(jobInfoStep(outWriter, filename, cluster))
 
-class ConfigInfoHandler(Thread):
+
+class ConfigInfoHandler(CommonUtils.StreamHandler):
 
     def __init__(self):
-        Thread.__init__(self)
-        self.errList = list()
+        CommonUtils.StreamHandler.__init__(self)
         self.pRegex = re.compile('^\s*([^=\s]+)\s*=(.+)$')
 
         self.version = ''
@@ -217,44 +241,38 @@ class ConfigInfoHandler(Thread):
         self.clustername = ''
         self.vSizeFactor = 0
         
-    def setStream(self, stream):
-        self.stream = stream
-
-    def run(self):
-        line = self.stream.readline()
+    def parseLine(self, line):
+        parsed = self.pRegex.match(line)
+        if not parsed:
+            return False
         
-        while line:
+        key = parsed.group(1).lower()
+        value = parsed.group(2).strip(' \n\t"')
         
-            parsed = self.pRegex.match(line)
-            if parsed:
-                key = parsed.group(1).lower()
-                value = parsed.group(2).strip(' \n\t"')
-                
-                if key == 'slurm_version':
-                    self.version = value
-                
-                if key == 'selecttype':
-                    self.selectType = value
-                
-                if key == 'selecttypeparameters':
-                    self.selectParams = value
-                    
-                if key == 'maxjobcount':
-                    self.maxJobCount = int(value)
-                
-                if key == 'accountingstoragetype':
-                    self.acctEnabled = value == 'accounting_storage/slurmdbd'
-            
-                if key == 'clustername':
-                    self.clustername = value
+        if key == 'slurm_version':
+            self.version = value
+        
+        if key == 'selecttype':
+            self.selectType = value
+        
+        if key == 'selecttypeparameters':
+            self.selectParams = value
             
-                if key == 'vsizefactor':
-                    parsed = re.compile('\d+').search(value)
-                    if parsed:
-                        self.vSizeFactor = int(parsed.group(0))
-
-            line = self.stream.readline()
+        if key == 'maxjobcount':
+            self.maxJobCount = int(value)
         
+        if key == 'accountingstoragetype':
+            self.acctEnabled = value == 'accounting_storage/slurmdbd'
+    
+        if key == 'clustername':
+            self.clustername = value
+    
+        if key == 'vsizefactor':
+            parsed = re.compile('\d+').search(value)
+            if parsed:
+                self.vSizeFactor = int(parsed.group(0))
+
+    def finish(self):
         if self.selectType == 'select/cons_res':
             if 'CR_CPU' in self.selectParams:
                 self.slotType = 'CPU'
@@ -263,15 +281,17 @@ class ConfigInfoHandler(Thread):
             if 'CR_Core' in self.selectParams:
                 self.slotType = 'CORE'
 
-def parseConfiguration(filename=None):
+def configurationStep(filename=None, cluster=None):
     if filename:
         cmd = shlex.split('cat ' + filename)
     else:
-        cmd = shlex.split('scontrol show config')
+        cmd = ['scontrol'] + CommonUtils.clusterArgs(cluster) + shlex.split('show config')
     
-    container = ConfigInfoHandler()
-    CommonUtils.parseStream(cmd, container)
-    return container
+    return CommonUtils.StreamStep(cmd, ConfigInfoHandler())
+
+
+def parseConfiguration(filename=None, cluster=None):
+    return CommonUtils.runSteps(configurationStep(filename, cluster))
 
 
 
@@ -293,75 +313,65 @@ class PartitionInfo:
         return "%d %d" % (self.maxMem, self.defaultMem)
 
 
-class PartitionInfoHandler(Thread):
+class PartitionInfoHandler(CommonUtils.StreamHandler):
 
     def __init__(self):
-        Thread.__init__(self)
-        self.errList = list()
+        CommonUtils.StreamHandler.__init__(self)
         self.qtable = dict()
         
-        self.partRegex = re.compile('PartitionName=([^\s]+)')
-        self.maxMemRegex = re.compile('MaxMemPerNode=([0-9]+)')
-        self.defMemRegex = re.compile('DefMemPerNode=([0-9]+)')
-        self.maxNodeRegex = re.compile('MaxNodes=([0-9]+)')
+        self.numRegex = re.compile('[0-9]+')
+        self.parser = CommonUtils.RecordParser(['PartitionName', 'MaxMemPerNode', 'DefMemPerNode', 'MaxNodes'])
         
-    def setStream(self, stream):
-        self.stream = stream
-
     def __getitem__(self, idx):
         return self.qtable[idx]
         
     def __contains__(self, item):
         return item in self.qtable
     
-    def run(self):
-        line = self.stream.readline()
+    def parseLine(self, line):
+
+        maxMem = -1
+        defaultMem = -1
+        maxNodes = -1
         
-        while line:
-            try:
-
-                maxMem = -1
-                defaultMem = -1
-                maxNodes = -1
-                
-                parsed = self.partRegex.search(line)
-                if not parsed:
-                    continue
-                queue = parsed.group(1)
-
-                parsed = self.maxMemRegex.search(line)
-                if parsed:
-                    maxMem = int(parsed.group(1))                    
-
-                parsed = self.defMemRegex.search(line)
-                if parsed:
-                    defaultMem = int(parsed.group(1))
-
-                parsed = self.maxNodeRegex.search(line)
-                if parsed:
-                    maxNodes = int(parsed.group(1))
-                
-                if not queue in self.qtable:
-                    self.qtable[queue] = PartitionInfo()
-                
-                if maxMem <> -1 and maxNodes <> -1:
-                    self.qtable[queue].maxMem = maxMem * maxNodes
-                if defaultMem <> -1 and maxNodes <> -1:
-                    self.qtable[queue].defaultMem = defaultMem * maxNodes
-
-            finally:
-                line = self.stream.readline()
+        record = self.parser.parse(line)
+        
+        queue = record.get('PartitionName')
+        if not queue:
+            return False
+
+        parsed = self.numRegex.match(record.get('MaxMemPerNode', ''))
+        if parsed:
+            maxMem = int(parsed.group(0))
+
+        parsed = self.numRegex.match(record.get('DefMemPerNode', ''))
+        if parsed:
+            defaultMem = int(parsed.group(0))
+
+        parsed = self.numRegex.match(record.get('MaxNodes', ''))
+        if parsed:
+            maxNodes = int(parsed.group(0))
+        
+        if not queue in self.qtable:
+            self.qtable[queue] = PartitionInfo()
+        
+        if maxMem <> -1 and maxNodes <> -1:
+            self.qtable[queue].maxMem = maxMem * maxNodes
+        if defaultMem <> -1 and maxNodes <> -1:
+            self.qtable[queue].defaultMem = defaultMem * maxNodes
 
     # end of thread
 
-def parsePartInfo(filename=None):
+def partInfoStep(filename=None, cluster=None):
 
     if filename:
         cmd = shlex.split('cat ' + filename)
     else:
-        cmd = shlex.split('scontrol -o show partitions')
+        cmd = ['scontrol'] + CommonUtils.clusterArgs(cluster) + shlex.split('-o show partitions')
     
-    container = PartitionInfoHandler()
-    CommonUtils.parseStream(cmd, container)
-    return container
+    return CommonUtils.StreamStep(cmd, PartitionInfoHandler())
+
+
+def parsePartInfo(filename=None, cluster=None):
+    return CommonUtils.runSteps(partInfoStep(filename, cluster))
 
@@ -20,7 +20,6 @@ import time
 import shlex
 import subprocess
 import logging
-from threading import Thread
 
 import CommonUtils
 
@@ -40,111 +39,104 @@ class PartitionInfo:
     def __str__(self):
         return "%s %d %d" % (self.state, self.maxRuntime, self.defaultRuntime)
 
-class PartitionInfoHandler(Thread):
+class PartitionInfoHandler(CommonUtils.StreamHandler):
 
     def __init__(self):
-        Thread.__init__(self)
-        self.errList = list()
+        CommonUtils.StreamHandler.__init__(self)
         self.qtable = dict()
         
         self.cpuRegex = re.compile('([0-9]+)/([0-9]+)/([0-9]+)/([0-9]+)')
         
-    def setStream(self, stream):
-        self.stream = stream
-
     def __getitem__(self, idx):
         return self.qtable[idx]
         
     def __contains__(self, item):
         return item in self.qtable
     
-    def run(self):
-        line = self.stream.readline()
+    def parseLine(self, line):
+        line = line.strip()
         
-        while line:
-            try:
-                           
-                line = line.strip()
-                
-                if len(line) == 0:
-                    continue
-                    
-                qTuple = line.split()
-                
-                if len(qTuple) <> 9:
-                    self.errList.append("Wrong partition info column number: %d" % len(qTuple))
-                    continue
-                
-                queue = qTuple[0]
-                if queue.endswith('*'):
-                    queue = queue[:-1]
-                if not queue in self.qtable:
-                    self.qtable[queue] = PartitionInfo()
-                    
-                if qTuple[1] == 'down' or qTuple[1] == 'inactive':
-                    self.qtable[queue].state = 'Closed'
-                elif qTuple[1] == 'drain':
-                    self.qtable[queue].state = 'Draining'
-                else:
-                    self.qtable[queue].state = 'Production'
-                
-                parsed = self.cpuRegex.match(qTuple[2])
-                if not parsed:
-                    self.errList.append("Wrong format for partition cpu info: " + qTuple[2])
-                    continue
-                self.qtable[queue].freeCPU = int(parsed.group(2))
-                self.qtable[queue].activeCPU = int(parsed.group(1))
-                self.qtable[queue].totalCPU = int(parsed.group(4))
+        #
+        # With --clusters the output of each cluster has a header line
+        #
+        if len(line) == 0 or line.startswith('CLUSTER:'):
+            return False
+            
+        qTuple = line.split()
+        
+        if len(qTuple) <> 9:
+            self.errList.append("Wrong partition info column number: %d" % len(qTuple))
+            return False
+        
+        queue = qTuple[0]
+        if queue.endswith('*'):
+            queue = queue[:-1]
+        if not queue in self.qtable:
+            self.qtable[queue] = PartitionInfo()
+            
+        if qTuple[1] == 'down' or qTuple[1] == 'inactive':
+            self.qtable[queue].state = 'Closed'
+        elif qTuple[1] == 'drain':
+            self.qtable[queue].state = 'Draining'
+        else:
+            self.qtable[queue].state = 'Production'
+        
+        parsed = self.cpuRegex.match(qTuple[2])
+        if not parsed:
+            self.errList.append("Wrong format for partition cpu info: " + qTuple[2])
+            return False
+        self.qtable[queue].freeCPU = int(parsed.group(2))
+        self.qtable[queue].activeCPU = int(parsed.group(1))
+        self.qtable[queue].totalCPU = int(parsed.group(4))
+        
+        if qTuple[3] <> 'n/a':
+            self.qtable[queue].maxRuntime = CommonUtils.convertTimeLimit(qTuple[3])
+        
+        if qTuple[4] <> 'n/a':
+            self.qtable[queue].defaultRuntime = CommonUtils.convertTimeLimit(qTuple[4])
+        elif self.qtable[queue].maxRuntime <> -1:
+            self.qtable[queue].defaultRuntime = self.qtable[queue].maxRuntime
+            
+        try:
+            minNodes, maxNodes = CommonUtils.convertJobSize(qTuple[5])
+            
+            if maxNodes < 0:
+                return
+            
+            if qTuple[7].lower() <> 'unlimited':
+            
+                maxCPUNode = int(qTuple[7])
+                self.qtable[queue].slotsPerJob = maxNodes * maxCPUNode
                 
-                if qTuple[3] <> 'n/a':
-                    self.qtable[queue].maxRuntime = CommonUtils.convertTimeLimit(qTuple[3])
+            else:
+                tmpl = [ i.translate(None, '+') for i in qTuple[8].split(':') ]                        
+                socketNum = int(tmpl[0])
+                coreNum = int(tmpl[1])
+                thrNum = int(tmpl[2])
+                self.qtable[queue].slotsPerJob = maxNodes * socketNum * coreNum * thrNum
                 
-                if qTuple[4] <> 'n/a':
-                    self.qtable[queue].defaultRuntime = CommonUtils.convertTimeLimit(qTuple[4])
-                elif self.qtable[queue].maxRuntime <> -1:
-                    self.qtable[queue].defaultRuntime = self.qtable[queue].maxRuntime
-                    
-                try:
-                    minNodes, maxNodes = CommonUtils.convertJobSize(qTuple[5])
-                    
-                    if maxNodes < 0:
-                        continue
-                    
-                    if qTuple[7].lower() <> 'unlimited':
-                    
-                        maxCPUNode = int(qTuple[7])
-                        self.qtable[queue].slotsPerJob = maxNodes * maxCPUNode
-                        
-                    else:
-                        tmpl = [ i.translate(None, '+') for i in qTuple[8].split(':') ]                        
-                        socketNum = int(tmpl[0])
-                        coreNum = int(tmpl[1])
-                        thrNum = int(tmpl[2])
-                        self.qtable[queue].slotsPerJob = maxNodes * socketNum * coreNum * thrNum
-                        
-                except Exception, ex:
-                    logger.debug("Cannot calculate MaxSlotsPerJob for %s", queue, exc_info=True)
-                    self.errList.append("Cannot calculate MaxSlotsPerJob for %s" % queue)
-
-                                
-            finally:
-                line = self.stream.readline()
+        except Exception, ex:
+            logger.debug("Cannot calculate MaxSlotsPerJob for %s", queue, exc_info=True)
+            self.errList.append("Cannot calculate MaxSlotsPerJob for %s" % queue)
 
     # end of thread
 
 
 
 
-def parsePartInfo(filename=None):
+def partInfoStep(filename=None, cluster=None):
 
     if filename:
         cmd = shlex.split('cat ' + filename)
     else:
-        cmd = shlex.split('sinfo -h -o "%20P %5a %25C %25l %25L %25s %25F %25B %25z"')
+        cmd = ['sinfo'] + CommonUtils.clusterArgs(cluster)
+        cmd += shlex.split('-h -o "%20P %5a %25C %25l %25L %25s %25F %25B %25z"')
     
-    container = PartitionInfoHandler()
-    CommonUtils.parseStream(cmd, container)
-    return container
+    return CommonUtils.StreamStep(cmd, PartitionInfoHandler())
+
+
+def parsePartInfo(filename=None, cluster=None):
+    return CommonUtils.runSteps(partInfoStep(filename, cluster))
 
 
 
@@ -0,0 +1,99 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import re
+import shlex
+
+import CommonUtils
+
+#
+# Fixed-format job listing: the job name is the last field
+# since it is the only one that can contain the separator
+#
+JOBFORMAT = '%A|%u|%g|%T|%l|%V|%S|%P|%C|%j'
+JOBFIELDS = 10
+
+class JobInfoHandler(CommonUtils.StreamHandler):
+
+    def __init__(self, container):
+        CommonUtils.StreamHandler.__init__(self)
+        self.jobTables = container
+        
+        self.tlimitRegex = re.compile('[0-9:-]+$')
+        self.numRegex = re.compile('[0-9]+')
+    
+    def convertTime(self, tstr):
+        if tstr == 'N/A' or tstr == 'Unknown' or tstr == 'None':
+            return 0
+        return CommonUtils.convertTimestamp(tstr)
+    
+    
+    def parseLine(self, line):
+        tmpl = line.rstrip('\n').split('|', JOBFIELDS - 1)
+        if len(tmpl) < JOBFIELDS:
+            return False
+        jobid, user, group, jstate, tlimit, qtime, stime, queue, ncpu, jname = tmpl
+        
+        jTable = dict()
+        
+        if jstate == 'RUNNING':
+            jTable['state'] = 'running'
+        elif jstate == 'PENDING':
+            jTable['state'] = 'queued'
+        else:
+            return False
+        
+        if not jobid or not user or not group or not queue:
+            return False
+        jTable['jobid'] = jobid
+        jTable['name'] = jname
+        jTable['user'] = user
+        jTable['group'] = group
+        jTable['queue'] = queue
+        
+        parsed = self.numRegex.match(ncpu)
+        if not parsed:
+            return False
+        jTable['cpucount'] = int(parsed.group(0))
+        
+        #
+        # UNLIMITED, NOT_SET and INVALID limits are not published
+        #
+        if self.tlimitRegex.match(tlimit):
+            jTable['maxwalltime'] = CommonUtils.convertTimeLimit(tlimit)
+        
+        if not qtime:
+            return False
+        jTable['qtime'] = self.convertTime(qtime)
+        
+        if stime:
+            jTable['start'] = self.convertTime(stime)
+        
+        self.jobTables.append(jTable)
+
+
+def jobInfoStep(outWriter, filename=None, cluster=None):
+    if filename:
+        cmd = shlex.split('cat ' + filename)
+    else:
+        cmd = ['squeue'] + CommonUtils.clusterArgs(cluster) + ['-h', '-t', 'PD,R', '-o', JOBFORMAT]
+    
+    return CommonUtils.StreamStep(cmd, JobInfoHandler(outWriter))
+
+
+def parseJobInfo(outWriter, filename=None, cluster=None):
+    CommonUtils.runSteps(jobInfoStep(outWriter, filename, cluster))
+
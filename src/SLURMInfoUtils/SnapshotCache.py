@@ -0,0 +1,233 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import os, os.path
+import time
+import errno
+import fcntl
+import tempfile
+import cPickle
+import logging
+from threading import Thread
+
+from SLURMInfoUtils import CommonUtils
+
+logger = logging.getLogger("SnapshotCache")
+
+
+def exportState(container):
+
+    #
+    # The handlers are threads: only their parsed attributes are saved
+    #
+    if isinstance(container, Thread):
+        state = dict()
+        for key, value in container.__dict__.iteritems():
+            if not key.startswith('_') and key <> 'stream':
+                state[key] = value
+        return (container.__class__, state)
+
+    return (None, container)
+
+
+def importState(snapshot):
+
+    cls, state = snapshot
+    if cls == None:
+        return state
+
+    container = cls.__new__(cls)
+    container.__dict__.update(state)
+    return container
+
+
+class SnapshotCache:
+
+    def __init__(self, config):
+        self.cacheDir = config.get('cache_dir', None)
+        self.ttlTable = config.get('cache_ttl', dict())
+
+        if self.cacheDir and not os.path.isdir(self.cacheDir):
+            try:
+                os.makedirs(self.cacheDir, 0700)
+            except:
+                logger.error("Cannot create cache directory %s", self.cacheDir, exc_info=True)
+                self.cacheDir = None
+
+    def isEnabled(self, source):
+        return self.cacheDir <> None and self.ttlTable.get(source, 0) > 0
+
+    def load(self, name, source, loader, *args, **kwargs):
+        return self.loadChecked(name, source, None, loader, *args, **kwargs)
+
+    def loadChecked(self, name, source, checker, loader, *args, **kwargs):
+
+        #
+        # checker(timestamp) tells whether the data loaded at timestamp are
+        # still valid; with a checker the ttl is the maximum age of the snapshot
+        #
+        if not self.isEnabled(source):
+            return loader(*args, **kwargs)
+
+        timestamp, result = self.read(name, source)
+        if result <> None and checker <> None:
+            try:
+                if not checker(timestamp):
+                    logger.debug("Snapshot %s is out of date", name)
+                    result = None
+            except:
+                logger.warning("Cannot check snapshot %s", name, exc_info=True)
+                result = None
+        if result <> None:
+            return result
+
+        entry, result = self.reserve(name, source, timestamp)
+        if entry == None:
+            return result
+
+        try:
+            loadTime = time.time()
+            result = loader(*args, **kwargs)
+            entry.store(result, loadTime)
+            return result
+        finally:
+            entry.release()
+
+    def read(self, name, source, wait=True):
+
+        #
+        # Returns (timestamp, data) of the snapshot, data are None
+        # if the snapshot is missing or too old; without wait None is
+        # returned if the snapshot is locked by another invocation
+        #
+        lockFile = open(os.path.join(self.cacheDir, name + '.lock'), 'a')
+        try:
+            if not self._lock(lockFile, fcntl.LOCK_SH, wait):
+                return None
+            return self._read(name, self.ttlTable[source])
+        finally:
+            lockFile.close()
+
+    def reserve(self, name, source, rejected=None, wait=True):
+
+        #
+        # Only one invocation refreshes the snapshot, the others wait
+        # for the lock and then find it fresh; a snapshot already
+        # rejected is not used again. Returns (entry, None), the entry
+        # keeps the lock until the new data are stored, or (None, data)
+        # with the data saved by another invocation; without wait None
+        # is returned if the snapshot is locked
+        #
+        lockFile = open(os.path.join(self.cacheDir, name + '.lock'), 'a')
+        try:
+            if not self._lock(lockFile, fcntl.LOCK_EX, wait):
+                lockFile.close()
+                return None
+            timestamp, result = self._read(name, self.ttlTable[source], rejected)
+        except:
+            lockFile.close()
+            raise
+
+        if result <> None:
+            lockFile.close()
+            return (None, result)
+        return (SnapshotEntry(self, name, lockFile), None)
+
+    def _lock(self, lockFile, mode, wait):
+
+        if wait:
+            fcntl.flock(lockFile, mode)
+            return True
+
+        try:
+            fcntl.flock(lockFile, mode | fcntl.LOCK_NB)
+        except IOError, ex:
+            if ex.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+        return True
+
+    def _read(self, name, ttl, rejected=None):
+
+        snapFile = None
+        timestamp = None
+        snapshot = None
+        try:
+            try:
+                snapPath = os.path.join(self.cacheDir, name + '.snap')
+                snapFile = open(snapPath, 'rb')
+                if CommonUtils.isOwned(snapFile, snapPath):
+                    timestamp, snapshot = cPickle.load(snapFile)
+
+            except IOError:
+                pass
+            except:
+                logger.debug("Cannot read snapshot %s", name, exc_info=True)
+
+        finally:
+            if snapFile:
+                snapFile.close()
+
+        if timestamp == None or time.time() - timestamp >= ttl or timestamp == rejected:
+            return (timestamp, None)
+
+        try:
+            logger.debug("Using snapshot %s (%ds old)", name, time.time() - timestamp)
+            return (timestamp, importState(snapshot))
+        except:
+            logger.debug("Cannot read snapshot %s", name, exc_info=True)
+
+        return (timestamp, None)
+
+    def _write(self, name, result, timestamp):
+
+        tmpName = None
+        try:
+            tmpfd, tmpName = tempfile.mkstemp('.tmp', name, self.cacheDir)
+            snapFile = os.fdopen(tmpfd, 'wb')
+            try:
+                cPickle.dump((timestamp, exportState(result)), snapFile, cPickle.HIGHEST_PROTOCOL)
+            finally:
+                snapFile.close()
+
+            os.rename(tmpName, os.path.join(self.cacheDir, name + '.snap'))
+            tmpName = None
+
+        except:
+            logger.error("Cannot write snapshot %s", name, exc_info=True)
+
+        if tmpName and os.path.exists(tmpName):
+            os.remove(tmpName)
+
+
+
+class SnapshotEntry:
+
+    def __init__(self, cache, name, lockFile):
+        self.cache = cache
+        self.name = name
+        self.lockFile = lockFile
+
+    def store(self, result, timestamp):
+        try:
+            self.cache._write(self.name, result, timestamp)
+        finally:
+            self.release()
+
+    def release(self):
+        if self.lockFile:
+            self.lockFile.close()
+            self.lockFile = None
@@ -20,5 +20,11 @@ __all__ = [ "SInfoHandler",
             "GLUE1Handler",
             "GLUE2Handler",
             "NvidiaSMIHandler",
+            "SnapshotCache",
+            "SQueueHandler",
+            "JobOutput",
+            "JobStore",
+            "ClusterModel",
+            "InfoDaemon",
             "CommonUtils" ]
 
@@ -0,0 +1,297 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import os, os.path
+import time
+import random
+
+#
+# Synthetic output of the Slurm commands and BDII LDIF trees;
+# the generators are deterministic for a given seed
+#
+
+JOBSTATES = [ ('RUNNING', 30), ('PENDING', 50), ('COMPLETING', 5),
+              ('COMPLETED', 10), ('CANCELLED', 3), ('FAILED', 2) ]
+
+TIMELIMITS = [ '30:00', '02:00:00', '12:00:00', '1-00:00:00', '3-00:00:00', 'UNLIMITED' ]
+
+NODESTATES = [ ('IDLE', 20), ('ALLOCATED', 40), ('MIXED', 30), ('DRAINING', 3),
+               ('DOWN*', 5), ('COMPLETING', 2) ]
+
+
+def weightedChoice(rnd, choices):
+    total = sum([ w for c, w in choices ])
+    point = rnd.uniform(0, total)
+    for choice, weight in choices:
+        point -= weight
+        if point <= 0:
+            return choice
+    return choices[-1][0]
+
+
+def queueName(idx):
+    return 'queue%03d' % idx
+
+
+def voName(idx):
+    return 'vo%03d' % idx
+
+
+def userName(idx, vos):
+    return '%s%04d' % (voName(idx % vos), idx)
+
+
+def formatTime(tstamp):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(tstamp))
+
+
+def generateJobs(filename, jobs, queues=10, users=1000, vos=10, seed=1):
+
+    rnd = random.Random(seed)
+    baseTime = int(time.time()) - 30 * 86400
+    
+    out = open(filename, 'w')
+    try:
+        for idx in range(jobs):
+            jobid = 1000000 + idx
+            user = rnd.randint(0, users - 1)
+            uname = userName(user, vos)
+            gname = voName(user % vos)
+            state = weightedChoice(rnd, JOBSTATES)
+            ncpu = rnd.choice([1, 1, 1, 2, 4, 8, 16, 64])
+            subTime = baseTime + rnd.randint(0, 30 * 86400)
+            if state == 'PENDING':
+                startTime = 'Unknown'
+                nodeList = '(null)'
+                reason = rnd.choice(['Priority', 'Resources', 'QOSMaxJobsPerUserLimit'])
+            else:
+                startTime = formatTime(subTime + rnd.randint(0, 3600))
+                nodeList = 'wn%05d' % rnd.randint(0, 9999)
+                reason = 'None'
+            
+            out.write('JobId=%d JobName=job_%d.sh UserId=%s(%d) GroupId=%s(%d) MCS_label=N/A '
+                      % (jobid, idx, uname, 10000 + user, gname, 5000 + user % vos))
+            out.write('Priority=%d Nice=0 Account=%s QOS=normal JobState=%s Reason=%s Dependency=(null) '
+                      % (rnd.randint(1, 100000), gname, state, reason))
+            out.write('Requeue=1 Restarts=0 BatchFlag=1 Reboot=0 ExitCode=0:0 RunTime=00:10:00 '
+                      'TimeLimit=%s TimeMin=N/A SubmitTime=%s EligibleTime=%s '
+                      % (rnd.choice(TIMELIMITS), formatTime(subTime), formatTime(subTime)))
+            out.write('AccrueTime=%s StartTime=%s EndTime=Unknown Deadline=N/A PreemptTime=None '
+                      'SuspendTime=None SecsPreSuspend=0 LastSchedEval=%s '
+                      % (formatTime(subTime), startTime, formatTime(subTime)))
+            out.write('Partition=%s AllocNode:Sid=ce01:12345 ReqNodeList=(null) ExcNodeList=(null) '
+                      'NodeList=%s BatchHost=%s NumNodes=1 NumCPUs=%d NumTasks=%d CPUs/Task=1 '
+                      'ReqB:S:C:T=0:0:*:* TRES=cpu=%d,mem=%dM,node=1,billing=%d Socks/Node=* '
+                      % (queueName(rnd.randint(0, queues - 1)), nodeList, nodeList, ncpu, ncpu,
+                         ncpu, ncpu * 2000, ncpu))
+            out.write('NtasksPerN:B:S:C=0:0:*:* CoreSpec=* MinCPUsNode=1 MinMemoryCPU=2000M '
+                      'MinTmpDiskNode=0 Features=(null) DelayBoot=00:00:00 OverSubscribe=OK '
+                      'Contiguous=0 Licenses=(null) Network=(null) '
+                      'Command=/var/spool/cream/%s/job_%d.sh WorkDir=/home/%s '
+                      'StdErr=/home/%s/job_%d.err StdIn=/dev/null StdOut=/home/%s/job_%d.out Power=\n'
+                      % (uname, idx, uname, uname, idx, uname, idx))
+    finally:
+        out.close()
+
+
+def generateNodes(filename, nodes, gpuRatio=0.1, seed=1):
+
+    rnd = random.Random(seed)
+    
+    out = open(filename, 'w')
+    try:
+        for idx in range(nodes):
+            nname = 'wn%05d' % idx
+            ncpu = rnd.choice([16, 32, 64, 128])
+            state = weightedChoice(rnd, NODESTATES)
+            if state == 'IDLE':
+                alloc = 0
+            elif state == 'ALLOCATED':
+                alloc = ncpu
+            else:
+                alloc = rnd.randint(0, ncpu)
+            if rnd.random() < gpuRatio:
+                ngpu = rnd.choice([2, 4, 8])
+                gres = 'gpu:a100:%d(S:0-1)' % ngpu
+                allocTres = 'cpu=%d,gres/gpu=%d,gres/gpu:a100=%d' % (alloc, ngpu / 2, ngpu / 2)
+            else:
+                gres = '(null)'
+                allocTres = 'cpu=%d' % alloc
+            
+            out.write('NodeName=%s Arch=x86_64 CoresPerSocket=%d CPUAlloc=%d CPUTot=%d CPULoad=1.50 '
+                      % (nname, ncpu / 2, alloc, ncpu))
+            out.write('AvailableFeatures=(null) ActiveFeatures=(null) Gres=%s ' % gres)
+            out.write('NodeAddr=%s NodeHostName=%s Version=20.11.8 OS=Linux 3.10.0 #1 SMP '
+                      'RealMemory=256000 AllocMem=%d FreeMem=120000 Sockets=2 Boards=1 State=%s '
+                      'ThreadsPerCore=1 TmpDisk=0 Weight=1 Owner=N/A MCS_label=N/A Partitions=%s '
+                      'BootTime=2021-08-23T09:49:03 SlurmdStartTime=2021-08-23T10:04:46 '
+                      'CfgTRES=cpu=%d,mem=250G,billing=%d AllocTRES=%s CapWatts=n/a CurrentWatts=0 '
+                      'AveWatts=0 ExtSensorsJoules=n/s ExtSensorsWatts=0 ExtSensorsTemp=n/s\n'
+                      % (nname, nname, alloc * 2000, state, queueName(idx % 10), ncpu, ncpu, allocTres))
+    finally:
+        out.close()
+
+
+def generatePartitions(filename, queues, seed=1):
+
+    rnd = random.Random(seed)
+    
+    out = open(filename, 'w')
+    try:
+        for idx in range(queues):
+            out.write('PartitionName=%s AllowGroups=ALL AllowAccounts=ALL AllowQos=ALL '
+                      'AllocNodes=ALL Default=%s QoS=N/A DefaultTime=NONE DisableRootJobs=NO '
+                      'ExclusiveUser=NO GraceTime=0 Hidden=NO MaxNodes=%d MaxTime=%s MinNodes=0 '
+                      'LLN=NO MaxCPUsPerNode=UNLIMITED Nodes=wn[00000-09999] PriorityJobFactor=1 '
+                      'PriorityTier=1 RootOnly=NO ReqResv=NO OverSubscribe=NO OverTimeLimit=NONE '
+                      'PreemptMode=OFF State=UP TotalCPUs=640000 TotalNodes=10000 '
+                      'SelectTypeParameters=NONE JobDefaults=(null) DefMemPerNode=%d '
+                      'MaxMemPerNode=%s\n'
+                      % (queueName(idx), 'YES' if idx == 0 else 'NO', rnd.choice([1, 2, 10]),
+                         rnd.choice(TIMELIMITS), rnd.choice([1000, 2000, 4000]),
+                         rnd.choice(['UNLIMITED', '64000', '256000'])))
+    finally:
+        out.close()
+
+
+def generateSInfo(filename, queues, seed=1):
+
+    rnd = random.Random(seed)
+    
+    out = open(filename, 'w')
+    try:
+        for idx in range(queues):
+            total = rnd.randint(1, 1000) * 64
+            alloc = rnd.randint(0, total)
+            other = rnd.randint(0, total - alloc)
+            qname = queueName(idx)
+            if idx == 0:
+                qname += '*'
+            out.write('%-20s %-5s %-25s %-25s %-25s %-25s %-25s %-25s %-25s\n'
+                      % (qname, rnd.choice(['up', 'up', 'up', 'drain', 'down']),
+                         '%d/%d/%d/%d' % (alloc, total - alloc - other, other, total),
+                         rnd.choice(TIMELIMITS[:-1]), rnd.choice(['n/a', '30:00']),
+                         rnd.choice(['1-infinite', '1-10', '1-2']),
+                         '%d/%d/0/%d' % (total / 128, total / 128, total / 64),
+                         'UNLIMITED', '2:32:1'))
+    finally:
+        out.close()
+
+
+def generateAssociations(filename, associations, queues=10, vos=10, seed=1):
+
+    #
+    # Cluster root, one account per VO and users with a limit per partition;
+    # some of them inherit the fairshare from the account
+    #
+    rnd = random.Random(seed)
+    
+    out = open(filename, 'w')
+    try:
+        out.write('root|||1||||||1|0\n')
+        for vidx in range(vos):
+            out.write('%s|||%d||||||%d|1\n' % (voName(vidx), rnd.randint(1, 100), 2 + vidx))
+        
+        assID = 2 + vos
+        for idx in range(max(associations - vos - 1, 0)):
+            user = idx / queues
+            vidx = user % vos
+            if rnd.random() < 0.2:
+                fairshare = 'parent'
+            else:
+                fairshare = str(rnd.randint(1, 100))
+            out.write('%s|%s|%s|%s|%s|%s|%s|%s|%s|%d|%d\n'
+                      % (voName(vidx), userName(user, vos), queueName(idx % queues), fairshare,
+                         rnd.choice(['', '10', '100']), rnd.choice(['', '50', '500']),
+                         rnd.choice(['', '12:00:00', '1-00:00:00']), rnd.choice(['', '1440', '2880']),
+                         rnd.choice(['', '8', '64']), assID, 2 + vidx))
+            assID += 1
+    finally:
+        out.close()
+
+
+def generateLdif(ldifDir, queues, vos, host='ce.example.org'):
+
+    #
+    # Static GLUE1 and GLUE2 description of a CE with one share per queue and VO;
+    # returns the path of the bdii.conf pointing to the LDIF directory
+    #
+    if not os.path.isdir(ldifDir):
+        os.makedirs(ldifDir)
+    
+    out = open(os.path.join(ldifDir, 'static-file-CE.ldif'), 'w')
+    try:
+        for qidx in range(queues):
+            ceID = '%s:8443/cream-slurm-%s' % (host, queueName(qidx))
+            out.write('dn: GlueCEUniqueID=%s,mds-vo-name=resource,o=grid\n' % ceID)
+            out.write('objectClass: GlueCETop\nobjectClass: GlueCE\n')
+            out.write('GlueCEUniqueID: %s\nGlueCEName: %s\n' % (ceID, queueName(qidx)))
+            out.write('GlueCEInfoHostName: %s\nGlueCEInfoLRMSType: slurm\n' % host)
+            out.write('GlueCEStateStatus: Production\nGlueCEStateTotalJobs: 0\n\n')
+            
+            for vidx in range(vos):
+                out.write('dn: GlueVOViewLocalID=%s,GlueCEUniqueID=%s,mds-vo-name=resource,o=grid\n'
+                          % (voName(vidx), ceID))
+                out.write('objectClass: GlueCETop\nobjectClass: GlueVOView\n')
+                out.write('GlueVOViewLocalID: %s\nGlueCEAccessControlBaseRule: VO:%s\n'
+                          % (voName(vidx), voName(vidx)))
+                out.write('GlueCEStateRunningJobs: 0\nGlueCEStateWaitingJobs: 0\n')
+                out.write('GlueChunkKey: GlueCEUniqueID=%s\n\n' % ceID)
+    finally:
+        out.close()
+    
+    serviceID = '%s_ComputingElement' % host
+    
+    out = open(os.path.join(ldifDir, 'ComputingManager.ldif'), 'w')
+    try:
+        out.write('dn: GLUE2ManagerId=%s_Manager,GLUE2ServiceID=%s,GLUE2GroupID=resource,o=glue\n'
+                  % (serviceID, serviceID))
+        out.write('objectClass: GLUE2Entity\nobjectClass: GLUE2Manager\n')
+        out.write('GLUE2ManagerID: %s_Manager\nGLUE2ManagerProductName: SLURM\n\n' % serviceID)
+    finally:
+        out.close()
+    
+    out = open(os.path.join(ldifDir, 'ComputingShare.ldif'), 'w')
+    try:
+        for qidx in range(queues):
+            for vidx in range(vos):
+                shareID = '%s_%s_%s' % (queueName(qidx), voName(vidx), serviceID)
+                shareDN = 'GLUE2ShareID=%s,GLUE2ServiceID=%s,GLUE2GroupID=resource,o=glue' % (shareID, serviceID)
+                out.write('dn: %s\n' % shareDN)
+                out.write('objectClass: GLUE2Entity\nobjectClass: GLUE2Share\n')
+                out.write('GLUE2ShareID: %s\nGLUE2ComputingShareMappingQueue: %s\n'
+                          % (shareID, queueName(qidx)))
+                out.write('GLUE2ComputingShareServingState: production\n')
+                out.write('GLUE2ComputingShareRunningJobs: 0\n\n')
+                
+                out.write('dn: GLUE2PolicyID=%s_policy,%s\n' % (shareID, shareDN))
+                out.write('objectClass: GLUE2Entity\nobjectClass: GLUE2MappingPolicy\n')
+                out.write('GLUE2PolicyID: %s_policy\nGLUE2PolicyScheme: org.glite.standard\n' % shareID)
+                out.write('GLUE2PolicyRule: vo:%s\n' % voName(vidx))
+                out.write('GLUE2PolicyUserDomainForeignKey: %s\n' % voName(vidx))
+                out.write('GLUE2MappingPolicyShareForeignKey: %s\n\n' % shareID)
+    finally:
+        out.close()
+    
+    bdiiConffile = os.path.join(ldifDir, 'bdii.conf')
+    out = open(bdiiConffile, 'w')
+    try:
+        out.write('BDII_LDIF_DIR=%s\n' % ldifDir)
+    finally:
+        out.close()
+    
+    return bdiiConffile
+
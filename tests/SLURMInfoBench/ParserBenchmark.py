@@ -0,0 +1,277 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import os, os.path
+import time
+import getopt
+import shutil
+import tempfile
+import resource
+import json
+
+from SLURMInfoUtils import CommonUtils
+from SLURMInfoUtils import SControlInfoHandler
+from SLURMInfoUtils import SInfoHandler
+from SLURMInfoUtils import SAcctMgrHandler
+from SLURMInfoUtils import JobStore
+import Generators
+
+#
+# Usage: python ParserBenchmark.py [-s small|medium|large] [-j jobs] [-n nodes]
+#                                  [-a associations] [-q queues] [-v vos]
+#                                  [-b baseline] [-o new_baseline] [-t tolerance]
+#
+# Each parser runs in a child process on the generated files, so that
+# the peak RSS is measured for that parser only
+#
+
+SCALES = {
+    'small' : { 'jobs' : 1000, 'nodes' : 100, 'associations' : 1000, 'queues' : 10, 'vos' : 10 },
+    'medium' : { 'jobs' : 100000, 'nodes' : 10000, 'associations' : 100000, 'queues' : 50, 'vos' : 50 },
+    'large' : { 'jobs' : 1000000, 'nodes' : 10000, 'associations' : 100000, 'queues' : 100, 'vos' : 100 }
+}
+
+
+class NullContainer:
+
+    def __init__(self):
+        self.count = 0
+    
+    def append(self, table):
+        self.count += 1
+
+
+def benchJobs(workDir, scale):
+    container = NullContainer()
+    SControlInfoHandler.parseJobInfo(container, os.path.join(workDir, 'jobs.txt'))
+    return container.count
+
+
+def benchJobStore(workDir, scale):
+    jobStore = JobStore.JobStore()
+    SControlInfoHandler.parseJobInfo(jobStore, os.path.join(workDir, 'jobs.txt'))
+    return len(jobStore)
+
+
+def benchNodes(workDir, scale):
+    container = SControlInfoHandler.parseNodesInfo(os.path.join(workDir, 'nodes.txt'))
+    return len(container.gpuTable)
+
+
+def benchPartitions(workDir, scale):
+    container = SControlInfoHandler.parsePartInfo(os.path.join(workDir, 'partitions.txt'))
+    return len(container.qtable)
+
+
+def benchSInfo(workDir, scale):
+    container = SInfoHandler.parsePartInfo(os.path.join(workDir, 'sinfo.txt'))
+    return len(container.qtable)
+
+
+def benchPolicies(workDir, scale):
+
+    #
+    # NSS is out of the scope: the users are resolved as if preloaded
+    #
+    container = SAcctMgrHandler.PolicyInfoHandler(dict())
+    users = scale['associations'] / scale['queues'] + 1
+    for vidx in range(scale['vos']):
+        container.resolver.groupTable[5000 + vidx] = Generators.voName(vidx)
+    for uidx in range(users):
+        container.resolver.userTable[Generators.userName(uidx, scale['vos'])] = 5000 + uidx % scale['vos']
+    
+    CommonUtils.parseStream(['cat', os.path.join(workDir, 'associations.txt')], container)
+    return len(container.policyTable.table)
+
+
+def benchGlue1Ldif(workDir, scale):
+    CommonUtils.ldifIndexTable.clear()
+    result = CommonUtils.parseLdif(os.path.join(workDir, 'ldif', 'bdii.conf'), 'GLUE1')
+    return len(result)
+
+
+def benchGlue2Ldif(workDir, scale):
+    CommonUtils.ldifIndexTable.clear()
+    result = CommonUtils.parseLdif(os.path.join(workDir, 'ldif', 'bdii.conf'), 'GLUE2')
+    return len(result[0])
+
+
+BENCHMARKS = [ ('scontrol-jobs', 'jobs.txt', benchJobs),
+               ('scontrol-jobs-store', 'jobs.txt', benchJobStore),
+               ('scontrol-nodes', 'nodes.txt', benchNodes),
+               ('scontrol-partitions', 'partitions.txt', benchPartitions),
+               ('sinfo-partitions', 'sinfo.txt', benchSInfo),
+               ('sacctmgr-associations', 'associations.txt', benchPolicies),
+               ('ldif-glue1', 'ldif/static-file-CE.ldif', benchGlue1Ldif),
+               ('ldif-glue2', 'ldif/ComputingShare.ldif', benchGlue2Ldif) ]
+
+
+def generateAll(workDir, scale):
+    Generators.generateJobs(os.path.join(workDir, 'jobs.txt'), scale['jobs'],
+                            scale['queues'], max(scale['jobs'] / 100, 1), scale['vos'])
+    Generators.generateNodes(os.path.join(workDir, 'nodes.txt'), scale['nodes'])
+    Generators.generatePartitions(os.path.join(workDir, 'partitions.txt'), scale['queues'])
+    Generators.generateSInfo(os.path.join(workDir, 'sinfo.txt'), scale['queues'])
+    Generators.generateAssociations(os.path.join(workDir, 'associations.txt'), scale['associations'],
+                                    scale['queues'], scale['vos'])
+    Generators.generateLdif(os.path.join(workDir, 'ldif'), scale['queues'], scale['vos'])
+
+
+def countLines(filename):
+    result = 0
+    inFile = open(filename)
+    try:
+        for line in inFile:
+            result += 1
+    finally:
+        inFile.close()
+    return result
+
+
+def runIsolated(benchFunc, workDir, scale):
+
+    rPipe, wPipe = os.pipe()
+    pid = os.fork()
+    
+    if pid == 0:
+        os.close(rPipe)
+        try:
+            startTime = time.time()
+            items = benchFunc(workDir, scale)
+            elapsed = time.time() - startTime
+            maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(wPipe, json.dumps({ 'seconds' : elapsed, 'items' : items, 'maxrss' : maxRSS }))
+        finally:
+            os._exit(0)
+    
+    os.close(wPipe)
+    data = ''
+    chunk = os.read(rPipe, 4096)
+    while chunk:
+        data += chunk
+        chunk = os.read(rPipe, 4096)
+    os.close(rPipe)
+    os.waitpid(pid, 0)
+    
+    if not data:
+        raise Exception("Benchmark %s failed" % benchFunc.__name__)
+    return json.loads(data)
+
+
+def usage():
+    print "Usage: ParserBenchmark.py [-s small|medium|large] [-j jobs] [-n nodes] [-a associations]"
+    print "                          [-q queues] [-v vos] [-b baseline] [-o new_baseline] [-t tolerance]"
+
+
+def main():
+
+    scale = dict(SCALES['small'])
+    baselineFile = None
+    outFile = None
+    tolerance = 0.2
+    
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "s:j:n:a:q:v:b:o:t:h")
+        for optName, optValue in opts:
+            if optName == '-s':
+                scale = dict(SCALES[optValue])
+            if optName == '-j':
+                scale['jobs'] = int(optValue)
+            if optName == '-n':
+                scale['nodes'] = int(optValue)
+            if optName == '-a':
+                scale['associations'] = int(optValue)
+            if optName == '-q':
+                scale['queues'] = int(optValue)
+            if optName == '-v':
+                scale['vos'] = int(optValue)
+            if optName == '-b':
+                baselineFile = optValue
+            if optName == '-o':
+                outFile = optValue
+            if optName == '-t':
+                tolerance = float(optValue)
+            if optName == '-h':
+                usage()
+                sys.exit(0)
+    except (getopt.GetoptError, KeyError, ValueError):
+        usage()
+        sys.exit(2)
+    
+    baseline = None
+    if baselineFile:
+        bFile = open(baselineFile)
+        try:
+            baseline = json.load(bFile)
+        finally:
+            bFile.close()
+        if baseline['scale'] <> scale:
+            print "Warning: baseline measured at a different scale %s" % repr(baseline['scale'])
+    
+    workDir = tempfile.mkdtemp('', 'slurmbench')
+    regressions = 0
+    
+    try:
+        startTime = time.time()
+        generateAll(workDir, scale)
+        print "Generated %s in %.1fs" % (repr(scale), time.time() - startTime)
+        print
+        print "%-24s %10s %10s %10s %12s %8s %10s %9s" % ('benchmark', 'lines', 'records', 'seconds',
+                                                          'lines/s', 'MB/s', 'peak RSS', 'baseline')
+        
+        results = dict()
+        for name, filename, benchFunc in BENCHMARKS:
+            filename = os.path.join(workDir, filename)
+            lines = countLines(filename)
+            size = os.path.getsize(filename)
+            
+            result = runIsolated(benchFunc, workDir, scale)
+            result['lines'] = lines
+            results[name] = result
+            
+            seconds = max(result['seconds'], 1e-6)
+            comparison = ''
+            if baseline and name in baseline['results']:
+                ratio = seconds / max(baseline['results'][name]['seconds'], 1e-6)
+                comparison = '%.2fx' % ratio
+                if ratio > 1 + tolerance:
+                    comparison += ' !'
+                    regressions += 1
+            
+            print "%-24s %10d %10d %10.3f %12.0f %8.1f %8dMB %9s" % (name, lines, result['items'], seconds,
+                                                                     lines / seconds, size / seconds / 2**20,
+                                                                     result['maxrss'] / 1024, comparison)
+        
+        if outFile:
+            oFile = open(outFile, 'w')
+            try:
+                json.dump({ 'scale' : scale, 'results' : results }, oFile, indent=2, sort_keys=True)
+            finally:
+                oFile.close()
+    
+    finally:
+        shutil.rmtree(workDir)
+    
+    if regressions:
+        print
+        print "%d benchmarks slower than the baseline by more than %d%%" % (regressions, tolerance * 100)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,123 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+
+import sys
+import unittest
+
+from SLURMInfoUtils import ClusterModel
+from SLURMInfoUtils import JobStore
+from SLURMInfoUtils import SControlInfoHandler
+
+
+class MyPolicyTable:
+
+    def __init__(self, pTable):
+        self.pTable = pTable
+    
+    def resolve(self, keyList):
+        return dict((key, self.pTable[key]) for key in keyList if key in self.pTable)
+
+class MyContainer:
+
+    def __init__(self, qtable):
+        self.qtable = qtable
+
+def createJobs(jobList):
+    jobStore = JobStore.JobStore()
+    for jobid, state, queue in jobList:
+        jobStore.append({ 'jobid' : jobid, 'name' : 'test', 'user' : 'dteam001', 'group' : 'dteam',
+                          'queue' : queue, 'state' : state, 'cpucount' : 1, 'qtime' : 1377518092 })
+    return jobStore
+
+
+class ClusterModelTestCase(unittest.TestCase):
+
+    def test_queue_lookup_ok(self):
+    
+        result = ClusterModel.splitQueue('creamtest1', 'cream') == ('cream', 'creamtest1')
+        result = result and ClusterModel.splitQueue('creamtest1@grid@c2', 'cream') == ('c2', 'creamtest1@grid')
+        result = result and ClusterModel.joinQueue('c2', 'gpu', 'cream') == 'gpu@c2'
+        result = result and ClusterModel.joinQueue('cream', 'gpu', 'cream') == 'gpu'
+        
+        clusterTable = ClusterModel.ClusterTable('cream')
+        clusterTable.add('cream', MyContainer({ 'creamtest1' : 1, 'gpu' : 2 }))
+        clusterTable.add('c2', MyContainer({ 'gpu' : 3 }))
+        
+        result = result and clusterTable['gpu'] == 2 and clusterTable['gpu@c2'] == 3
+        result = result and 'creamtest1' in clusterTable and not 'creamtest1@c2' in clusterTable
+        result = result and not 'gpu@c3' in clusterTable
+        
+        self.assertTrue(result)
+
+    def test_policies_resolve_ok(self):
+    
+        policyTable = ClusterModel.ClusterPolicyTable('cream')
+        policyTable.add('cream', MyPolicyTable({ ('dteam', 'gpu') : 1, (None, 'creamtest1') : 2 }))
+        policyTable.add('c2', MyPolicyTable({ ('dteam', 'gpu') : 3 }))
+        
+        effTable = policyTable.resolve([ ('dteam', 'gpu'), ('dteam', 'gpu@c2'), (None, 'creamtest1'),
+                                         (None, 'creamtest1@c2'), ('dteam', 'gpu@c3') ])
+        
+        self.assertTrue(effTable == { ('dteam', 'gpu') : 1, ('dteam', 'gpu@c2') : 3, (None, 'creamtest1') : 2 })
+
+    def test_jobs_merge_ok(self):
+    
+        fedId1 = str(ClusterModel.FEDJOBBASE + 101)
+        fedId2 = str(2 * ClusterModel.FEDJOBBASE + 102)
+        
+        jobs1 = createJobs([ ('101', 'running', 'creamtest1'), (fedId1, 'queued', 'creamtest1'),
+                             (fedId2, 'queued', 'creamtest1') ])
+        jobs2 = createJobs([ ('101', 'queued', 'gpu'), (fedId1, 'running', 'gpu'),
+                             (fedId2, 'queued', 'gpu') ])
+        
+        jobStore = ClusterModel.mergeJobs([ ('cream', jobs1), ('c2', jobs2) ], 'cream')
+        
+        #
+        # Local ids can be reused by each cluster, the siblings of a federated
+        # job are replaced by the running one or by the first listed
+        #
+        result = [ (job['jobid'], job['state'], job['queue']) for job in jobStore ] == [
+                    ('101', 'running', 'creamtest1'),
+                    (fedId2, 'queued', 'creamtest1'),
+                    ('101', 'queued', 'gpu@c2'),
+                    (fedId1, 'running', 'gpu@c2') ]
+        
+        self.assertTrue(result)
+
+
+    def test_nodes_merge_ok(self):
+    
+        nodes1 = SControlInfoHandler.NodesInfoHandler()
+        nodes1.gpuTable = { 'node01' : 2, 'node02' : 4 }
+        nodes1.gpuUsedTable = { 'node01' : 1, 'node02' : 0 }
+        nodes2 = SControlInfoHandler.NodesInfoHandler()
+        nodes2.gpuTable = { 'node01' : 4 }
+        nodes2.gpuUsedTable = { 'node01' : 3 }
+        
+        #
+        # Node names can be reused by each cluster
+        #
+        nodesInfo = ClusterModel.mergeNodes([ ('cream', nodes1), ('c2', nodes2) ])
+        
+        result = nodesInfo.getGPUStats() == (10, 4, 0)
+        result = result and nodesInfo.gpuTable[('c2', 'node01')] == 4
+        
+        self.assertTrue(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
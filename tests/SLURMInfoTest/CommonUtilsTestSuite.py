@@ -0,0 +1,330 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import os
+import time
+import unittest
+
+from SLURMInfoUtils import CommonUtils
+from SLURMInfoUtils import SControlInfoHandler
+from TestUtils import Workspace
+
+class CommonUtilsTestCase(unittest.TestCase):
+
+    def test_record_parser_ok(self):
+    
+        line = 'JobId=1234 JobName=my test job UserId=dteam001(5001) GroupId=dteam(5000) '
+        line += 'JobState=PENDING Reason=(null) TRES=cpu=4,mem=4000M,node=1 '
+        line += 'Partition=creamtest1 Command=/bin/sleep 60\n'
+        
+        record = CommonUtils.RecordParser(['JobName', 'UserId', 'TRES', 'Command', 'Account']).parse(line)
+        
+        result = record == { 'JobName' : 'my test job',
+                             'UserId' : 'dteam001(5001)',
+                             'TRES' : 'cpu=4,mem=4000M,node=1',
+                             'Command' : '/bin/sleep 60' }
+        
+        record = CommonUtils.RecordParser().parse(line)
+        
+        result = result and len(record) == 9
+        result = result and record['JobId'] == '1234'
+        result = result and record['Reason'] == '(null)'
+        result = result and record['Partition'] == 'creamtest1'
+        
+        self.assertTrue(result)
+
+    def test_record_parser_first_key_ok(self):
+    
+        line = 'NodeName=cream-34 Gres=gpu:2 GresUsed=gpu:1 State=IDLE Gres=gpu:4\n'
+        
+        record = CommonUtils.RecordParser(['Gres', 'Name']).parse(line)
+        
+        self.assertTrue(record == { 'Gres' : 'gpu:2' })
+
+    def test_convert_timestamp_ok(self):
+    
+        result = True
+        for tstr in ['2013-08-26T11:54:52', '2013-08-26T11:00:00', '2013-08-26T11:59:59',
+                     '2016-02-29T23:01:02', '2024-01-01T00:00:00', '2024-07-15T12:30:45']:
+            tmpt = time.strptime(tstr, '%Y-%m-%dT%H:%M:%S')
+            refValue = int(time.mktime(tmpt) + time.timezone)
+            result = result and CommonUtils.convertTimestamp(tstr) == refValue
+        
+        self.assertTrue(result)
+
+    def test_convert_timelimit_ok(self):
+    
+        result = CommonUtils.convertTimeLimit('2-00:00:00') == 172800
+        result = result and CommonUtils.convertTimeLimit('2-00:00:00') == 172800
+        result = result and CommonUtils.convertTimeLimit('1-12') == 129600
+        result = result and CommonUtils.convertTimeLimit('12:00:00') == 43200
+        result = result and CommonUtils.convertTimeLimit('30:00') == 1800
+        result = result and CommonUtils.convertTimeLimit('30') == 1800
+        result = result and CommonUtils.convertTimeLimit('INFINITE') == 2**32
+        
+        self.assertTrue(result)
+
+    def test_parse_stream_timeout_ok(self):
+    
+        #
+        # The grandchild keeps stdout open: it must be killed with the shell
+        #
+        container = SControlInfoHandler.ConfigInfoHandler()
+        
+        startTime = time.time()
+        try:
+            CommonUtils.parseStream(['sh', '-c', 'sleep 20; echo done'], container, 1)
+            result = False
+        except Exception, ex:
+            result = 'Timeout expired' in str(ex)
+        
+        result = result and time.time() - startTime < 10
+        
+        self.assertTrue(result)
+
+    def test_multiplexer_ok(self):
+    
+        cfgContainer = SControlInfoHandler.ConfigInfoHandler()
+        jobList = list()
+        jobContainer = SControlInfoHandler.JobInfoHandler(jobList)
+        
+        jobLine = 'JobId=%d JobName=test UserId=dteam001(0) GroupId=dteam(0) JobState=RUNNING '
+        jobLine += 'TimeLimit=30:00 SubmitTime=2013-08-26T11:54:52 StartTime=2013-08-26T11:54:52 '
+        jobLine += 'Partition=creamtest1 NumCPUs=1\n'
+        jobScript = ''.join([ "echo '%s';" % (jobLine % idx).strip() for idx in range(500) ])
+        
+        multiplexer = CommonUtils.StreamMultiplexer()
+        multiplexer.register(['sh', '-c', 'echo "SelectType = select/cons_res"; sleep 1; echo "SelectTypeParameters = CR_Core"'],
+                             cfgContainer)
+        multiplexer.register(['sh', '-c', jobScript + 'echo error >&2; exit 1'], jobContainer)
+        multiplexer.run()
+        
+        result = cfgContainer.slotType == 'CORE' and multiplexer.getError(cfgContainer) == None
+        result = result and len(jobList) == 500 and jobList[499]['jobid'] == '499'
+        result = result and multiplexer.getError(jobContainer) == 'error\n'
+        
+        self.assertTrue(result)
+
+    def test_collection_steps_ok(self):
+        
+        def configSteps():
+            command = yield CommonUtils.StreamStep(['echo', 'SelectType = select/cons_res'],
+                                                   SControlInfoHandler.ConfigInfoHandler())
+            commands = yield [ CommonUtils.StreamStep(['echo', 'SelectTypeParameters = CR_Core'],
+                                                      command.container),
+                               CommonUtils.StreamStep(['sh', '-c', 'exit 1'],
+                                                      SControlInfoHandler.ConfigInfoHandler(), check=False) ]
+            yield (commands[0].container.slotType, commands[1].retCode)
+        
+        #
+        # The callback of a source starts the next one in the same run
+        #
+        collection = CommonUtils.Collection()
+        
+        def started(result, error):
+            collection.add('partitions', CommonUtils.StreamStep(['echo', 'PartitionName=creamtest1'],
+                                                                SControlInfoHandler.PartitionInfoHandler()))
+        
+        collection.add('config', configSteps(), started)
+        collection.run()
+        
+        result = collection.get('config') == ('CORE', 1)
+        result = result and 'creamtest1' in collection.get('partitions').qtable
+        
+        self.assertTrue(result)
+
+    def test_collection_errors_ok(self):
+        
+        def failingSteps():
+            try:
+                yield CommonUtils.StreamStep(['sh', '-c', 'echo failed >&2; exit 1'],
+                                             SControlInfoHandler.ConfigInfoHandler())
+            except Exception, ex:
+                yield 'caught: ' + str(ex)
+        
+        collection = CommonUtils.Collection()
+        collection.add('config', CommonUtils.StreamStep(['sh', '-c', 'echo failed >&2; exit 1'],
+                                                        SControlInfoHandler.ConfigInfoHandler()))
+        collection.add('missing', CommonUtils.StreamStep(['nosuchcommand-infoslurm'],
+                                                         SControlInfoHandler.ConfigInfoHandler()))
+        collection.add('handled', failingSteps())
+        collection.run()
+        
+        #
+        # The error of a mandatory source is raised, an optional one
+        # falls back to the default
+        #
+        try:
+            collection.get('config')
+            result = False
+        except Exception, ex:
+            result = str(ex) == 'failed\n'
+        
+        result = result and collection.getOptional('config', 'default') == 'default'
+        result = result and collection.getOptional('missing') == None
+        result = result and collection.get('handled') == 'caught: failed\n'
+        
+        self.assertTrue(result)
+
+    def test_ldif_index_cache_ok(self):
+        
+        workspace = Workspace()
+        ldifDir = workspace.workspace + '/ldif'
+        os.mkdir(ldifDir)
+        ldifFilename = ldifDir + '/static-file-CE.ldif'
+        workspace.appendToFile('dn: GlueCEUniqueID=ce01:8443/cream-slurm-creamtest1,o=grid\n'
+                               + 'GlueCEUniqueID: ce01:8443/cream-slurm-creamtest1\n'
+                               + 'GlueCEName: creamtest1\n', ldifFilename)
+        bdiiConffile = workspace.createFile('BDII_LDIF_DIR=%s\n' % ldifDir)
+        cacheDir = workspace.workspace + '/cache'
+        
+        scanList = list()
+        saveScan = CommonUtils.scanGlue1Ldif
+        
+        def countScan(ldifList, workers=1):
+            scanList.append(ldifList)
+            return saveScan(ldifList, workers)
+        
+        CommonUtils.scanGlue1Ldif = countScan
+        CommonUtils.ldifIndexTable.clear()
+        try:
+            CommonUtils.parseLdif(bdiiConffile, 'GLUE1', cacheDir)
+            CommonUtils.parseLdif(bdiiConffile, 'GLUE1', cacheDir)
+            
+            #
+            # The index stored on disk is reused by another process
+            #
+            CommonUtils.ldifIndexTable.clear()
+            tmpTable = CommonUtils.parseLdif(bdiiConffile, 'GLUE1', cacheDir)
+            result = len(scanList) == 1 and tmpTable.values()[0]['queue'] == 'creamtest1'
+            
+            oldTime = os.stat(ldifFilename).st_mtime - 60
+            os.utime(ldifFilename, (oldTime, oldTime))
+            CommonUtils.parseLdif(bdiiConffile, 'GLUE1', cacheDir)
+            result = result and len(scanList) == 2
+            
+            #
+            # A change of size is detected with the same modification time
+            #
+            workspace.appendToFile('\n', ldifFilename)
+            os.utime(ldifFilename, (oldTime, oldTime))
+            CommonUtils.parseLdif(bdiiConffile, 'GLUE1', cacheDir)
+            result = result and len(scanList) == 3
+        finally:
+            CommonUtils.scanGlue1Ldif = saveScan
+            CommonUtils.ldifIndexTable.clear()
+        
+        self.assertTrue(result)
+
+    def test_command_stats_ok(self):
+    
+        cfgContainer = SControlInfoHandler.ConfigInfoHandler()
+        del CommonUtils.commandStats[:]
+        
+        cmdScript = 'echo "SelectType = select/cons_res"; echo "# comment"; echo "Wrong line" >&2; exit 3'
+        try:
+            CommonUtils.parseStream(['sh', '-c', cmdScript], cfgContainer)
+        except Exception:
+            pass
+        
+        stats = CommonUtils.commandStats[0]
+        result = len(CommonUtils.commandStats) == 1
+        result = result and stats['lines'] == 2 and stats['rejected'] == 1
+        result = result and stats['bytes'] == 39 and stats['stderr'] == 11
+        result = result and stats['retcode'] == 3 and not stats['expired']
+        result = result and stats['wall'] >= stats['parse']
+        
+        CommonUtils.reportStats('test')
+        result = result and len(CommonUtils.commandStats) == 0
+        
+        self.assertTrue(result)
+
+    def test_interface_probe_ok(self):
+    
+        result = CommonUtils.interfaceIsOff({ 'status-probe' : 'sh -c "echo off; exit 2"' })
+        result = result and not CommonUtils.interfaceIsOff({ 'status-probe' : 'true' })
+        result = result and not CommonUtils.interfaceIsOff({ 'status-probe' : 'sleep 10',
+                                                             'status-probe-timeout' : 1 })
+        
+        self.assertTrue(result)
+
+    def test_glue1_ldif_scan_ok(self):
+    
+        tmpbuff =  'dn: GlueCEUniqueID=ce01:8443/cream-slurm-creamtest1,mds-vo-name=resource,o=grid\r\n'
+        tmpbuff += 'GlueCEUniqueID: ce01:8443/cream-slurm-creamtest1\r\n'
+        tmpbuff += 'GlueCENameSuffix: wrong\n'
+        tmpbuff += 'GlueCEName : creamtest1 \n'
+        tmpbuff += '\r\n'
+        tmpbuff += 'dn: GlueVOViewLocalID=dteam,GlueCEUniqueID=ce01:8443/cream-slurm-creamtest1,o=grid\n'
+        tmpbuff += 'GlueVOViewLocalID: dteam\n'
+        tmpbuff += 'GlueChunkKey: GlueCEUniqueID=ce01:8443/cream-slurm-creamtest1\n'
+        
+        #
+        # Records can span files, the last one can lack the empty line
+        #
+        workspace = Workspace()
+        ldifList = [ workspace.createFile(tmpbuff), workspace.createFile('\nGlueCEName:') ]
+        
+        for blockSize in [ 5, CommonUtils.READBLOCKSIZE ]:
+            saveSize = CommonUtils.READBLOCKSIZE
+            CommonUtils.READBLOCKSIZE = blockSize
+            try:
+                result = CommonUtils.scanGlue1Ldif(ldifList)
+            finally:
+                CommonUtils.READBLOCKSIZE = saveSize
+            
+            self.assertTrue(result == { 'ce01:8443/cream-slurm-creamtest1' : {
+                'dn' : 'dn: GlueCEUniqueID=ce01:8443/cream-slurm-creamtest1,mds-vo-name=resource,o=grid',
+                'queue' : 'creamtest1',
+                'views' : [ ('dn: GlueVOViewLocalID=dteam,GlueCEUniqueID=ce01:8443/cream-slurm-creamtest1,o=grid',
+                             'dteam') ] } })
+
+    def test_glue2_ldif_parallel_ok(self):
+    
+        tmpbuff1 =  'dn: GLUE2ManagerId=ce01_Manager,GLUE2GroupID=resource,o=glue\n'
+        tmpbuff1 += 'GLUE2ManagerID: ce01_Manager\n'
+        tmpbuff1 += '\n'
+        tmpbuff1 += 'dn: GLUE2ShareID=creamtest1_dteam,GLUE2GroupID=resource,o=glue\n'
+        tmpbuff1 += 'GLUE2ShareID: creamtest1_dteam\n'
+        
+        tmpbuff2 =  'GLUE2ComputingShareMappingQueue: creamtest1\n'
+        tmpbuff2 += '\n'
+        tmpbuff2 += 'dn: GLUE2PolicyID=creamtest1_dteam_policy,GLUE2GroupID=resource,o=glue\n'
+        tmpbuff2 += 'GLUE2PolicyUserDomainForeignKey: dteam\n'
+        
+        tmpbuff3 =  'GLUE2MappingPolicyShareForeignKey: creamtest1_dteam\n'
+        
+        #
+        # Each record spans two files, the third has no empty lines
+        #
+        workspace = Workspace()
+        ldifList = [ workspace.createFile(tmpbuff1), workspace.createFile(tmpbuff2),
+                     workspace.createFile(tmpbuff3) ]
+        
+        for workers in [ 1, 2 ]:
+            result = CommonUtils.scanGlue2Ldif(ldifList, workers)
+            
+            self.assertTrue(result == ({ 'creamtest1_dteam' : {
+                'dn' : 'dn: GLUE2ShareID=creamtest1_dteam,GLUE2GroupID=resource,o=glue',
+                'queue' : 'creamtest1',
+                'vo' : 'dteam' } },
+                { 'dn: GLUE2ManagerId=ce01_Manager,GLUE2GroupID=resource,o=glue' : 'ce01_Manager' }))
+
+
+if __name__ == '__main__':
+    unittest.main()
+
@@ -0,0 +1,89 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import os, os.path
+import time
+import unittest
+
+from SLURMInfoUtils import InfoDaemon
+from SLURMInfoUtils import JobOutput
+from TestUtils import Workspace
+
+class InfoDaemonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+        
+        self.outDir = self.workspace.workspace + '/published'
+        self.configFile = self.workspace.createFile('''[Main]
+outputformat: glue2
+
+[Daemon]
+output_dir: %s
+refresh_interval: 30
+max_age: 120
+''' % self.outDir)
+
+    def collectGlue(self, config, collection):
+        pass
+
+    def renderGlue(self, config, collection, out):
+        out.write('dn: GLUE2ShareID=creamtest1_dteam_abc,GLUE2ServiceID=abc,GLUE2GroupID=resource,o=glue\n')
+        out.write('GLUE2ComputingShareRunningJobs: 4\n\n')
+
+    def test_published_ok(self):
+    
+        daemon = InfoDaemon.InfoDaemon(self.configFile, self.collectGlue, self.renderGlue)
+        daemon.writeFile(InfoDaemon.GLUEFILE, 'GLUE2ComputingShareRunningJobs: 4\n')
+        
+        jobList = [ { 'jobid' : '1001', 'state' : 'running', 'cpucount' : 4 } ]
+        tmpfile = self.workspace.createFile('')
+        tmpOut = open(tmpfile, 'w')
+        JobOutput.writeJobs(jobList, 'jsonl', tmpOut)
+        tmpOut.close()
+        daemon.writeFile(InfoDaemon.getJobsFile('jsonl'), open(tmpfile).read())
+        
+        pubFile = InfoDaemon.openPublished(daemon.config, InfoDaemon.GLUEFILE)
+        result = pubFile.read() == 'GLUE2ComputingShareRunningJobs: 4\n'
+        pubFile.close()
+        
+        pubFile = InfoDaemon.openPublished(daemon.config, InfoDaemon.getJobsFile('jsonl'))
+        result = result and pubFile.read() == '{"cpucount":4,"jobid":"1001","state":"running"}\n'
+        pubFile.close()
+        
+        result = result and len(os.listdir(self.outDir)) == 2
+        
+        self.assertTrue(result)
+
+    def test_published_stale_ok(self):
+    
+        daemon = InfoDaemon.InfoDaemon(self.configFile, self.collectGlue, self.renderGlue)
+        daemon.writeFile(InfoDaemon.GLUEFILE, 'GLUE2ComputingShareRunningJobs: 4\n')
+        
+        oldTime = time.time() - 600
+        os.utime(os.path.join(self.outDir, InfoDaemon.GLUEFILE), (oldTime, oldTime))
+        
+        result = InfoDaemon.openPublished(daemon.config, InfoDaemon.GLUEFILE) == None
+        result = result and InfoDaemon.openPublished(daemon.config, InfoDaemon.getJobsFile('dict')) == None
+        result = result and InfoDaemon.openPublished({}, InfoDaemon.GLUEFILE) == None
+        
+        self.assertTrue(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
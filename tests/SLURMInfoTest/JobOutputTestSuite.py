@@ -0,0 +1,136 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import json
+import unittest
+import cStringIO
+
+from SLURMInfoUtils import JobOutput
+from TestUtils import Workspace
+
+class JobOutputTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+        self.stateFile = self.workspace.workspace + '/jobs.state'
+        
+    def createJob(self, jobid, state, queue='creamtest1'):
+        return { 'jobid' : jobid, 'name' : 'test.sh', 'user' : 'dteam001', 'group' : 'dteam',
+                 'queue' : queue, 'state' : state, 'cpucount' : 1, 'qtime' : 1377518092 }
+
+    def writeDiff(self, jobList, resyncInterval=3600):
+        out = cStringIO.StringIO()
+        JobOutput.writeJobDiff(jobList, 'jsonl', out, self.stateFile, resyncInterval)
+        lines = out.getvalue().splitlines()
+        return lines[0], [ json.loads(line) for line in lines[1:] ]
+
+    def test_jobs_jsonl_ok(self):
+    
+        out = cStringIO.StringIO()
+        JobOutput.writeJobs([ self.createJob('1001', 'running') ], 'jsonl', out)
+        
+        result = out.getvalue() == '{"cpucount":1,"group":"dteam","jobid":"1001","name":"test.sh",' \
+                                   '"qtime":1377518092,"queue":"creamtest1","state":"running","user":"dteam001"}\n'
+        
+        self.assertTrue(result)
+
+    def test_jobs_jsonl_encoding_ok(self):
+    
+        job1 = self.createJob('1001', 'running')
+        job1['name'] = 'caf\xe9'
+        job2 = self.createJob('1002', 'queued')
+        job2['name'] = 'caf\xc3\xa9'
+        
+        out = cStringIO.StringIO()
+        JobOutput.writeJobs([ job1, job2 ], 'jsonl', out)
+        records = [ json.loads(line) for line in out.getvalue().splitlines() ]
+        
+        result = len(records) == 2 and records[0]['name'] == u'caf\ufffd' and records[1]['name'] == u'caf\xe9'
+        result = result and records[0]['jobid'] == '1001'
+        
+        self.assertTrue(result)
+
+    def test_jobs_diff_ok(self):
+    
+        header, records = self.writeDiff([ self.createJob('1001', 'running'),
+                                           self.createJob('1002', 'queued') ])
+        
+        result = header == 'diffMode     full' and len(records) == 2
+        
+        header, records = self.writeDiff([ self.createJob('1002', 'running'),
+                                           self.createJob('1003', 'queued') ])
+        
+        result = result and header == 'diffMode     incremental' and len(records) == 3
+        result = result and records[0]['jobid'] == '1002' and records[0]['change'] == 'changed'
+        result = result and records[0]['state'] == 'running'
+        result = result and records[1]['jobid'] == '1003' and records[1]['change'] == 'added'
+        result = result and records[2] == { 'jobid' : '1001', 'queue' : 'creamtest1', 'change' : 'removed' }
+        
+        header, records = self.writeDiff([ self.createJob('1002', 'running'),
+                                           self.createJob('1003', 'queued') ])
+        
+        result = result and header == 'diffMode     incremental' and len(records) == 0
+        
+        header, records = self.writeDiff([ self.createJob('1003', 'queued') ], 0)
+        
+        result = result and header == 'diffMode     full' and len(records) == 1
+        result = result and not 'change' in records[0]
+        
+        self.assertTrue(result)
+
+    def test_jobs_diff_clusters_ok(self):
+    
+        #
+        # Independent clusters can reuse the local job ids,
+        # a federated job keeps its id on another cluster
+        #
+        fedid = str(2**26 + 100)
+        jobList = [ self.createJob('100', 'running'),
+                    self.createJob('100', 'queued', 'creamtest1@c2'),
+                    self.createJob(fedid, 'queued') ]
+        header, records = self.writeDiff(jobList)
+        
+        result = header == 'diffMode     full' and len(records) == 3
+        
+        header, records = self.writeDiff(jobList)
+        
+        result = result and header == 'diffMode     incremental' and len(records) == 0
+        
+        header, records = self.writeDiff([ self.createJob('100', 'running', 'creamtest1@c2'),
+                                           self.createJob(fedid, 'running', 'creamtest1@c2') ])
+        
+        result = result and header == 'diffMode     incremental' and len(records) == 3
+        result = result and records[0]['jobid'] == '100' and records[0]['change'] == 'changed'
+        result = result and records[0]['queue'] == 'creamtest1@c2'
+        result = result and records[1]['jobid'] == fedid and records[1]['change'] == 'changed'
+        result = result and records[2] == { 'jobid' : '100', 'queue' : 'creamtest1', 'change' : 'removed' }
+        
+        self.assertTrue(result)
+
+    def test_jobs_snapshot_name_ok(self):
+    
+        nameList = [ JobOutput.getSnapshotName({}),
+                     JobOutput.getSnapshotName({ 'job_source' : 'squeue', 'clusters' : [] }),
+                     JobOutput.getSnapshotName({ 'job_source' : 'squeue', 'clusters' : [ 'cream' ] }),
+                     JobOutput.getSnapshotName({ 'job_source' : 'squeue', 'clusters' : [ 'cream', 'c2' ] }) ]
+        
+        self.assertTrue(len(set(nameList)) == 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
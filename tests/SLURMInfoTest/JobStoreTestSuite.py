@@ -0,0 +1,83 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import cPickle
+import unittest
+
+from SLURMInfoUtils import SControlInfoHandler
+from SLURMInfoUtils import JobStore
+from TestUtils import Workspace
+
+class JobStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+
+    def test_jobs_roundtrip_ok(self):
+    
+        tmpbuff =  'JobId=1001 JobName=test1 UserId=dteam001(5001) GroupId=dteam(5000) JobState=RUNNING '
+        tmpbuff += 'TimeLimit=30:00 SubmitTime=2013-08-26T11:54:52 StartTime=2013-08-26T11:54:52 '
+        tmpbuff += 'Partition=creamtest1 NumCPUs=4\n'
+        tmpbuff += 'JobId=1002 JobName=test2 UserId=atlas001(6001) GroupId=atlas(6000) JobState=PENDING '
+        tmpbuff += 'TimeLimit=UNLIMITED SubmitTime=2013-08-26T11:55:52 '
+        tmpbuff += 'Partition=creamtest2 NumCPUs=1\n'
+        tmpfile = self.workspace.createFile(tmpbuff)
+        
+        jobList = list()
+        SControlInfoHandler.parseJobInfo(jobList, tmpfile)
+        jobList.append({ 'jobid' : '1003_7', 'name' : 'test3', 'user' : 'dteam001', 'group' : 'dteam',
+                         'queue' : 'creamtest1', 'state' : 'queued', 'cpucount' : 2, 'qtime' : 0,
+                         'cluster' : 'cream' })
+        
+        jobStore = JobStore.JobStore()
+        for jTable in jobList:
+            jobStore.append(jTable)
+        
+        #
+        # The tables have the same content, the ones of the handler
+        # have the same representation too
+        #
+        result = len(jobStore) == 3 and list(jobStore) == jobList
+        result = result and str(jobStore[0]) == str(jobList[0]) and str(jobStore[1]) == str(jobList[1])
+        result = result and jobStore[-1]['cluster'] == 'cream'
+        result = result and jobStore.getIndex() == { '1001' : 0, '1002' : 1, '1003_7' : 2 }
+        result = result and list(cPickle.loads(cPickle.dumps(jobStore, cPickle.HIGHEST_PROTOCOL))) == jobList
+        
+        self.assertTrue(result)
+
+    def test_jobs_aggregate_ok(self):
+    
+        jobStore = JobStore.JobStore()
+        for idx in range(10):
+            jobStore.append({ 'jobid' : str(1000 + idx), 'name' : 'test', 'user' : 'dteam%03d' % (idx % 3),
+                              'group' : 'dteam', 'queue' : 'creamtest%d' % (idx % 2),
+                              'state' : 'running' if idx < 4 else 'queued',
+                              'cpucount' : idx, 'qtime' : 1377518092 })
+        
+        result = jobStore.countJobs() == { () : 10 }
+        result = result and jobStore.countJobs('queue', 'state') == { ('creamtest0', 'running') : 2,
+                                                                      ('creamtest1', 'running') : 2,
+                                                                      ('creamtest0', 'queued') : 3,
+                                                                      ('creamtest1', 'queued') : 3 }
+        result = result and jobStore.sumCPUs('queue') == { ('creamtest0',) : 20, ('creamtest1',) : 25 }
+        result = result and jobStore.sumCPUs() == { () : 45 }
+        
+        self.assertTrue(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
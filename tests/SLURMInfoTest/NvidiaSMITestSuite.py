@@ -0,0 +1,77 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import os
+import time
+import unittest
+
+from SLURMInfoUtils import NvidiaSMIHandler
+from TestUtils import Workspace
+
+class NvidiaSMITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+        
+        #
+        # Fake ssh: the nodes named slow* do not answer, the others
+        # run two processes on GPU-1 and one on GPU-2
+        #
+        binDir = self.workspace.workspace + '/bin'
+        os.mkdir(binDir)
+        sshFile = open(binDir + '/ssh', 'w')
+        sshFile.write('#!/bin/sh\n')
+        sshFile.write('for arg; do host=$last; last=$arg; done\n')
+        sshFile.write('case "$host" in slow*) exec sleep 20;; esac\n')
+        sshFile.write('echo "GPU-1, 123"; echo "GPU-2, 124"; echo "GPU-1, 125"\n')
+        sshFile.close()
+        os.chmod(binDir + '/ssh', 0755)
+        
+        self.savePath = os.environ['PATH']
+        os.environ['PATH'] = binDir + ':' + self.savePath
+
+    def tearDown(self):
+        os.environ['PATH'] = self.savePath
+
+    def test_gpu_probe_timeout_ok(self):
+    
+        gpuTable = { 'node01' : 2, 'slow01' : 4, 'node02' : 2, 'node03' : 0 }
+        
+        startTime = time.time()
+        result = NvidiaSMIHandler.parseGPUStats(gpuTable, 2, 1, 30) == (8, 4, 1)
+        result = result and time.time() - startTime < 10
+        
+        self.assertTrue(result)
+
+    def test_gpu_probe_deadline_ok(self):
+    
+        gpuTable = { 'slow01' : 2, 'slow02' : 2, 'slow03' : 2, 'node01' : 2 }
+        
+        #
+        # The probes still running at the deadline are killed,
+        # the ones not started count as unreachable
+        #
+        startTime = time.time()
+        total, used, unreachable = NvidiaSMIHandler.parseGPUStats(gpuTable, 2, 10, 1)
+        result = total == 8 and unreachable >= 3
+        result = result and time.time() - startTime < 10
+        
+        self.assertTrue(result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,18 +15,22 @@
 # limitations under the License.
 
 import sys
+import os
 import unittest
 import shlex
+import pwd
+import grp
 
 from SLURMInfoUtils import CommonUtils
 from SLURMInfoUtils import SAcctMgrHandler
+from SLURMInfoUtils import SnapshotCache
 from TestUtils import Workspace
 
 
 class MyPolicyInfoHandler(SAcctMgrHandler.PolicyInfoHandler):
 
-    def __init__(self,vomap):
-        SAcctMgrHandler.PolicyInfoHandler.__init__(self, vomap)
+    def __init__(self,vomap,prioTable=None):
+        SAcctMgrHandler.PolicyInfoHandler.__init__(self, vomap, False, prioTable)
     
     def getVOForUser(self, user):
         if user.startswith('dteam'):
@@ -37,9 +41,9 @@ class MyPolicyInfoHandler(SAcctMgrHandler.PolicyInfoHandler):
             return 'alice'
         return None
 
-def parsePolicies(filename):
+def parsePolicies(filename, prioTable=None):
     cmd = shlex.split('cat ' + filename)
-    container = MyPolicyInfoHandler({})
+    container = MyPolicyInfoHandler({}, prioTable)
     CommonUtils.parseStream(cmd, container)
     return container
 
@@ -81,9 +85,199 @@ class SAcctMgrTestCase(unittest.TestCase):
         
         self.assertTrue(result)
 
+    def test_policies_index_ok(self):
+        
+        tmpbuff =  'dteam|dteam001|creamtest1|1|20||1-12|1440|2|701|700\n'
+        tmpbuff += 'dteam|dteam002|creamtest1|3|40||12:00:00|2880|1|702|700\n'
+        tmpbuff += 'dteam|dteam003|creamtest2|5|10||01:00:00|60|8|703|700\n'
+        tmpbuff += 'atlas|atlas001|creamtest2|2|30||02:00:00|120|4|801|800\n'
+        tmpbuff += 'dteam|dteam004||4|50||01:00:00|60|1|704|700\n'
+        
+        tmpfile = self.workspace.createFile(tmpbuff)
+        
+        container = parsePolicies(tmpfile)
+        
+        tmpPol = container.policyTable['dteam', 'creamtest1']
+        result = tmpPol.maxWallTime == 129600 and tmpPol.maxRunJobs == 40 and tmpPol.priority == 1
+        
+        tmpPol = container.policyTable[None, 'creamtest2']
+        result = result and tmpPol.maxWallTime == 7200 and tmpPol.maxCPUPerJob == 8 and tmpPol.priority == 2
+        
+        #
+        # The entry without partition is merged with the other dteam associations
+        #
+        tmpPol = container.policyTable['dteam', None]
+        result = result and tmpPol.maxRunJobs == 50 and tmpPol.maxCPUPerJob == 8 and tmpPol.priority == 1
+        
+        result = result and ('atlas', None) in container.policyTable
+        result = result and not ('alice', None) in container.policyTable
+        result = result and not ('atlas', 'creamtest1') in container.policyTable
+        
+        self.assertTrue(result)
+
+    def test_policies_resolve_ok(self):
+        
+        tmpbuff =  'dteam|dteam001|creamtest1|1|20||1-12|1440|2|701|700\n'
+        tmpbuff += 'dteam|dteam002|creamtest1|3|40||12:00:00|2880|1|702|700\n'
+        tmpbuff += 'atlas|atlas001|creamtest2|2|30||02:00:00|120|4|801|800\n'
+        
+        tmpfile = self.workspace.createFile(tmpbuff)
+        
+        container = parsePolicies(tmpfile)
+        
+        effTable = container.policyTable.resolve([ ('dteam', 'creamtest1'), (None, 'creamtest1'),
+                                                   ('atlas', 'creamtest1'), (None, 'creamtest3'),
+                                                   ('', 'creamtest2'), (None, None) ])
+        
+        result = set(effTable.keys()) == set([ ('', 'creamtest2'), (None, 'creamtest1'), ('dteam', 'creamtest1') ])
+        
+        tmpPol = effTable['dteam', 'creamtest1']
+        result = result and tmpPol.maxWallTime == 129600 and tmpPol.maxRunJobs == 40 and tmpPol.priority == 1
+        result = result and effTable['', 'creamtest2'].maxCPUPerJob == 4
+        
+        #
+        # The effective policies are copies, the table is not modified
+        #
+        tmpPol.maxRunJobs = 1
+        result = result and container.policyTable['dteam', 'creamtest1'].maxRunJobs == 40
+        
+        self.assertTrue(result)
+
+    def test_policies_filtered_ok(self):
+        
+        allbuff =  'root|||1||||||1|0\n'
+        allbuff += 'dteam|||parent||||||700|1\n'
+        allbuff += 'dteam|dteam001|creamtest1|parent|20||1-12|1440|2|701|700\n'
+        allbuff += 'dteam|dteam002|creamtest2|3|40||12:00:00|2880|1|702|700\n'
+        allbuff += 'atlas|||7||||||800|1\n'
+        allbuff += 'atlas|atlas001|creamtest1|parent|30||02:00:00|120|4|801|800\n'
+        allbuff += 'atlas|atlas001|creamtest2|parent|30||02:00:00|120|4|802|800\n'
+        
+        #
+        # The query restricted to creamtest1 lacks the parent associations,
+        # they come from the query of the associations without user
+        #
+        filterbuff =  'dteam|dteam001|creamtest1|parent|20||1-12|1440|2|701|700\n'
+        filterbuff += 'atlas|atlas001|creamtest1|parent|30||02:00:00|120|4|801|800\n'
+        
+        parentbuff =  '|parent|700|1|root\n'
+        parentbuff += 'dteam001|parent|701|700|\n'
+        parentbuff += '|7|800|1|root\n'
+        parentbuff += '|1|1|0|\n'
+        
+        allContainer = parsePolicies(self.workspace.createFile(allbuff))
+        
+        parents = SAcctMgrHandler.parseParents(filename=self.workspace.createFile(parentbuff))
+        container = parsePolicies(self.workspace.createFile(filterbuff), parents.prioTable)
+        
+        policyKeys = [ (None, 'creamtest1'), ('dteam', 'creamtest1'), ('atlas', 'creamtest1') ]
+        allTable = allContainer.policyTable.resolve(policyKeys)
+        effTable = container.policyTable.resolve(policyKeys)
+        
+        result = parents.prioTable == { 1 : 1, 700 : 1, 800 : 7 }
+        result = result and sorted(effTable.keys()) == sorted(allTable.keys()) == sorted(policyKeys)
+        for kTuple in policyKeys:
+            for attr in SAcctMgrHandler.PolicyData.__slots__:
+                result = result and getattr(effTable[kTuple], attr) == getattr(allTable[kTuple], attr)
+        result = result and effTable['atlas', 'creamtest1'].priority == 7
+        
+        self.assertTrue(result)
 
+    def test_policies_parent_query_ok(self):
+        
+        #
+        # Fake sacctmgr: dteam inherits the fair-share of root
+        #
+        binDir = self.workspace.workspace + '/bin'
+        os.mkdir(binDir)
+        logFile = self.workspace.workspace + '/sacctmgr.log'
+        cmdFile = open(binDir + '/sacctmgr', 'w')
+        cmdFile.write('#!/bin/sh\n')
+        cmdFile.write('echo "$*" >> %s\n' % logFile)
+        cmdFile.write('case "$*" in\n')
+        cmdFile.write('*account=dteam\\ format=User*) echo "|parent|700|1|root"; echo "root|parent|701|700|";;\n')
+        cmdFile.write('*account=root\\ format=User*) echo "|7|1|0|";;\n')
+        cmdFile.write('*partition=creamtest1\\ *) echo "dteam|root|creamtest1|parent|20||1-12|1440|2|701|700";;\n')
+        cmdFile.write('*partition=creamtest2\\ *) echo "dteam|root|creamtest2|3|20||1-12|1440|2|702|700";;\n')
+        cmdFile.write('esac\n')
+        cmdFile.close()
+        os.chmod(binDir + '/sacctmgr', 0755)
+        
+        policyFormat = 'format=Account,User,Partition,'
+        policyFormat += 'Fairshare,MaxJobs,MaxSubmitJobs,MaxWall,MaxCPUMins,MaxCPUs,ID,ParentID'
+        parentFormat = 'format=User,Fairshare,ID,ParentID,ParentName'
+        
+        savePath = os.environ['PATH']
+        os.environ['PATH'] = binDir + ':' + savePath
+        try:
+            #
+            # The accounts are read only for the "parent" fair-shares,
+            # then their ancestors
+            #
+            container = SAcctMgrHandler.parsePolicies(vomap={ 'root' : 'dteam' }, cluster='cl1',
+                                                      partitions=[ 'creamtest1' ])
+            result = container.policyTable['dteam', 'creamtest1'].priority == 7
+            result = result and container.resolver == None
+            result = result and open(logFile).read().splitlines() == [
+                '-Pn show associations cluster=cl1 partition=creamtest1 ' + policyFormat,
+                '-Pn show associations cluster=cl1 account=dteam ' + parentFormat,
+                '-Pn show associations cluster=cl1 account=root ' + parentFormat ]
+            
+            os.remove(logFile)
+            container = SAcctMgrHandler.parsePolicies(vomap={ 'root' : 'dteam' }, cluster='cl1',
+                                                      partitions=[ 'creamtest2' ])
+            result = result and container.policyTable['dteam', 'creamtest2'].priority == 3
+            result = result and open(logFile).read().splitlines() == [
+                '-Pn show associations cluster=cl1 partition=creamtest2 ' + policyFormat ]
+        finally:
+            os.environ['PATH'] = savePath
+        
+        self.assertTrue(result)
 
+    def test_transactions_parsing_ok(self):
+        
+        tmpbuff =  'Modify QOS\n'
+        tmpbuff += 'Add Associations\n'
+        tmpbuff += 'Modify Users\n'
+        tmpbuff += 'Add Clusters\n'
+        
+        tmpfile = self.workspace.createFile(tmpbuff)
+        
+        container = SAcctMgrHandler.parseTransactions(0, tmpfile)
+        result = container.changes == 2
+        
+        tmpfile = self.workspace.createFile('Modify QOS\n')
+        
+        container = SAcctMgrHandler.parseTransactions(0, tmpfile)
+        result = result and container.changes == 0
+        
+        self.assertTrue(result)
+
+    def test_policies_snapshot_ok(self):
+    
+        tmpbuff = 'dteam|dteam001|creamtest1|1|20||12:00:00|2880|2|701|700\n'
+        
+        container = parsePolicies(self.workspace.createFile(tmpbuff))
+        cls, state = SnapshotCache.exportState(container)
+        
+        result = state['resolver'] == None and state['vomap'] == {}
+        result = result and SnapshotCache.importState((cls, state)).policyTable['dteam', 'creamtest1'].maxCPUPerJob == 2
+        
+        self.assertTrue(result)
 
+    def test_vo_resolver_ok(self):
+    
+        rootGroup = grp.getgrgid(pwd.getpwnam('root')[3])[0]
+        
+        for preload in [False, True]:
+            resolver = SAcctMgrHandler.VOResolver({ rootGroup : 'dteam' }, preload)
+            
+            result = resolver.getVO('root') == 'dteam'
+            result = result and resolver.getVO('nosuchuser-infoslurm') == None
+            result = result and resolver.getVO('') == None
+            result = result and resolver.voTable == { 'root' : 'dteam', 'nosuchuser-infoslurm' : None }
+            
+            self.assertTrue(result)
 
 
 if __name__ == '__main__':
@@ -31,6 +31,9 @@ class SControlTestCase(unittest.TestCase):
         self.jobPattern = '''JobId=%(jid)s Name=%(jname)s UserId=%(uid)s(0) GroupId=%(gid)s(0) Priority=4294901756 Account=(null) QOS=(null) JobState=%(jstate)s Reason=None Dependency=(null) Requeue=1 Restarts=0 BatchFlag=1 ExitCode=0:0 RunTime=00:01:00 TimeLimit=%(tlimit)s TimeMin=N/A SubmitTime=%(subtime)s EligibleTime=2013-08-26T11:54:52 StartTime=%(sttime)s EndTime=2013-08-26T11:55:52 PreemptTime=None SuspendTime=None SecsPreSuspend=0 Partition=%(pname)s AllocNode:Sid=cream-04:2682 ReqNodeList=(null) ExcNodeList=(null) NodeList=cream-42 BatchHost=cream-42 NumNodes=1 NumCPUs=%(ncpu)d CPUs/Task=1 ReqS:C:T=*:*:* MinCPUsNode=1 MinMemoryNode=0 MinTmpDiskNode=0 Features=(null) Gres=(null) Reservation=(null) Shared=0 Contiguous=0 Licenses=(null) Network=(null) Command=/root/test.sh WorkDir=/root
 '''
 
+        self.gpuNodePattern = '''NodeName=%(nname)s Arch=x86_64 CoresPerSocket=1 CPUAlloc=0 CPUTot=4 CPULoad=0.00 AvailableFeatures=(null) ActiveFeatures=(null) Gres=%(gres)s NodeAddr=%(nname)s NodeHostName=%(nname)s OS=Linux RealMemory=1 AllocMem=0 Sockets=2 Boards=1 State=MIXED ThreadsPerCore=1 TmpDisk=0 Weight=1 CfgTRES=cpu=4,mem=1M,billing=4 AllocTRES=%(tres)s CapWatts=n/a CurrentWatts=0 AveWatts=0
+'''
+
         self.configPattern = '''Configuration data as of 2013-08-28T10:34:42
 SelectType              = %(seltype)s
 SelectTypeParameters    = %(selpar)s
@@ -105,6 +108,74 @@ SLURM_VERSION           = %(version)s
         self.assertTrue(result)
 
 
+    def test_scontrol_gres_used_ok(self):
+    
+        pattern_args = {'nname' : 'cream-34',
+                        'gres' : 'gpu:a100:4(S:0-1)',
+                        'tres' : 'cpu=3,gres/gpu=3,gres/gpu:a100=3'}
+
+        tmpfile = self.workspace.createFile(self.gpuNodePattern % pattern_args)
+        
+        pattern_args = {'nname' : 'cream-42',
+                        'gres' : 'gpu:tesla:2,gpu:k80:1,mps:100',
+                        'tres' : 'cpu=1,mem=1M,gres/gpu=1,gres/gpu:tesla=1'}
+
+        self.workspace.appendToFile(self.gpuNodePattern % pattern_args, tmpfile)
+
+        pattern_args = {'nname' : 'cream-46',
+                        'gres' : '(null)',
+                        'tres' : ''}
+
+        self.workspace.appendToFile(self.gpuNodePattern % pattern_args, tmpfile)
+
+        container = SControlInfoHandler.parseNodesInfo(tmpfile)
+        
+        result = container.gpuTable == { 'cream-34' : 4, 'cream-42' : 3, 'cream-46' : 0 }
+        result = result and container.gpuUsedTable == { 'cream-34' : 3, 'cream-42' : 1, 'cream-46' : 0 }
+        result = result and container.getGPUStats() == (7, 4, 0)
+        
+        self.assertTrue(result)
+
+    def test_scontrol_jobs_ok(self):
+    
+        pattern_args = {'jid' : '1001',
+                        'jname' : 'test.sh',
+                        'uid' : 'dteam001',
+                        'gid' : 'dteam',
+                        'jstate' : 'RUNNING',
+                        'tlimit' : '1-00:00:00',
+                        'subtime' : '2013-08-26T11:54:52',
+                        'sttime' : '2013-08-26T11:54:52',
+                        'pname' : 'creamtest1',
+                        'ncpu' : 4}
+
+        tmpfile = self.workspace.createFile(self.jobPattern % pattern_args)
+        
+        pattern_args['jid'] = '1002'
+        pattern_args['jstate'] = 'PENDING'
+        pattern_args['tlimit'] = 'UNLIMITED'
+        pattern_args['sttime'] = 'Unknown'
+        
+        self.workspace.appendToFile(self.jobPattern % pattern_args, tmpfile)
+        
+        pattern_args['jid'] = '1003'
+        pattern_args['jstate'] = 'COMPLETED'
+        
+        self.workspace.appendToFile(self.jobPattern % pattern_args, tmpfile)
+        
+        jobList = list()
+        SControlInfoHandler.parseJobInfo(jobList, tmpfile)
+        
+        result = len(jobList) == 2
+        result = result and jobList[0]['jobid'] == '1001' and jobList[0]['state'] == 'running'
+        result = result and jobList[0]['user'] == 'dteam001' and jobList[0]['group'] == 'dteam'
+        result = result and jobList[0]['queue'] == 'creamtest1' and jobList[0]['cpucount'] == 4
+        result = result and jobList[0]['maxwalltime'] == 86400 and jobList[0]['name'] == 'test.sh'
+        result = result and jobList[0]['start'] == jobList[0]['qtime']
+        result = result and jobList[1]['state'] == 'queued' and jobList[1]['start'] == 0
+        result = result and not 'maxwalltime' in jobList[1]
+        
+        self.assertTrue(result)
 
 
 if __name__ == '__main__':
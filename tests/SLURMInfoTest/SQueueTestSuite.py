@@ -0,0 +1,109 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import unittest
+
+from SLURMInfoUtils import SQueueHandler
+from SLURMInfoUtils import SControlInfoHandler
+from TestUtils import Workspace
+
+class SQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+
+        self.jobPattern = "%(jid)s|%(uid)s|%(gid)s|%(jstate)s|%(tlimit)s|%(subtime)s|%(sttime)s"
+        self.jobPattern += "|%(pname)s|%(ncpu)d|%(jname)s\n"
+
+        self.sctrlPattern = '''JobId=%(jid)s Name=%(jname)s UserId=%(uid)s(0) GroupId=%(gid)s(0) JobState=%(jstate)s TimeLimit=%(tlimit)s SubmitTime=%(subtime)s StartTime=%(sttime)s Partition=%(pname)s NumNodes=1 NumCPUs=%(ncpu)d Command=/root/test.sh WorkDir=/root
+'''
+
+    def test_squeue_jobs_ok(self):
+    
+        pattern_args = {'jid' : '1001',
+                        'jname' : 'test|job.sh',
+                        'uid' : 'dteam001',
+                        'gid' : 'dteam',
+                        'jstate' : 'RUNNING',
+                        'tlimit' : '1-00:00:00',
+                        'subtime' : '2013-08-26T11:54:52',
+                        'sttime' : '2013-08-26T11:54:52',
+                        'pname' : 'creamtest1',
+                        'ncpu' : 4}
+
+        tmpfile = self.workspace.createFile(self.jobPattern % pattern_args)
+        
+        pattern_args['jid'] = '1002'
+        pattern_args['jstate'] = 'PENDING'
+        pattern_args['tlimit'] = 'NOT_SET'
+        pattern_args['sttime'] = 'N/A'
+        
+        self.workspace.appendToFile(self.jobPattern % pattern_args, tmpfile)
+        
+        pattern_args['jid'] = '1003'
+        pattern_args['jstate'] = 'COMPLETED'
+        
+        self.workspace.appendToFile(self.jobPattern % pattern_args, tmpfile)
+        
+        jobList = list()
+        SQueueHandler.parseJobInfo(jobList, tmpfile)
+        
+        result = len(jobList) == 2
+        result = result and jobList[0]['jobid'] == '1001' and jobList[0]['state'] == 'running'
+        result = result and jobList[0]['user'] == 'dteam001' and jobList[0]['group'] == 'dteam'
+        result = result and jobList[0]['queue'] == 'creamtest1' and jobList[0]['cpucount'] == 4
+        result = result and jobList[0]['maxwalltime'] == 86400 and jobList[0]['name'] == 'test|job.sh'
+        result = result and jobList[0]['start'] == jobList[0]['qtime']
+        result = result and jobList[1]['state'] == 'queued' and jobList[1]['start'] == 0
+        result = result and not 'maxwalltime' in jobList[1]
+        
+        self.assertTrue(result)
+
+    def test_squeue_scontrol_same_ok(self):
+    
+        pattern_args = {'jid' : '1001',
+                        'jname' : 'test.sh',
+                        'uid' : 'dteam001',
+                        'gid' : 'dteam',
+                        'jstate' : 'RUNNING',
+                        'tlimit' : '2:30:00',
+                        'subtime' : '2013-08-26T11:54:52',
+                        'sttime' : '2013-08-26T11:55:52',
+                        'pname' : 'creamtest1',
+                        'ncpu' : 8}
+
+        sqfile = self.workspace.createFile(self.jobPattern % pattern_args)
+        scfile = self.workspace.createFile(self.sctrlPattern % pattern_args)
+        
+        pattern_args['jid'] = '1002'
+        pattern_args['jstate'] = 'PENDING'
+        pattern_args['tlimit'] = 'UNLIMITED'
+        
+        self.workspace.appendToFile(self.jobPattern % pattern_args, sqfile)
+        self.workspace.appendToFile(self.sctrlPattern % pattern_args, scfile)
+        
+        sqList = list()
+        SQueueHandler.parseJobInfo(sqList, sqfile)
+        scList = list()
+        SControlInfoHandler.parseJobInfo(scList, scfile)
+        
+        self.assertTrue(len(sqList) == 2 and sqList == scList)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
@@ -0,0 +1,168 @@
+# Copyright (c) Members of the EGEE Collaboration. 2004. 
+# See http://www.eu-egee.org/partners/ for details on the copyright
+# holders.  
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); 
+# you may not use this file except in compliance with the License. 
+# You may obtain a copy of the License at 
+#
+#     http://www.apache.org/licenses/LICENSE-2.0 
+#
+# Unless required by applicable law or agreed to in writing, software 
+# distributed under the License is distributed on an "AS IS" BASIS, 
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
+# See the License for the specific language governing permissions and 
+# limitations under the License.
+
+import sys
+import os
+import time
+import fcntl
+import threading
+import unittest
+
+from SLURMInfoUtils import CommonUtils
+from SLURMInfoUtils import SInfoHandler
+from SLURMInfoUtils import SnapshotCache
+from TestUtils import Workspace
+
+class SnapshotCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.workspace = Workspace()
+        
+        self.partPattern = "%(partid)s %(state)s %(cpuinfo)s %(maxcput)s %(defcput)s"
+        self.partPattern += " %(jsize)s %(nodes)s %(maxcpun)s %(sct)s\n"
+        
+        self.config = { 'cache_dir' : self.workspace.workspace + '/cache',
+                        'cache_ttl' : { 'partitions' : 60 } }
+        self.loadCount = 0
+
+    def loadPartitions(self, filename):
+        self.loadCount += 1
+        return SInfoHandler.parsePartInfo(filename)
+
+    def test_snapshot_reused_ok(self):
+    
+        pattern_args = {'partid' : 'creamtest1',
+                        'state' : 'up',
+                        'cpuinfo' : '2/2/0/4',
+                        'maxcput' : '30:00',
+                        'defcput' : 'n/a',
+                        'jsize' : '1-10',
+                        'nodes' : '0/1/0/1',
+                        'maxcpun' : 'UNLIMITED',
+                        'sct' : '2:1:1'}
+
+        tmpfile = self.workspace.createFile(self.partPattern % pattern_args)
+        
+        cache = SnapshotCache.SnapshotCache(self.config)
+        container1 = cache.load('partitions', 'partitions', self.loadPartitions, tmpfile)
+        
+        cache = SnapshotCache.SnapshotCache(self.config)
+        container2 = cache.load('partitions', 'partitions', self.loadPartitions, tmpfile)
+        
+        result = self.loadCount == 1
+        result = result and 'creamtest1' in container2
+        result = result and container2['creamtest1'].freeCPU == container1['creamtest1'].freeCPU
+        result = result and container2['creamtest1'].slotsPerJob == 20
+        
+        self.assertTrue(result)
+
+    def test_snapshot_checked_ok(self):
+    
+        tmpfile = self.workspace.createFile('')
+        checkList = list()
+        
+        def checkSnapshot(timestamp):
+            checkList.append(timestamp)
+            return len(checkList) < 2
+        
+        #
+        # The snapshot is reused until the checker rejects it,
+        # the rejected one is not checked twice
+        #
+        cache = SnapshotCache.SnapshotCache(self.config)
+        for idx in range(3):
+            cache.loadChecked('partitions', 'partitions', checkSnapshot, self.loadPartitions, tmpfile)
+        
+        result = self.loadCount == 2 and len(checkList) == 2 and checkList[0] == checkList[1]
+        
+        cache.loadChecked('partitions', 'partitions', checkSnapshot, self.loadPartitions, tmpfile)
+        result = result and self.loadCount == 3 and len(checkList) == 3 and checkList[2] > checkList[1]
+        
+        self.assertTrue(result)
+
+    def test_snapshot_owner_ok(self):
+    
+        tmpfile = self.workspace.createFile('')
+        
+        cache = SnapshotCache.SnapshotCache(self.config)
+        cache.load('partitions', 'partitions', self.loadPartitions, tmpfile)
+        
+        result = os.stat(self.config['cache_dir']).st_mode & 0777 == 0700
+        
+        #
+        # A snapshot written by another user is not loaded
+        #
+        saveGetuid = os.getuid
+        os.getuid = lambda: saveGetuid() + 1
+        try:
+            cache.load('partitions', 'partitions', self.loadPartitions, tmpfile)
+        finally:
+            os.getuid = saveGetuid
+        
+        result = result and self.loadCount == 2
+        
+        self.assertTrue(result)
+
+    def test_snapshot_locked_ok(self):
+    
+        tmpfile = self.workspace.createFile('')
+        cache = SnapshotCache.SnapshotCache(self.config)
+        
+        #
+        # While another invocation refreshes the snapshot the commands
+        # already running complete in time, the snapshot is refreshed
+        # as soon as the lock is released
+        #
+        lockFile = open(self.config['cache_dir'] + '/partitions.lock', 'a')
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        timer = threading.Timer(1.5, lockFile.close)
+        timer.start()
+        try:
+            collection = CommonUtils.Collection(cache)
+            collection.add('running', CommonUtils.StreamStep(['sh', '-c', 'sleep 0.2'],
+                                                             SInfoHandler.PartitionInfoHandler(),
+                                                             timeout=1))
+            collection.load('partitions', 'partitions', 'partitions',
+                            SInfoHandler.partInfoStep(tmpfile))
+            result = collection.results == {}
+            
+            startTime = time.time()
+            collection.run()
+            result = result and time.time() - startTime >= 1
+        finally:
+            timer.cancel()
+            lockFile.close()
+        
+        result = result and collection.errors == {}
+        result = result and collection.get('partitions').qtable == {}
+        result = result and os.path.exists(self.config['cache_dir'] + '/partitions.snap')
+        
+        self.assertTrue(result)
+
+    def test_snapshot_disabled_ok(self):
+    
+        tmpfile = self.workspace.createFile('')
+        
+        cache = SnapshotCache.SnapshotCache({})
+        cache.load('partitions', 'partitions', self.loadPartitions, tmpfile)
+        cache.load('partitions', 'partitions', self.loadPartitions, tmpfile)
+        
+        self.assertTrue(self.loadCount == 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
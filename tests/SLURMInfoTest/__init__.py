@@ -14,6 +14,6 @@
 # See the License for the specific language governing permissions and 
 # limitations under the License.
 
-__all__ = ["SControlTestSuite", "SInfoTestSuite", "TestUtils"]
+__all__ = ["ClusterModelTestSuite", "CommonUtilsTestSuite", "InfoDaemonTestSuite", "JobOutputTestSuite", "JobStoreTestSuite", "NvidiaSMITestSuite", "SControlTestSuite", "SInfoTestSuite", "SnapshotCacheTestSuite", "SQueueTestSuite", "TestUtils"]
 
 